@@ -0,0 +1,130 @@
+"""
+Неблокирующий доступ к БД для asyncio.
+
+Синхронные SQLAlchemy-вызовы выполняются в отдельном ограниченном пуле потоков,
+чтобы медленный запрос к Postgres не останавливал event loop и другие чаты.
+Долгие задачи (экспорт / импорт целиком) — в своём маленьком пуле (run_db_bulk):
+несколько архивов подряд не занимают потоки, на которых отвечают хендлеры.
+LoopLagProbe измеряет задержку цикла событий — по ней видно, что обработчики
+больше не ждут базу.
+"""
+import os
+import time
+import asyncio
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from loguru import logger
+
+from metrics import percentile
+
+T = TypeVar("T")
+
+# Потоков не больше, чем соединений в пуле (pool_size) — лишние всё равно ждали бы коннект
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "5"))
+# Экспорт / импорт: соединения им достаются из запаса пула (max_overflow), остальные ждут в очереди
+DB_BULK_WORKERS = int(os.getenv("DB_BULK_WORKERS", "1"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_bulk_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Выделенный пул потоков для запросов к БД (создаётся при первом обращении)"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+    return _executor
+
+
+def get_bulk_executor() -> ThreadPoolExecutor:
+    """Пул потоков для долгих выгрузок и загрузок (создаётся при первом обращении)"""
+    global _bulk_executor
+    if _bulk_executor is None:
+        _bulk_executor = ThreadPoolExecutor(max_workers=DB_BULK_WORKERS, thread_name_prefix="db-bulk")
+    return _bulk_executor
+
+
+async def _run_in(executor: ThreadPoolExecutor, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    loop = asyncio.get_running_loop()
+    # Как asyncio.to_thread: контекстные переменные апдейта видны и в потоке БД
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(executor, partial(ctx.run, func, *args, **kwargs))
+
+
+async def run_db(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Выполнить синхронную функцию работы с БД, не блокируя event loop"""
+    return await _run_in(get_executor(), func, *args, **kwargs)
+
+
+async def run_db_bulk(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """То же для долгой задачи (экспорт / импорт): в отдельном пуле, не в пуле хендлеров"""
+    return await _run_in(get_bulk_executor(), func, *args, **kwargs)
+
+
+def shutdown_executor(wait: bool = True):
+    """Остановить пулы (дожидаясь запросов, которые уже выполняются)"""
+    global _executor, _bulk_executor
+    if _executor is not None:
+        _executor.shutdown(wait=wait)
+        _executor = None
+    if _bulk_executor is not None:
+        _bulk_executor.shutdown(wait=wait)
+        _bulk_executor = None
+
+
+# ==================== ЗАДЕРЖКА EVENT LOOP ====================
+
+class LoopLagProbe:
+    """
+    Периодически засыпает на interval и меряет, насколько позже проснулся.
+    Если обработчики блокируют цикл, лаг растёт вместе с латентностью БД.
+    """
+
+    def __init__(self, interval: float = 0.1, window: int = 3000, report_every: float = 60.0):
+        self.interval = interval
+        self.report_every = report_every
+        self.samples: deque = deque(maxlen=window)
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="loop-lag-probe")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        last_report = time.monotonic()
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - started - self.interval)
+            self.samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+            if self.report_every and time.monotonic() - last_report >= self.report_every:
+                last_report = time.monotonic()
+                stats = self.stats()
+                logger.info(
+                    f"⏱️ Лаг event loop: p50={stats['p50_ms']:.1f}ms "
+                    f"p99={stats['p99_ms']:.1f}ms max={stats['max_ms']:.1f}ms"
+                )
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "samples": len(self.samples),
+            "p50_ms": percentile(self.samples, 50) * 1000,
+            "p99_ms": percentile(self.samples, 99) * 1000,
+            "max_ms": self.max_lag * 1000,
+        }
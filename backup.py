@@ -0,0 +1,226 @@
+"""
+Экспорт и импорт данных пользователя (заметки, закладки, напоминания).
+
+Экспорт — zip, который пишется потоково: строки идут из БД порциями
+(Database.iter_export, yield_per), каждая сразу уходит в сжатый файл архива,
+а сам архив лежит во временном файле на диске. Память не зависит от объёма данных.
+
+Форматы:
+• jsonl — по файлу на вид данных (notes.jsonl, ...) + manifest.json;
+  этот же архив (или отдельный *.jsonl) принимает импорт
+• md — читаемые notes.md / bookmarks.md / reminders.md, только для чтения
+
+Импорт читает архив построчно и вставляет пачками по IMPORT_BATCH_SIZE
+(один executemany на пачку). Функции синхронные — вызывать через run_db.
+"""
+import io
+import os
+import json
+import zipfile
+from datetime import datetime
+from typing import Any, Callable, Dict, IO, Iterator, List, Optional
+
+from loguru import logger
+
+from database import Database, EXPORT_COLUMNS, IMPORT_BATCH_SIZE, note_title
+
+EXPORT_FORMATS = ("jsonl", "md")
+EXPORT_VERSION = 1
+
+MAX_IMPORT_ROWS = int(os.getenv("MAX_IMPORT_ROWS", "100000"))
+# Архив до 20 МБ может распаковаться в гигабайты: объём файлов внутри проверяем до чтения
+MAX_IMPORT_UNPACKED_SIZE = int(os.getenv("MAX_IMPORT_UNPACKED_SIZE", str(200 * 1024 * 1024)))
+MAX_TEXT_LENGTH = 20_000
+# Строка длиннее не может быть строкой экспорта (текст обрезается до MAX_TEXT_LENGTH) — пропускается
+MAX_IMPORT_LINE_LENGTH = 256 * 1024
+
+
+# ==================== ЭКСПОРТ ====================
+
+def _jsonable(row: Dict) -> Dict:
+    return {key: value.isoformat() if isinstance(value, datetime) else value for key, value in row.items()}
+
+
+def _date(value: Optional[datetime]) -> str:
+    return value.strftime("%Y-%m-%d %H:%M") if value else ""
+
+
+def _markdown(kind: str, row: Dict) -> str:
+    if kind == 'notes':
+        return f"## {row['title'] or note_title(row['content'])}\n\n_{_date(row['created_at'])}_\n\n{row['content'] or ''}\n\n---\n\n"
+    if kind == 'bookmarks':
+        text = (row['message_text'] or "").replace("\n", "\n  ")
+        media = f" [{row['message_type']}]" if row['message_type'] != "text" else ""
+        tags = " " + " ".join(f"#{tag.strip()}" for tag in row['tags'].split(",") if tag.strip()) if row['tags'] else ""
+        return f"- {_date(row['saved_at'])}{media} {text}{tags}\n"
+    mark = "x" if row['is_completed'] else " "
+    return f"- [{mark}] {_date(row['remind_at'])} — {row['text']}\n"
+
+
+MARKDOWN_TITLES = {'notes': "# 📝 Заметки\n\n", 'bookmarks': "# 🔖 Закладки\n\n", 'reminders': "# ⏰ Напоминания\n\n"}
+
+
+def write_export(database: Database, user_id: int, destination: IO[bytes], fmt: str = "jsonl") -> Dict[str, int]:
+    """Записать архив пользователя в destination (файл, открытый на запись). Возвращает число строк по видам"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат экспорта: {fmt}")
+    counts = {}
+    with zipfile.ZipFile(destination, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for kind in EXPORT_COLUMNS:
+            counts[kind] = 0
+            with archive.open(f"{kind}.{fmt}", "w") as raw:
+                out = io.TextIOWrapper(raw, encoding="utf-8", newline="\n")
+                if fmt == "md":
+                    out.write(MARKDOWN_TITLES[kind])
+                for row in database.iter_export(kind, user_id):
+                    if fmt == "jsonl":
+                        out.write(json.dumps(_jsonable(row), ensure_ascii=False) + "\n")
+                    else:
+                        out.write(_markdown(kind, row))
+                    counts[kind] += 1
+                out.flush()
+                out.detach()
+        if fmt == "jsonl":
+            archive.writestr("manifest.json", json.dumps({
+                'version': EXPORT_VERSION,
+                'exported_at': datetime.now().isoformat(),
+                'counts': counts,
+            }, ensure_ascii=False, indent=2))
+    logger.info(f"📦 Экспорт пользователя {user_id} ({fmt}): {counts}")
+    return counts
+
+
+# ==================== ИМПОРТ ====================
+
+def _text(value: Any, required: bool = False) -> Optional[str]:
+    if value is None or value == "":
+        if required:
+            raise ValueError("пустое обязательное поле")
+        return None if value is None else ""
+    if not isinstance(value, str):
+        raise ValueError("ожидалась строка")
+    return value[:MAX_TEXT_LENGTH]
+
+
+def _datetime(value: Any, required: bool = False) -> Optional[datetime]:
+    if value is None:
+        if required:
+            raise ValueError("нет даты")
+        return None
+    return datetime.fromisoformat(value)
+
+
+def _note(row: Dict) -> Dict:
+    content = _text(row.get('content')) or ""
+    # Заметки лёгкого бота бывают без заголовка — берём его из начала текста
+    title = _text(row.get('title')) or note_title(content)
+    if not title:
+        raise ValueError("пустая заметка")
+    return {
+        'title': title[:255],
+        'content': content,
+        'created_at': _datetime(row.get('created_at')),
+        'updated_at': _datetime(row.get('updated_at')),
+    }
+
+
+def _bookmark(row: Dict) -> Dict:
+    message_type = _text(row.get('message_type')) or "text"
+    return {
+        'message_text': _text(row.get('message_text')),
+        'message_type': message_type[:32],
+        'file_id': _text(row.get('file_id')),
+        'file_unique_id': _text(row.get('file_unique_id')),
+        'media': _text(row.get('media')),
+        'tags': _text(row.get('tags')) or "",
+        'saved_at': _datetime(row.get('saved_at')),
+    }
+
+
+def _reminder(row: Dict, now: datetime) -> Dict:
+    remind_at = _datetime(row.get('remind_at'), required=True)
+    return {
+        'text': _text(row.get('text'), required=True),
+        'remind_at': remind_at,
+        # Просроченные приходят выполненными — иначе после импорта сработали бы все разом
+        'is_completed': bool(row.get('is_completed')) or remind_at <= now,
+        'created_at': _datetime(row.get('created_at')),
+    }
+
+
+def _parsers(now: datetime) -> Dict[str, Callable[[Dict], Dict]]:
+    return {'notes': _note, 'bookmarks': _bookmark, 'reminders': lambda row: _reminder(row, now)}
+
+
+def _drop_empty_dates(row: Dict) -> Dict:
+    # Отсутствующие даты не передаём: пусть сработают default=datetime.now колонок
+    return {key: value for key, value in row.items() if value is not None or not key.endswith("_at")}
+
+
+def _jsonl_sources(path: str) -> Iterator[tuple]:
+    """(вид данных, построчный текстовый поток) для архива экспорта или отдельного *.jsonl"""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            names = set(archive.namelist())
+            members = [archive.getinfo(f"{kind}.jsonl") for kind in EXPORT_COLUMNS if f"{kind}.jsonl" in names]
+            # Размер из заголовка архива; больше него zipfile и не распакует
+            if sum(member.file_size for member in members) > MAX_IMPORT_UNPACKED_SIZE:
+                raise ValueError(f"Архив распаковывается больше чем в {MAX_IMPORT_UNPACKED_SIZE // 2 ** 20} МБ")
+            for member in members:
+                with archive.open(member) as raw:
+                    yield member.filename.rsplit(".", 1)[0], io.TextIOWrapper(raw, encoding="utf-8")
+        return
+    kind = os.path.basename(path).rsplit(".", 1)[0]
+    if kind not in EXPORT_COLUMNS:
+        raise ValueError("Нужен zip из /export или файл notes.jsonl / bookmarks.jsonl / reminders.jsonl")
+    with open(path, encoding="utf-8") as lines:
+        yield kind, lines
+
+
+def _bounded_lines(stream: IO[str], limit: int) -> Iterator[Optional[str]]:
+    """Строки потока не длиннее limit символов; вместо более длинной — None, её остаток дочитывается кусками"""
+    while True:
+        line = stream.readline(limit)
+        if not line:
+            return
+        if len(line) < limit or line.endswith("\n"):
+            yield line
+            continue
+        while line and not line.endswith("\n"):
+            line = stream.readline(limit)
+        yield None
+
+
+def read_import(database: Database, user_id: int, path: str,
+                batch_size: int = IMPORT_BATCH_SIZE) -> Dict[str, Any]:
+    """Импортировать файл path пачками; битые и слишком длинные строки пропускаются и считаются"""
+    parsers = _parsers(datetime.now())
+    imported = {kind: 0 for kind in EXPORT_COLUMNS}
+    skipped = 0
+    total = 0
+    for kind, lines in _jsonl_sources(path):
+        batch: List[Dict] = []
+        for line in _bounded_lines(lines, MAX_IMPORT_LINE_LENGTH):
+            if line is None:
+                skipped += 1
+                continue
+            if not line.strip():
+                continue
+            if total >= MAX_IMPORT_ROWS:
+                skipped += 1
+                continue
+            try:
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError("ожидался объект")
+                batch.append(_drop_empty_dates(parsers[kind](row)))
+                total += 1
+            except (ValueError, TypeError, AttributeError):
+                skipped += 1
+                continue
+            if len(batch) >= batch_size:
+                imported[kind] += database.import_batch(kind, user_id, batch)
+                batch = []
+        imported[kind] += database.import_batch(kind, user_id, batch)
+    logger.info(f"📥 Импорт пользователя {user_id}: {imported}, пропущено {skipped}")
+    return {'imported': imported, 'skipped': skipped}
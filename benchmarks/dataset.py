@@ -0,0 +1,130 @@
+"""
+Воспроизводимый синтетический набор данных для бенчмарков.
+
+Один и тот же seed даёт те же строки на любой машине. Заметки распределены
+по пользователям с перекосом (закон Ципфа): немногие активные пользователи
+держат большую часть заметок — как в реальном боте, и как раз на них
+упираются списки и поиск.
+"""
+import random
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, NamedTuple
+
+WORDS = (
+    "молоко хлеб встреча проект отчёт идея звонок книга фильм подарок "
+    "врач спорт отпуск билет ремонт машина учёба код релиз бот заметка "
+    "список покупки работа дом семья рецепт кофе музыка план неделя"
+).split()
+
+# Редкие слова — для поиска с немногими совпадениями
+RARE_WORDS = ["квазар", "гобелен", "цитадель", "мандолина", "эклектика"]
+
+# Теги закладок: первые встречаются чаще (выбор с весами), до трёх на закладку
+TAGS = ["работа", "идеи", "читать", "дом", "учёба", "код", "рецепты", "путешествия"]
+
+BASE_TIME = datetime(2024, 1, 1)
+USER_ID_OFFSET = 10_000_000
+
+
+class DatasetSpec(NamedTuple):
+    users: int = 1000
+    notes_per_user: float = 50.0        # в среднем; фактическое распределение — Ципф
+    skew: float = 1.1                   # показатель Ципфа: больше — сильнее перекос
+    bookmarks_per_user: int = 20
+    reminders_per_user: int = 5
+    due_reminder_share: float = 0.2     # доля напоминаний, время которых уже наступило
+    seed: int = 42
+
+
+class Dataset:
+    """Генератор строк по DatasetSpec; user_id идут подряд от USER_ID_OFFSET"""
+
+    def __init__(self, spec: DatasetSpec):
+        self.spec = spec
+        self.user_ids = [USER_ID_OFFSET + i for i in range(spec.users)]
+        weights = [1.0 / (rank ** spec.skew) for rank in range(1, spec.users + 1)]
+        scale = spec.notes_per_user * spec.users / sum(weights)
+        # Ранги перемешаны: «горячие» пользователи не обязательно первые по id
+        ranks = list(range(spec.users))
+        random.Random(spec.seed).shuffle(ranks)
+        self.notes_count = {
+            user_id: max(1, int(round(weights[rank] * scale)))
+            for user_id, rank in zip(self.user_ids, ranks)
+        }
+        self.user_weights = [self.notes_count[user_id] for user_id in self.user_ids]
+
+    def _rng(self, salt: str) -> random.Random:
+        return random.Random(f"{self.spec.seed}:{salt}")
+
+    @staticmethod
+    def _text(rng: random.Random, words: int) -> str:
+        chosen = [rng.choice(WORDS) for _ in range(words)]
+        if rng.random() < 0.01:
+            chosen.insert(rng.randrange(len(chosen) + 1), rng.choice(RARE_WORDS))
+        return " ".join(chosen)
+
+    def users(self) -> Iterator[Dict]:
+        for user_id in self.user_ids:
+            yield {'user_id': user_id, 'username': f"user{user_id}", 'first_name': f"Пользователь {user_id}"}
+
+    def notes(self) -> Iterator[Dict]:
+        """Заметки: title (для database.py) и content; created_at растёт внутри пользователя"""
+        rng = self._rng("notes")
+        for user_id in self.user_ids:
+            for i in range(self.notes_count[user_id]):
+                created_at = BASE_TIME + timedelta(minutes=i * 37 + rng.randrange(30))
+                yield {
+                    'user_id': user_id,
+                    'title': self._text(rng, rng.randint(2, 8)),
+                    'content': self._text(rng, rng.randint(5, 120)),
+                    'created_at': created_at,
+                    'updated_at': created_at,
+                }
+
+    def bookmarks(self) -> Iterator[Dict]:
+        rng = self._rng("bookmarks")
+        # Отдельный поток случайных чисел: остальные поля закладок те же, что и до появления тегов
+        tag_rng = self._rng("bookmark-tags")
+        tag_weights = [1.0 / rank for rank in range(1, len(TAGS) + 1)]
+        for user_id in self.user_ids:
+            for i in range(self.spec.bookmarks_per_user):
+                media = rng.random() < 0.3
+                yield {
+                    'user_id': user_id,
+                    'message_text': None if media and rng.random() < 0.5 else self._text(rng, rng.randint(3, 200)),
+                    'message_type': rng.choice(["photo", "video", "document"]) if media else "text",
+                    'file_id': f"file-{user_id}-{i}" if media else None,
+                    'file_unique_id': f"uniq-{user_id}-{i}" if media else None,
+                    'saved_at': BASE_TIME + timedelta(hours=i * 5 + rng.randrange(5)),
+                    'tags': ",".join(dict.fromkeys(tag_rng.choices(TAGS, tag_weights, k=tag_rng.randint(0, 3)))),
+                }
+
+    def reminders(self, now: datetime) -> Iterator[Dict]:
+        rng = self._rng("reminders")
+        for user_id in self.user_ids:
+            for _ in range(self.spec.reminders_per_user):
+                if rng.random() < self.spec.due_reminder_share:
+                    remind_at = now - timedelta(minutes=rng.randint(1, 600))
+                else:
+                    remind_at = now + timedelta(minutes=rng.randint(1, 60 * 24 * 30))
+                yield {'user_id': user_id, 'text': self._text(rng, rng.randint(2, 10)),
+                       'remind_at': remind_at, 'is_completed': False}
+
+    def pick_users(self, count: int, salt: str = "pick") -> List[int]:
+        """Пользователи для запросов — с тем же перекосом, что и данные"""
+        return self._rng(salt).choices(self.user_ids, weights=self.user_weights, k=count)
+
+    def pick_queries(self, count: int, salt: str = "queries") -> List[str]:
+        rng = self._rng(salt)
+        return [rng.choice(RARE_WORDS) if rng.random() < 0.2 else rng.choice(WORDS) for _ in range(count)]
+
+
+def batched(rows: Iterator[Dict], size: int = 5000) -> Iterator[List[Dict]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -7,19 +7,45 @@ JARVIS Lite — Заметки с живым голосом
 ✅ При каждом сообщении: живое подтверждение ✨🚀🌙
 🔒 Обязательная подписка на @bot_pro_bot_you
 """
+import time
+_import_started = time.monotonic()  # ⏱️ отчёт о запуске считается от этой точки
+
 import os
 import sys
+import html
 import random
+import hashlib
 import asyncio
 from datetime import datetime
-from typing import List, Dict
-from aiogram import Bot, Dispatcher, F
-from aiogram.types import Message
+from collections import Counter
+from typing import Dict, List, Optional
+from aiogram import Bot, Dispatcher, Router, F
+from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
-from aiogram.enums import ChatMemberStatus
-from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.enums import ParseMode
+from aiogram.methods import GetUpdates, SetWebhook
 from loguru import logger
 from dotenv import load_dotenv
+from middlewares import (
+    SubscriptionMiddleware, UpdateMetricsMiddleware, HandlerMetricsMiddleware, ApiMetricsMiddleware,
+    QueryAuditMiddleware, MediaGroupMiddleware, message_media, album_captions
+)
+from async_db import run_db, shutdown_executor, LoopLagProbe
+from user_cache import UserProfileCache
+from ingest import NoteIngestQueue
+from outbox import OutboundSender
+from lanes import UpdateLanes, register_before_fsm
+from fsm_storage import create_storage
+import search as fulltext
+from metrics import StartupTimer, MetricsServer, REGISTRY, instrument_db
+from query_audit import QUERY_AUDIT, auditor as query_auditor
+
+startup_timer = StartupTimer(_import_started)
 
 # Настройка логирования
 logger.remove()
@@ -29,15 +55,25 @@ logger.add(sys.stdout, format="<green>{time:HH:mm:ss}</green> | <level>{message}
 load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 REQUIRED_CHANNEL = os.getenv("REQUIRED_CHANNEL", "@bot_pro_bot_you")
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./jarvis.db")
+BOT_MODE = os.getenv("BOT_MODE", "polling")  # polling | webhook
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")  # свой Bot API сервер или tools/fake_telegram.py
 
 if not BOT_TOKEN:
     logger.error("❌ BOT_TOKEN не задан!")
     sys.exit(1)
 
-bot = Bot(token=BOT_TOKEN)
+session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)) if TELEGRAM_API_URL else None
+# HTML по умолчанию: так размечены и ответы бота, и роутеры handlers/
+bot = Bot(token=BOT_TOKEN, session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
 dp = Dispatcher()
 
+# 📈 Вызовы API считаем до очереди: внешний middleware сессии ещё в контексте апдейта
+bot.session.middleware(ApiMetricsMiddleware())
+
+# 📤 Все исходящие сообщения — через очередь с лимитами Telegram
+outbox = OutboundSender()
+bot.session.middleware(outbox)
+
 # 🌍 Приветствия на 15 языках
 GREETINGS = [
     ("🇷🇺", "Привет"),
@@ -109,152 +145,96 @@ VOICE_MOODS = {
     ]
 }
 
-# Состояния пользователей для поиска
-user_search_state = set()
+# Состояния пользователей для поиска — в FSM-хранилище, общем для реплик
+class SearchStates(StatesGroup):
+    waiting_for_query = State()
+
+SEARCH_PAGE_SIZE = 10
+SEARCH_COUNT_CAP = 100
+
+# Последние запросы: в callback_data кладём короткий токен, а не сам текст (лимит 64 байта).
+# Токены живут в данных FSM пользователя, поэтому листание работает на любой реплике
+SEARCH_QUERIES_MAX = 5
+
+async def remember_search_query(state: FSMContext, query: str) -> str:
+    token = hashlib.blake2b(query.encode(), digest_size=4).hexdigest()
+    queries = (await state.get_data()).get("search_queries", {})
+    queries.pop(token, None)
+    queries[token] = query
+    while len(queries) > SEARCH_QUERIES_MAX:
+        queries.pop(next(iter(queries)))
+    await state.update_data(search_queries=queries)
+    return token
 
 # ==================== БАЗА ДАННЫХ ====================
 
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, func
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, scoped_session
-from contextlib import contextmanager
-
-if DATABASE_URL.startswith("postgresql"):
-    engine = create_engine(
-        DATABASE_URL,
-        pool_pre_ping=True,
-        pool_size=5,
-        max_overflow=10,
-        connect_args={"connect_timeout": 10}
-    )
-    logger.info("✅ Подключено к PostgreSQL")
-else:
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-    logger.info("✅ Подключено к SQLite")
-
-SessionLocal = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine))
-Base = declarative_base()
-
-class Note(Base):
-    __tablename__ = "notes"
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, nullable=False, index=True)
-    content = Column(Text, nullable=False)
-    created_at = Column(DateTime, default=func.now(), index=True)
-
-class User(Base):
-    __tablename__ = "users"
-    user_id = Column(Integer, primary_key=True)
-    username = Column(String)
-    first_name = Column(String)
-    last_name = Column(String)
-    last_active = Column(DateTime, default=func.now())
-    created_at = Column(DateTime, default=func.now())
-
-Base.metadata.create_all(bind=engine)
-logger.info("✅ Таблицы созданы / проверены")
-
-@contextmanager
-def get_db_session():
-    session = SessionLocal()
-    try:
-        yield session
-        session.commit()
-    except:
-        session.rollback()
-        raise
-    finally:
-        session.close()
-
-def add_note(user_id: int, content: str) -> int:
-    with get_db_session() as session:
-        note = Note(user_id=user_id, content=content)
-        session.add(note)
-        session.flush()
-        return note.id
-
-def search_notes(user_id: int, query: str) -> List[Dict]:
-    with get_db_session() as session:
-        notes = session.query(Note)\
-            .filter(
-                Note.user_id == user_id,
-                Note.content.ilike(f'%{query}%')
-            )\
-            .order_by(Note.created_at.desc())\
-            .all()
-        return [{
-            'id': n.id,
-            'content': n.content[:120] + '...' if len(n.content) > 120 else n.content,
-            'created_at': n.created_at
-        } for n in notes]
-
-def get_or_create_user(user_id: int, username: str = None, first_name: str = None, last_name: str = None):
-    with get_db_session() as session:
-        user = session.query(User).filter(User.user_id == user_id).first()
-        if not user:
-            user = User(
-                user_id=user_id,
-                username=username,
-                first_name=first_name,
-                last_name=last_name
-            )
-            session.add(user)
-            session.flush()
-            return {'user_id': user.user_id, 'first_name': user.first_name, 'username': user.username}
-        else:
-            user.username = username
-            user.first_name = first_name
-            user.last_name = last_name
-            user.last_active = datetime.now()
-            session.flush()
-            return {'user_id': user.user_id, 'first_name': user.first_name, 'username': user.username}
+# Та же схема, движок и пул, что у роутеров handlers/ — см. пакет database
+from database import db, get_engine, probe_db, init_db as init_database, DATABASE_URL
+
+def init_db():
+    """Схема (если не выключен DB_AUTO_MIGRATE), поиск и хранилище FSM"""
+    init_database()
+    # 🗂️ FSM: память с TTL или таблица fsm_states (FSM_STORAGE=sql) для нескольких реплик
+    dp.fsm.storage = create_storage(get_engine())
+
+# 👤 Профили в памяти, запись в БД пачками (write-behind)
+user_profiles = UserProfileCache(db.save_user_profiles)
+
+# 📥 Групповой коммит: заметки всех пользователей пишутся пачками
+note_ingest = NoteIngestQueue(db.add_notes)
 
 # ==================== ИМПОРТ КЛАВИАТУР ====================
 
-from keyboards import get_main_keyboard, get_search_keyboard
+from keyboards import (
+    get_main_keyboard, get_search_keyboard,
+    SearchPageCallback, get_search_pagination_keyboard
+)
+
+# ==================== МЕТРИКИ ====================
+
+# 📈 Апдейт целиком — самым внешним middleware (до FSM и дорожек), чтобы учесть
+# и ожидание в дорожке, и проверку подписки
+register_before_fsm(dp, UpdateMetricsMiddleware())
+handler_metrics = HandlerMetricsMiddleware()
+dp.message.middleware(handler_metrics)
+dp.callback_query.middleware(handler_metrics)
+metrics_server = MetricsServer()
+
+# 🔎 Аудит запросов (QUERY_AUDIT=1): медленные запросы с планом и N+1 по хендлерам
+if QUERY_AUDIT:
+    dp.message.middleware(QueryAuditMiddleware(query_auditor))
+    dp.callback_query.middleware(QueryAuditMiddleware(query_auditor))
+
+# ==================== АЛЬБОМЫ И ДОРОЖКИ ====================
+
+# 🖼️ Части альбома склеиваются до проверки подписки: одна проверка, одна запись, один ответ.
+# Собираются до дорожек, а остальные части ждутся уже в дорожке пользователя
+media_groups = MediaGroupMiddleware()
+register_before_fsm(dp, media_groups)
+
+# 🛣️ Апдейты одного пользователя — строго по порядку, разных — параллельно.
+# Дорожка назначается до чтения FSM-состояния (первого await в цепочке);
+# пока дорожка полна, новые апдейты у Telegram не забираем
+update_lanes = UpdateLanes()
+register_before_fsm(dp, update_lanes)
+bot.session.middleware(update_lanes.poll_gate)
+dp.update.outer_middleware(media_groups.complete)
 
 # ==================== ЗАЩИТА ПОДПИСКИ ====================
 
-async def is_subscribed(user_id: int) -> bool:
-    try:
-        member = await bot.get_chat_member(REQUIRED_CHANNEL, user_id)
-        return member.status in [ChatMemberStatus.MEMBER, ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.CREATOR]
-    except (TelegramBadRequest, TelegramForbiddenError):
-        return True
-    except Exception:
-        return False
-
-async def send_subscription_required(message: Message):
-    await message.answer(
-        f"🔒 <b>Подписка обязательна</b>\n\n"
-        f"Подпишитесь на канал, чтобы пользоваться ботом:\n"
-        f"<a href='https://t.me/{REQUIRED_CHANNEL.lstrip('@')}'>@bot_pro_bot_you</a>",
-        reply_markup=ReplyKeyboardMarkup(
-            keyboard=[[KeyboardButton(text="📺 Перейти в канал")]],
-            resize_keyboard=True,
-            one_time_keyboard=False
-        ),
-        disable_web_page_preview=True
-    )
+# 🔒 Одна проверка на апдейт (кэш + схлопывание параллельных запросов)
+subscription_gate = SubscriptionMiddleware(REQUIRED_CHANNEL)
+dp.update.outer_middleware(subscription_gate)
 
 # ==================== ОБРАБОТЧИКИ ====================
 
 @dp.message(Command("start"))
 async def start_handler(message: Message):
-    if not await is_subscribed(message.from_user.id):
-        await send_subscription_required(message)
-        return
-    
-    user = get_or_create_user(
-        message.from_user.id,
-        message.from_user.username,
-        message.from_user.first_name,
-        message.from_user.last_name
-    )
+    user = user_profiles.touch(message.from_user)
     
     # 🎙️ Персональное обращение по имени
     name = user['first_name'] or user['username'] or "друг"
-    name = name.split()[0]  # Только первое имя
+    name = html.escape(name.split()[0])  # Только первое имя
     
     # 🌍 Приветствие на случайном языке
     flag, greeting_word = random.choice(GREETINGS)
@@ -272,18 +252,9 @@ async def start_handler(message: Message):
 
 @dp.message(F.text == "🚀 Старт")
 async def start_menu(message: Message):
-    if not await is_subscribed(message.from_user.id):
-        await send_subscription_required(message)
-        return
-    
-    user = get_or_create_user(
-        message.from_user.id,
-        message.from_user.username,
-        message.from_user.first_name,
-        message.from_user.last_name
-    )
+    user = user_profiles.touch(message.from_user)
     
-    name = (user['first_name'] or user['username'] or "друг").split()[0]
+    name = html.escape((user['first_name'] or user['username'] or "друг").split()[0])
     
     await message.answer(
         f"✨ Привет, {name}!\n\n"
@@ -296,21 +267,16 @@ async def start_menu(message: Message):
     )
 
 @dp.message(F.text == "🔍 Поиск")
-async def search_start(message: Message):
-    if not await is_subscribed(message.from_user.id):
-        await send_subscription_required(message)
-        return
-    
-    user_search_state.add(message.from_user.id)
+async def search_start(message: Message, state: FSMContext):
+    await state.set_state(SearchStates.waiting_for_query)
     await message.answer(
         "🔍 Введи слово или фразу для поиска:",
         reply_markup=get_search_keyboard()
     )
 
 @dp.message(F.text == "❌ Отменить поиск")
-async def cancel_search(message: Message):
-    if message.from_user.id in user_search_state:
-        user_search_state.remove(message.from_user.id)
+async def cancel_search(message: Message, state: FSMContext):
+    await state.set_state(None)
     await message.answer("Поиск отменён ✅", reply_markup=get_main_keyboard())
 
 @dp.message(Command("help"))
@@ -323,31 +289,61 @@ async def help_handler(message: Message):
         "Просто напиши или перешли сообщение — я мгновенно запомню.\n"
         "Ответ: живое подтверждение с эмодзи ✨🚀🌙\n\n"
         "🔍 <b>Поиск:</b>\n"
-        "Нажми «🔍 Поиск» → введи слово → я покажу все подходящие заметки.",
+        "Нажми «🔍 Поиск» → введи слово → я покажу все подходящие заметки.\n\n"
+        "🗂️ <b>Разделы:</b>\n"
+        "/menu — заметки, закладки, напоминания и настройки; /export и /import — архив данных.",
         reply_markup=get_main_keyboard()
     )
 
-@dp.message()
-async def message_handler(message: Message):
-    user_id = message.from_user.id
+def render_search_page(page: Dict) -> str:
+    return "\n\n".join(f"• {fulltext.render_snippet(note['content'])}" for note in page['items'])
+
+@dp.callback_query(SearchPageCallback.filter())
+async def search_page_handler(callback: CallbackQuery, callback_data: SearchPageCallback, state: FSMContext):
+    query = (await state.get_data()).get("search_queries", {}).get(callback_data.token)
+    if query is None:
+        await callback.answer("⌛ Поиск устарел — повтори его через 🔍 Поиск", show_alert=True)
+        return
     
-    if not await is_subscribed(user_id):
-        await send_subscription_required(message)
+    page = await run_db(db.search_notes, callback.from_user.id, query, callback_data.cursor, callback_data.back,
+                        SEARCH_PAGE_SIZE)
+    if not page['items']:
+        await callback.answer("Больше ничего не нашлось")
         return
     
-    user = get_or_create_user(
-        user_id,
-        message.from_user.username,
-        message.from_user.first_name,
-        message.from_user.last_name
+    await callback.message.edit_text(
+        render_search_page(page),
+        parse_mode="HTML",
+        reply_markup=get_search_pagination_keyboard(callback_data.token, page['prev_cursor'], page['next_cursor'])
     )
+    await callback.answer()
+
+ALBUM_LABELS = {"photo": "фото", "video": "видео", "document": "файл", "audio": "аудио", "animation": "GIF"}
+
+def album_note_content(album: List[Message]) -> str:
+    """Заметка из альбома: подписи, состав одной строкой и имена файлов"""
+    kinds = Counter(media['type'] for media in map(message_media, album) if media)
+    summary = ", ".join(f"{count} {ALBUM_LABELS[kind]}" for kind, count in kinds.items())
+    names = [part.document.file_name for part in album if part.document and part.document.file_name]
+    lines = [album_captions(album), f"[🖼️ Альбом: {summary}]", *(f"[📄 {name}]" for name in names)]
+    return "\n".join(line for line in lines if line)
+
+# Всё остальное — заметка или поисковый запрос. Отдельный роутер подключается последним:
+# у роутеров handlers/ свои состояния FSM и колбэки, им catch-all мешать не должен
+lite_router = Router(name="lite")
+
+@lite_router.message()
+async def message_handler(message: Message, state: FSMContext, album: Optional[List[Message]] = None):
+    user_id = message.from_user.id
+    
+    user = user_profiles.touch(message.from_user)
     
     # Режим поиска
-    if user_id in user_search_state:
-        query = message.text.strip()
+    if await state.get_state() == SearchStates.waiting_for_query.state:
+        query = (message.text or "").strip()
         
         if query == "❌ Отменить поиск":
-            user_search_state.discard(user_id)
+            await state.set_state(None)
             await message.answer("Поиск отменён ✅", reply_markup=get_main_keyboard())
             return
         
@@ -355,30 +351,45 @@ async def message_handler(message: Message):
             await message.answer("⚠️ Введи текст для поиска", reply_markup=get_search_keyboard())
             return
         
-        user_search_state.discard(user_id)
-        results = search_notes(user_id, query)
+        await state.set_state(None)
+        page, found = await run_db(db.search_first_page, user_id, query, SEARCH_PAGE_SIZE, SEARCH_COUNT_CAP)
         
-        if not results:
+        if not page['items']:
             await message.answer(
-                f"📭 Не нашёл заметок по «<code>{query}</code>»",
+                f"📭 Не нашёл заметок по «<code>{html.escape(query)}</code>»",
+                parse_mode="HTML",
                 reply_markup=get_main_keyboard()
             )
             return
         
-        text = f"✅ Нашёл {len(results)} заметок:\n\n"
-        for i, note in enumerate(results[:10], 1):
-            text += f"{i}. {note['content']}\n\n"
+        found_text = f"больше {SEARCH_COUNT_CAP}" if found > SEARCH_COUNT_CAP else str(found)
+        header = f"✅ Нашёл {found_text} заметок по «{html.escape(query)}»"
         
-        if len(results) > 10:
-            text += f"...и ещё {len(results) - 10}"
+        if page['next_cursor'] is None:
+            await message.answer(
+                f"{header}:\n\n{render_search_page(page)}",
+                parse_mode="HTML",
+                reply_markup=get_main_keyboard()
+            )
+            return
         
-        await message.answer(text, reply_markup=get_main_keyboard())
+        # Возвращаем основную клавиатуру, а страницу отправляем с inline-листанием
+        token = await remember_search_query(state, query)
+        await message.answer(header, parse_mode="HTML", reply_markup=get_main_keyboard())
+        await message.answer(
+            render_search_page(page),
+            parse_mode="HTML",
+            reply_markup=get_search_pagination_keyboard(token, page['prev_cursor'], page['next_cursor'])
+        )
         return
     
     # === СОХРАНЕНИЕ ЗАМЕТКИ ===
     content = message.text or message.caption or ""
     
-    if message.photo:
+    if album:
+        # 🖼️ Весь альбом — одна заметка (MediaGroupMiddleware)
+        content = album_note_content(album)
+    elif message.photo:
         content = (message.caption or "") + "\n[🖼️ Фото]"
     elif message.document:
         content = (message.caption or "") + f"\n[📄 {message.document.file_name}]"
@@ -391,7 +402,7 @@ async def message_handler(message: Message):
         await message.reply("💭 Пустые мысли не ловлю. Напиши что-нибудь!")
         return
     
-    add_note(user_id, content)
+    await note_ingest.submit(user_id, content)
     
     # 🎙️ ЖИВОЙ ГОЛОС БОТА — разные эмодзи и фразы по времени суток
     hour = datetime.now().hour
@@ -407,29 +418,99 @@ async def message_handler(message: Message):
     # Персональное обращение (иногда)
     name = user['first_name'] or user['username'] or None
     if name and random.random() < 0.3:  # 30% шанс обратиться по имени
-        name = name.split()[0]
+        name = html.escape(name.split()[0])
         response = f"{mood} {phrase}, {name}!"
     else:
         response = f"{mood} {phrase}"
     
     await message.reply(response, reply_markup=get_main_keyboard())
 
+# ==================== РОУТЕРЫ РАЗДЕЛОВ ====================
+
+from handlers import menu, notes, bookmarks, reminders, settings, export, maintenance
+
+dp.include_routers(
+    menu.router, notes.router, bookmarks.router, reminders.router,
+    settings.router, export.router, maintenance.router,
+    lite_router
+)
+
 # ==================== ЗАПУСК ====================
 
+# ⏱️ Контроль лага event loop: p99 не должен расти вместе с латентностью БД
+loop_lag_probe = LoopLagProbe()
+
+@dp.startup()
+async def on_startup():
+    loop_lag_probe.start()
+    update_lanes.start()
+    user_profiles.start()
+    note_ingest.start()
+    REGISTRY.gauge("jarvis_outbox_depth", "Исходящие в очереди outbox", outbox.depth)
+    REGISTRY.gauge("jarvis_loop_lag_p99_seconds", "p99 лага event loop",
+                   lambda: loop_lag_probe.stats()["p99_ms"] / 1000)
+    await metrics_server.start()
+
+@dp.shutdown()
+async def on_shutdown():
+    await metrics_server.stop()
+    await loop_lag_probe.stop()
+    # Сначала доработать апдейты из дорожек — они ещё пишут заметки и шлют ответы
+    await update_lanes.close()
+    logger.info(f"🛣️ Дорожки: {update_lanes.stats()}")
+    await note_ingest.close()
+    logger.info(f"📥 Пакетная запись заметок: {note_ingest.stats()}")
+    await user_profiles.close()
+    logger.info(f"👤 Профили: {user_profiles.stats()}")
+    logger.info(f"⏱️ Лаг event loop: {loop_lag_probe.stats()}")
+    logger.info(f"🔒 Кэш подписок: {subscription_gate.stats()}")
+    logger.info(f"🖼️ Альбомы: {media_groups.stats()}")
+    await outbox.close()
+    logger.info(f"📤 Исходящие: {outbox.stats()}")
+    shutdown_executor()
+    if QUERY_AUDIT:
+        query_auditor.log_report()
+        query_auditor.dump()
+
+async def first_poll_probe(make_request, bot: Bot, method):
+    """Отметить первый getUpdates / setWebhook — бот готов принимать апдейты — и снять себя"""
+    if isinstance(method, (GetUpdates, SetWebhook)):
+        bot.session.middleware.unregister(first_poll_probe)
+        startup_timer.mark("first_poll")
+        logger.info(f"⏱️ Запуск: {startup_timer.report()}")
+    return await make_request(bot, method)
+
 async def main():
+    startup_timer.mark("import")
     logger.info("🚀 Запуск JARVIS Lite с живым голосом")
-    logger.info(f"🤖 Бот: @{(await bot.get_me()).username}")
-    logger.info(f"🔒 Подписка: {REQUIRED_CHANNEL}")
-    logger.info(f"💾 База данных: {DATABASE_URL}")
+    bot.session.middleware(first_poll_probe)
+    instrument_db()
+    if QUERY_AUDIT:
+        query_auditor.install()
     
+    # getMe и подготовка БД идут параллельно
+    me_task = asyncio.create_task(bot.get_me())
     try:
-        test_id = add_note(123456, "Тест")
-        logger.info(f"✅ База данных работает (тестовая заметка ID: {test_id})")
+        probe_ms = await run_db(probe_db)
+        logger.info(f"✅ База данных доступна ({probe_ms:.0f} мс)")
+        await run_db(init_db)
     except Exception as e:
         logger.error(f"❌ Ошибка БД: {e}")
         sys.exit(1)
+    startup_timer.mark("db_ready")
     
-    await dp.start_polling(bot)
+    logger.info(f"🤖 Бот: @{(await me_task).username}")
+    logger.info(f"🔒 Подписка: {REQUIRED_CHANNEL}")
+    logger.info(f"💾 База данных: {DATABASE_URL}")
+    
+    if BOT_MODE == "webhook":
+        from webhook import run_webhook, create_deduplicator
+        await run_webhook(dp, bot, backpressure=update_lanes.wait_for_room,
+                          deduplicator=create_deduplicator(get_engine()))
+    else:
+        # Webhook и getUpdates взаимоисключающие — при переходе на polling снимаем webhook
+        await bot.delete_webhook()
+        await dp.start_polling(bot)
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,27 @@
+"""
+Доступ к данным JARVIS — один пакет для лёгкого бота (bot.py) и роутеров handlers/.
+
+• engine — единственный движок и пул соединений процесса, сессии
+• models — единая схема (users, notes, bookmarks и их теги, reminders, user_counters)
+• schema — миграции и init_db()
+• repository — Database / AsyncDatabase и общие экземпляры db / adb
+"""
+from database.engine import DATABASE_URL, get_engine, get_db_session, probe_db
+from database.models import (
+    Base, User, Bookmark, Reminder, Note, UserCounters, Tag, BookmarkTag,
+    NOTE_TITLE_LENGTH, note_title, TAG_MAX_LENGTH, normalize_tags
+)
+from database.repository import (
+    Database, AsyncDatabase, db, adb, WORKER_ID,
+    LIST_PAGE_SIZE, EXPORT_COLUMNS, EXPORT_BATCH_SIZE, IMPORT_BATCH_SIZE
+)
+from database.schema import MIGRATIONS, MIGRATIONS_NAMESPACE, hot_queries, migrate, init_db
+
+__all__ = [
+    "DATABASE_URL", "get_engine", "get_db_session", "probe_db",
+    "Base", "User", "Bookmark", "Reminder", "Note", "UserCounters", "Tag", "BookmarkTag",
+    "NOTE_TITLE_LENGTH", "note_title", "TAG_MAX_LENGTH", "normalize_tags",
+    "Database", "AsyncDatabase", "db", "adb", "WORKER_ID",
+    "LIST_PAGE_SIZE", "EXPORT_COLUMNS", "EXPORT_BATCH_SIZE", "IMPORT_BATCH_SIZE",
+    "MIGRATIONS", "MIGRATIONS_NAMESPACE", "hot_queries", "migrate", "init_db",
+]
@@ -0,0 +1,91 @@
+"""
+Единственный движок SQLAlchemy процесса и сессии поверх него.
+
+И лёгкий бот (bot.py), и роутеры handlers/, и хранилище FSM берут соединения
+из одного пула: на процесс не больше DB_POOL_SIZE + DB_MAX_OVERFLOW соединений.
+"""
+import os
+import time
+import threading
+import logging
+from contextlib import contextmanager
+from sqlalchemy import create_engine, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import sessionmaker, scoped_session
+
+logger = logging.getLogger(__name__)
+
+# Получаем строку подключения из переменных окружения
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./jarvis.db")
+# Пул: запросы идут из пула потоков run_db (DB_EXECUTOR_WORKERS), запас — на стриминг экспорта и FSM
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+
+# Движок создаётся при первом обращении, схема — явным init_db():
+# импорт модуля не подключается к БД и не выполняет DDL
+engine = None
+_engine_lock = threading.Lock()
+
+# Создаём сессию (привязка к движку — в get_engine)
+SessionLocal = scoped_session(sessionmaker(
+    autocommit=False,
+    autoflush=False
+))
+
+def get_engine():
+    """Движок SQLAlchemy; создаётся один раз, при первом вызове"""
+    global engine
+    if engine is not None:
+        return engine
+    with _engine_lock:
+        if engine is None:
+            if DATABASE_URL.startswith("postgresql"):
+                created = create_engine(
+                    DATABASE_URL,
+                    pool_pre_ping=True,  # Проверяем соединение перед использованием
+                    pool_size=DB_POOL_SIZE,
+                    max_overflow=DB_MAX_OVERFLOW,
+                    connect_args={"connect_timeout": 10},
+                    echo=False            # True для отладки SQL-запросов
+                )
+                logger.info(f"✅ Движок PostgreSQL создан (пул {DB_POOL_SIZE} + {DB_MAX_OVERFLOW})")
+            else:
+                # Fallback на SQLite для локальной разработки
+                created = create_engine(
+                    DATABASE_URL,
+                    connect_args={"check_same_thread": False},
+                    echo=False
+                )
+                logger.info("✅ Движок SQLite создан")
+            SessionLocal.configure(bind=created)
+            engine = created
+    return engine
+
+def probe_db() -> float:
+    """Проверка связи без записи: SELECT 1. Возвращает время ответа в мс"""
+    started = time.perf_counter()
+    with get_engine().connect() as conn:
+        conn.execute(text("SELECT 1"))
+    return (time.perf_counter() - started) * 1000
+
+# ==================== КОНТЕКСТНЫЙ МЕНЕДЖЕР ДЛЯ СЕССИЙ ====================
+
+@contextmanager
+def get_db_session():
+    """Контекстный менеджер для безопасной работы с сессией"""
+    get_engine()
+    session = SessionLocal()
+    try:
+        yield session
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        logger.error(f"Ошибка в сессии БД: {e}")
+        raise
+    finally:
+        session.close()
+
+def _upsert(model):
+    """INSERT … ON CONFLICT в диалекте текущей БД"""
+    return (pg_insert if get_engine().dialect.name == "postgresql" else sqlite_insert)(model)
@@ -0,0 +1,184 @@
+"""
+Единая схема JARVIS: её используют и лёгкий бот (bot.py), и роутеры handlers/.
+
+Заметка лёгкого бота — это та же строка notes: content из сообщения, а title
+берётся из его начала (note_title). Старые строки без title дозаполняет миграция.
+"""
+import re
+from datetime import datetime
+from typing import Iterable, List, Union
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Index
+from sqlalchemy.orm import declarative_base, relationship
+
+Base = declarative_base()
+
+NOTE_TITLE_LENGTH = 100
+
+def note_title(content: str) -> str:
+    """Заголовок заметки из её текста: начало в одну строку"""
+    return " ".join((content or "")[:NOTE_TITLE_LENGTH].split())
+
+TAG_MAX_LENGTH = 32
+TAGS_PER_BOOKMARK = 10
+_TAG_SEPARATORS = re.compile(r"[,\s#]+")
+
+def normalize_tags(tags: Union[str, Iterable[str], None]) -> List[str]:
+    """
+    «Работа, #идеи работа» → ['работа', 'идеи']: нижний регистр, без #,
+    без повторов, порядок сохраняется. Тег — одно слово (разделители — запятые и пробелы)
+    """
+    if not tags:
+        return []
+    if not isinstance(tags, str):
+        tags = ",".join(tags)
+    names = []
+    for name in _TAG_SEPARATORS.split(tags.lower()):
+        name = name[:TAG_MAX_LENGTH]
+        if name and name not in names:
+            names.append(name)
+    return names[:TAGS_PER_BOOKMARK]
+
+# ==================== МОДЕЛИ ====================
+
+class User(Base):
+    """Модель пользователя"""
+    __tablename__ = "users"
+
+    user_id = Column(Integer, primary_key=True, index=True)
+    username = Column(String, nullable=True)
+    first_name = Column(String, nullable=True)
+    last_name = Column(String, nullable=True)
+    language_code = Column(String, default="ru")
+    is_premium = Column(Boolean, default=False)
+    # Время — из Python, не func.now(): на SQLite строка всегда одного вида (с микросекундами),
+    # иначе строковое сравнение с курсором страницы путает строки одной секунды
+    joined_at = Column(DateTime, default=datetime.now)
+    last_active = Column(DateTime, default=datetime.now, nullable=True)  # пишет кэш профилей бота
+
+    # Связи
+    bookmarks = relationship("Bookmark", back_populates="user", cascade="all, delete-orphan")
+    reminders = relationship("Reminder", back_populates="user", cascade="all, delete-orphan")
+    notes = relationship("Note", back_populates="user", cascade="all, delete-orphan")
+
+    def __repr__(self):
+        return f"<User {self.user_id} @{self.username}>"
+
+class Bookmark(Base):
+    """Модель закладки"""
+    __tablename__ = "bookmarks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
+    message_text = Column(Text, nullable=True)
+    message_type = Column(String, default="text")  # text, photo, video, document
+    file_id = Column(String, nullable=True)
+    # Постоянный id файла у Telegram (file_id меняется) — одно медиа сохраняется один раз
+    file_unique_id = Column(String, nullable=True)
+    # Альбом (message_type = "album"): JSON-список вложений [{"type", "file_id", "file_unique_id"}]
+    media = Column(Text, nullable=True)
+    saved_at = Column(DateTime, default=datetime.now, index=True)
+    tags = Column(String, default="")  # через запятую: "работа,идеи"; для поиска — bookmark_tags
+
+    # Связь
+    user = relationship("User", back_populates="bookmarks")
+
+    def __repr__(self):
+        return f"<Bookmark {self.id} user={self.user_id}>"
+
+class Reminder(Base):
+    """Модель напоминания"""
+    __tablename__ = "reminders"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
+    text = Column(Text, nullable=False)
+    remind_at = Column(DateTime, nullable=False, index=True)
+    is_completed = Column(Boolean, default=False)  # индексы — частичные, см. ниже
+    created_at = Column(DateTime, default=datetime.now)
+    # Аренда (lease) при доставке: какой воркер забрал напоминание и до какого времени
+    claimed_by = Column(String, nullable=True)
+    claimed_until = Column(DateTime, nullable=True)
+
+    # Связь
+    user = relationship("User", back_populates="reminders")
+
+    def __repr__(self):
+        return f"<Reminder {self.id} user={self.user_id} at={self.remind_at}>"
+
+class Note(Base):
+    """Модель заметки"""
+    __tablename__ = "notes"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
+    # nullable: в заметках старого формата лёгкого бота title не было — дозаполняется миграцией
+    title = Column(String, nullable=True)
+    content = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, index=True)
+
+    # Связь
+    user = relationship("User", back_populates="notes")
+
+    def __repr__(self):
+        return f"<Note {self.id} user={self.user_id} title={self.title}>"
+
+class Tag(Base):
+    """Тег пользователя (нормализованное имя, см. normalize_tags)"""
+    __tablename__ = "tags"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
+    name = Column(String(TAG_MAX_LENGTH), nullable=False)
+
+    def __repr__(self):
+        return f"<Tag {self.id} user={self.user_id} #{self.name}>"
+
+class BookmarkTag(Base):
+    """Связь закладка — тег. user_id и saved_at скопированы из закладки: выборка по тегу идёт по индексу"""
+    __tablename__ = "bookmark_tags"
+
+    bookmark_id = Column(Integer, ForeignKey("bookmarks.id", ondelete="CASCADE"), primary_key=True)
+    tag_id = Column(Integer, ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    saved_at = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<BookmarkTag bookmark={self.bookmark_id} tag={self.tag_id}>"
+
+class UserCounters(Base):
+    """Счётчики пользователя — обновляются в тех же транзакциях, что и сами данные"""
+    __tablename__ = "user_counters"
+
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True)
+    bookmarks_count = Column(Integer, nullable=False, default=0)
+    reminders_count = Column(Integer, nullable=False, default=0)  # только активные
+    notes_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    def __repr__(self):
+        return f"<UserCounters user={self.user_id}>"
+
+# ==================== ИНДЕКСЫ ГОРЯЧИХ ЗАПРОСОВ ====================
+
+# Списки: WHERE user_id = ? ORDER BY время DESC, id DESC — keyset идёт прямо по индексу
+Index("ix_bookmarks_user_saved", Bookmark.user_id, Bookmark.saved_at.desc(), Bookmark.id.desc())
+# Медиа в закладках без повторов: повторное сохранение обновляет строку (NULL у текста не конфликтует)
+Index("ux_bookmarks_user_file", Bookmark.user_id, Bookmark.file_unique_id, unique=True)
+Index("ix_notes_user_updated", Note.user_id, Note.updated_at.desc(), Note.id.desc())
+# Поиск лёгкого бота: заметки пользователя от новых к старым по времени создания
+Index("ix_notes_user_created", Note.user_id, Note.created_at.desc(), Note.id.desc())
+
+# Теги: имя уникально у пользователя; закладки по тегу — keyset по (saved_at, id) прямо по индексу,
+# он же отдаёт число закладок на тег без чтения самих закладок
+Index("ux_tags_user_name", Tag.user_id, Tag.name, unique=True)
+Index("ix_bookmark_tags_user_tag", BookmarkTag.user_id, BookmarkTag.tag_id,
+      BookmarkTag.saved_at.desc(), BookmarkTag.bookmark_id.desc())
+
+# Частичные индексы только по невыполненным напоминаниям: выполненные копятся, но не мешают.
+# Условие записано так же, как в запросах (is_completed = false), чтобы планировщик его узнал
+_pending = Reminder.is_completed == False
+Index("ix_reminders_pending_remind_at", Reminder.remind_at, Reminder.id,
+      postgresql_where=_pending, sqlite_where=_pending)
+Index("ix_reminders_user_pending", Reminder.user_id, Reminder.remind_at,
+      postgresql_where=_pending, sqlite_where=_pending)
@@ -0,0 +1,1043 @@
+"""
+Database module for JARVIS bot - доступ к данным поверх единой схемы (database.models)
+"""
+import os
+import json
+import socket
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Callable, Iterable, Iterator, Sequence, Tuple
+import logging
+from sqlalchemy import (
+    func, text, select, insert, update, delete, or_,
+    case, literal, tuple_, exists, bindparam
+)
+from sqlalchemy.orm import aliased
+import search as fulltext
+from async_db import run_db
+from pagination import build_page, cursor_bind_value, decode_cursor
+from database.engine import get_engine, get_db_session, _upsert
+from database.models import (
+    User, Bookmark, Reminder, Note, UserCounters, Tag, BookmarkTag, note_title, normalize_tags
+)
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ==================== СЧЁТЧИКИ ====================
+
+COUNTER_COLUMNS = ('bookmarks_count', 'reminders_count', 'notes_count')
+
+def _bump_counters(session, user_id: int, bookmarks: int = 0, reminders: int = 0, notes: int = 0):
+    """Атомарно сдвинуть счётчики пользователя внутри текущей транзакции (один UPSERT)"""
+    deltas = dict(zip(COUNTER_COLUMNS, (bookmarks, reminders, notes)))
+    if not any(deltas.values()):
+        return
+    stmt = _upsert(UserCounters).values(user_id=user_id, **{
+        name: max(delta, 0) for name, delta in deltas.items()
+    })
+    session.execute(stmt.on_conflict_do_update(
+        index_elements=[UserCounters.user_id],
+        set_={
+            **{name: getattr(UserCounters, name) + delta for name, delta in deltas.items() if delta},
+            'updated_at': datetime.now()
+        }
+    ))
+
+# ==================== СПИСКИ ПО СТРАНИЦАМ ====================
+
+LIST_PAGE_SIZE = 10
+
+def _truncated(column, length: int):
+    """Обрезка текста в SQL: в Python не тянем полный текст ради короткого превью"""
+    return case(
+        (func.length(column) > length, func.substr(column, 1, length) + '...'),
+        else_=column
+    )
+
+def _list_page(session, columns: list, user_column, time_column, id_column, user_id: int,
+               cursor: Optional[str], backward: bool, limit: int, conditions: Sequence = ()) -> Dict:
+    """
+    Keyset-страница по (time_column, id_column), от новых к старым.
+    Выбираются только columns (+ ключ страницы), без OFFSET; conditions — дополнительные условия.
+    """
+    stmt = select(*columns, time_column.label('page_time'), id_column.label('page_id'))\
+        .where(user_column == user_id, *conditions)
+    if cursor:
+        moment, row_id = decode_cursor(cursor)
+        position = tuple_(time_column, id_column)
+        bound = tuple_(literal(cursor_bind_value(get_engine().dialect.name, moment)), literal(row_id))
+        stmt = stmt.where(position > bound if backward else position < bound)
+    if backward:
+        stmt = stmt.order_by(time_column.asc(), id_column.asc())
+    else:
+        stmt = stmt.order_by(time_column.desc(), id_column.desc())
+    
+    rows = [dict(row._mapping) for row in session.execute(stmt.limit(limit + 1))]
+    return build_page(rows, limit, cursor, backward, key=lambda row: (row['page_time'], row['page_id']))
+
+# ==================== ТЕГИ ====================
+
+def _link_tags(conn, user_id: int, links: List[Tuple[int, List[str]]]) -> int:
+    """
+    Привязать теги к закладкам пользователя: links — (bookmark_id, имена тегов).
+    Недостающие теги создаются одним UPSERT, связи — INSERT … SELECT по тегу: saved_at
+    копируется из закладки в SQL (на SQLite — в том же строковом виде, что сравнивает курсор),
+    чужие закладки отсекаются условием. conn — сессия или соединение. Возвращает число новых связей.
+    """
+    bookmarks_by_tag: Dict[str, List[int]] = {}
+    for bookmark_id, tag_names in links:
+        for name in tag_names:
+            bookmarks_by_tag.setdefault(name, []).append(bookmark_id)
+    if not bookmarks_by_tag:
+        return 0
+    names = sorted(bookmarks_by_tag)
+    conn.execute(_upsert(Tag).values([{'user_id': user_id, 'name': name} for name in names])
+                 .on_conflict_do_nothing(index_elements=[Tag.user_id, Tag.name]))
+    tag_ids = dict(conn.execute(select(Tag.name, Tag.id).where(Tag.user_id == user_id, Tag.name.in_(names))).all())
+    linked = 0
+    for name in names:
+        source = select(
+            Bookmark.id, literal(tag_ids[name]), Bookmark.user_id,
+            # saved_at у закладки nullable, а ключ страницы по тегу — нет
+            func.coalesce(Bookmark.saved_at, datetime.now())
+        ).where(Bookmark.user_id == user_id, Bookmark.id.in_(bookmarks_by_tag[name]))
+        result = conn.execute(
+            _upsert(BookmarkTag)
+            .from_select(['bookmark_id', 'tag_id', 'user_id', 'saved_at'], source)
+            .on_conflict_do_nothing(index_elements=[BookmarkTag.bookmark_id, BookmarkTag.tag_id])
+        )
+        linked += result.rowcount
+    return linked
+
+def _sync_tag_strings(session, bookmark_ids: List[int]):
+    """Переписать Bookmark.tags («a,b») по связям — строка остаётся для показа и экспорта. session — сессия или соединение"""
+    names: Dict[int, List[str]] = {bookmark_id: [] for bookmark_id in bookmark_ids}
+    rows = session.execute(
+        select(BookmarkTag.bookmark_id, Tag.name)
+        .join(Tag, Tag.id == BookmarkTag.tag_id)
+        .where(BookmarkTag.bookmark_id.in_(bookmark_ids))
+        .order_by(BookmarkTag.bookmark_id, Tag.name)
+    )
+    for bookmark_id, name in rows:
+        names[bookmark_id].append(name)
+    # Core executemany, а не ORM bulk update: работает и с сессией, и с соединением миграции
+    bookmarks = Bookmark.__table__
+    session.execute(bookmarks.update().where(bookmarks.c.id == bindparam('bookmark_id'))
+                    .values(tags=bindparam('tag_string')), [
+        {'bookmark_id': bookmark_id, 'tag_string': ",".join(tag_names)} for bookmark_id, tag_names in names.items()
+    ])
+
+# ==================== МЕДИА БЕЗ ПОВТОРОВ ====================
+
+def _refresh_media_bookmark(session, user_id: int, file_unique_id: str, file_id: Optional[str],
+                            message_text: Optional[str], media_json: Optional[str] = None) -> int:
+    """Повторно сохранённое медиа: поднять прежнюю закладку вместо новой строки. Возвращает её id"""
+    values = {'saved_at': datetime.now(), 'file_id': file_id, 'media': media_json}
+    if message_text:
+        values['message_text'] = message_text
+    bookmark_id = session.execute(
+        update(Bookmark)
+        .where(Bookmark.user_id == user_id, Bookmark.file_unique_id == file_unique_id)
+        .values(**values)
+        .returning(Bookmark.id)
+    ).scalar_one()
+    # Копия saved_at в связях — иначе в списке по тегу закладка осталась бы на старом месте
+    session.execute(
+        update(BookmarkTag).where(BookmarkTag.bookmark_id == bookmark_id)
+        .values(saved_at=select(Bookmark.saved_at).where(Bookmark.id == bookmark_id).scalar_subquery())
+    )
+    return bookmark_id
+
+# ==================== ЭКСПОРТ / ИМПОРТ ====================
+
+EXPORT_BATCH_SIZE = 500
+IMPORT_BATCH_SIZE = 500
+
+# Что выгружается по каждому виду данных: без id, user_id и служебных полей (аренда напоминаний)
+EXPORT_COLUMNS = {
+    'notes': (Note, (Note.title, Note.content, Note.created_at, Note.updated_at)),
+    'bookmarks': (Bookmark, (Bookmark.message_text, Bookmark.message_type, Bookmark.file_id,
+                             Bookmark.file_unique_id, Bookmark.media, Bookmark.tags, Bookmark.saved_at)),
+    'reminders': (Reminder, (Reminder.text, Reminder.remind_at, Reminder.is_completed, Reminder.created_at)),
+}
+
+# ==================== КЛАСС БАЗЫ ДАННЫХ ====================
+
+class Database:
+    """Основной класс для работы с базой данных"""
+    
+    def __init__(self):
+        # Подписчики на изменения напоминаний (планировщик доставки)
+        self._reminder_listeners: List[Callable[[str, Dict], None]] = []
+        # 🔎 Способ полнотекстового поиска — определяется в init_db()
+        self.search_backend = fulltext.BACKEND_ILIKE
+    
+    def add_reminder_listener(self, listener: Callable[[str, Dict], None]):
+        """
+        Подписаться на события 'added' / 'deleted' / 'reload' (массовый импорт) напоминаний.
+        Вызывается после коммита, из того потока, где работала сессия.
+        """
+        self._reminder_listeners.append(listener)
+    
+    def remove_reminder_listener(self, listener: Callable[[str, Dict], None]):
+        if listener in self._reminder_listeners:
+            self._reminder_listeners.remove(listener)
+    
+    def _notify_reminder(self, event: str, reminder: Dict):
+        for listener in list(self._reminder_listeners):
+            try:
+                listener(event, reminder)
+            except Exception as e:
+                logger.error(f"Ошибка в подписчике напоминаний: {e}")
+    
+    # ==================== ПОЛЬЗОВАТЕЛИ ====================
+    
+    def add_user(self, user_id: int, username: str = None, first_name: str = None, 
+                 last_name: str = None, language_code: str = 'ru'):
+        """Добавить или обновить пользователя"""
+        with get_db_session() as session:
+            user = session.query(User).filter(User.user_id == user_id).first()
+            
+            if user:
+                # Обновляем существующего
+                user.username = username
+                user.first_name = first_name
+                user.last_name = last_name
+                user.language_code = language_code
+            else:
+                # Создаём нового
+                user = User(
+                    user_id=user_id,
+                    username=username,
+                    first_name=first_name,
+                    last_name=last_name,
+                    language_code=language_code
+                )
+                session.add(user)
+            
+            logger.debug(f"👤 Пользователь {user_id} сохранён")
+    
+    def get_user(self, user_id: int) -> Optional[Dict]:
+        """Получить данные пользователя"""
+        with get_db_session() as session:
+            user = session.query(User).filter(User.user_id == user_id).first()
+            if user:
+                return {
+                    'user_id': user.user_id,
+                    'username': user.username,
+                    'first_name': user.first_name,
+                    'last_name': user.last_name,
+                    'language_code': user.language_code,
+                    'is_premium': user.is_premium,
+                    'joined_at': user.joined_at
+                }
+            return None
+
+    def save_user_profiles(self, rows: List[Dict]):
+        """Пакетно сохранить профили из кэша бота: один multi-row UPSERT"""
+        if not rows:
+            return
+        stmt = _upsert(User).values(sorted(rows, key=lambda row: row['user_id']))
+        with get_db_session() as session:
+            session.execute(stmt.on_conflict_do_update(
+                index_elements=[User.user_id],
+                set_={name: stmt.excluded[name] for name in ('username', 'first_name', 'last_name', 'last_active')}
+            ))
+
+    # ==================== ЗАКЛАДКИ ====================
+    
+    def add_bookmark(self, user_id: int, message_text: str = None, 
+                     message_type: str = 'text', file_id: str = None, tags: str = '',
+                     file_unique_id: str = None, media: List[Dict] = None) -> int:
+        """
+        Сохранить закладку. Медиа, которое у пользователя уже есть (тот же file_unique_id),
+        не дублируется: прежняя закладка поднимается наверх (saved_at), получает свежий
+        file_id, новую подпись (если есть) и теги. media — вложения альбома одной закладкой.
+        Возвращает id закладки.
+        """
+        with get_db_session() as session:
+            # Проверяем, есть ли пользователь
+            user = session.query(User).filter(User.user_id == user_id).first()
+            if not user:
+                self.add_user(user_id)
+            
+            tag_names = normalize_tags(tags)
+            media_json = json.dumps(media, ensure_ascii=False) if media else None
+            # Текст (file_unique_id = NULL) не конфликтует никогда; повтор медиа — ничего не вставит
+            bookmark_id = session.execute(
+                _upsert(Bookmark).values(
+                    user_id=user_id,
+                    message_text=message_text,
+                    message_type=message_type,
+                    file_id=file_id,
+                    file_unique_id=file_unique_id,
+                    media=media_json,
+                    tags=",".join(tag_names)
+                )
+                .on_conflict_do_nothing(index_elements=[Bookmark.user_id, Bookmark.file_unique_id])
+                .returning(Bookmark.id)
+            ).scalar()
+            if bookmark_id is not None:
+                _bump_counters(session, user_id, bookmarks=1)
+                if tag_names:
+                    _link_tags(session, user_id, [(bookmark_id, tag_names)])
+                logger.debug(f"🔖 Закладка #{bookmark_id} сохранена для пользователя {user_id}")
+                return bookmark_id
+            
+            bookmark_id = _refresh_media_bookmark(session, user_id, file_unique_id, file_id, message_text, media_json)
+            if tag_names:
+                _link_tags(session, user_id, [(bookmark_id, tag_names)])
+                _sync_tag_strings(session, [bookmark_id])
+            logger.debug(f"🔖 Закладка #{bookmark_id} уже была — поднята для пользователя {user_id}")
+            return bookmark_id
+    
+    def get_bookmarks(self, user_id: int, limit: int = 50) -> List[Dict]:
+        """Получить закладки пользователя"""
+        with get_db_session() as session:
+            bookmarks = session.query(Bookmark)\
+                .filter(Bookmark.user_id == user_id)\
+                .order_by(Bookmark.saved_at.desc())\
+                .limit(limit)\
+                .all()
+            
+            return [{
+                'id': bm.id,
+                'user_id': bm.user_id,
+                'message_text': bm.message_text,
+                'message_type': bm.message_type,
+                'file_id': bm.file_id,
+                'media': json.loads(bm.media) if bm.media else None,
+                'saved_at': bm.saved_at,
+                'tags': bm.tags
+            } for bm in bookmarks]
+    
+    def list_bookmarks_page(self, user_id: int, cursor: str = None, backward: bool = False,
+                            limit: int = LIST_PAGE_SIZE, preview_length: int = 50) -> Dict:
+        """
+        Страница закладок для списка: id, тип и превью текста (обрезано в SQL).
+        Keyset по (saved_at, id): cursor — откуда продолжать, backward=True — к более новым.
+        Возвращает {'items', 'next_cursor', 'prev_cursor'}.
+        """
+        with get_db_session() as session:
+            return _list_page(
+                session,
+                [Bookmark.id, Bookmark.message_type,
+                 _truncated(Bookmark.message_text, preview_length).label('preview')],
+                Bookmark.user_id, Bookmark.saved_at, Bookmark.id,
+                user_id, cursor, backward, limit
+            )
+    
+    def delete_bookmark(self, bookmark_id: int, user_id: int) -> bool:
+        """Удалить одну закладку"""
+        with get_db_session() as session:
+            # Связи удаляем явно: SQLite без PRAGMA foreign_keys не выполняет ON DELETE CASCADE
+            session.execute(delete(BookmarkTag).where(BookmarkTag.bookmark_id == bookmark_id,
+                                                      BookmarkTag.user_id == user_id))
+            result = session.query(Bookmark)\
+                .filter(Bookmark.id == bookmark_id, Bookmark.user_id == user_id)\
+                .delete()
+            _bump_counters(session, user_id, bookmarks=-result)
+            return result > 0
+    
+    def clear_bookmarks(self, user_id: int) -> int:
+        """Очистить ВСЕ закладки пользователя. Возвращает количество удалённых."""
+        with get_db_session() as session:
+            session.execute(delete(BookmarkTag).where(BookmarkTag.user_id == user_id))
+            result = session.query(Bookmark)\
+                .filter(Bookmark.user_id == user_id)\
+                .delete()
+            _bump_counters(session, user_id, bookmarks=-result)
+            logger.info(f"🧹 Очищено {result} закладок для пользователя {user_id}")
+            return result
+    
+    def count_bookmarks(self, user_id: int) -> int:
+        """Подсчитать количество закладок"""
+        with get_db_session() as session:
+            return session.query(Bookmark)\
+                .filter(Bookmark.user_id == user_id)\
+                .count()
+    
+    # ==================== ТЕГИ ЗАКЛАДОК ====================
+    
+    def tag_bookmarks(self, user_id: int, bookmark_ids: Iterable[int], tags, replace: bool = False) -> int:
+        """
+        Добавить теги (строка «a, #b» или список) сразу многим закладкам пользователя.
+        replace=True — заменить прежние теги этих закладок. Чужие id пропускаются.
+        Возвращает число новых связей.
+        """
+        tag_names = normalize_tags(tags)
+        bookmark_ids = list(bookmark_ids)
+        linked = 0
+        with get_db_session() as session:
+            for start in range(0, len(bookmark_ids), IMPORT_BATCH_SIZE):
+                owned_ids = list(session.scalars(
+                    select(Bookmark.id)
+                    .where(Bookmark.user_id == user_id, Bookmark.id.in_(bookmark_ids[start:start + IMPORT_BATCH_SIZE]))
+                ))
+                if not owned_ids:
+                    continue
+                if replace:
+                    session.execute(delete(BookmarkTag).where(BookmarkTag.bookmark_id.in_(owned_ids)))
+                linked += _link_tags(session, user_id, [(bookmark_id, tag_names) for bookmark_id in owned_ids])
+                _sync_tag_strings(session, owned_ids)
+        logger.debug(f"🏷️ Теги {tag_names} → {len(bookmark_ids)} закладок пользователя {user_id}: +{linked}")
+        return linked
+    
+    def list_tags(self, user_id: int) -> List[Dict]:
+        """Теги пользователя с числом закладок: сначала частые. Считается по индексу связей"""
+        with get_db_session() as session:
+            rows = session.execute(
+                select(Tag.id, Tag.name, func.count().label('count'))
+                .select_from(BookmarkTag)
+                .join(Tag, Tag.id == BookmarkTag.tag_id)
+                .where(BookmarkTag.user_id == user_id)
+                .group_by(Tag.id, Tag.name)
+                .order_by(func.count().desc(), Tag.name)
+            )
+            return [{'id': row.id, 'tag': row.name, 'count': row.count} for row in rows]
+    
+    def get_tag_ids(self, user_id: int, tags) -> Dict[str, int]:
+        """Имена тегов (после normalize_tags) → id; несуществующих в ответе нет"""
+        tag_names = normalize_tags(tags)
+        if not tag_names:
+            return {}
+        with get_db_session() as session:
+            rows = session.execute(select(Tag.name, Tag.id).where(Tag.user_id == user_id, Tag.name.in_(tag_names)))
+            return dict(rows.all())
+    
+    def list_bookmarks_by_tags_page(self, user_id: int, tag_ids: Sequence[int], cursor: str = None,
+                                    backward: bool = False, limit: int = LIST_PAGE_SIZE,
+                                    preview_length: int = 50) -> Dict:
+        """
+        Страница закладок, у которых есть ВСЕ теги tag_ids (один тег — просто фильтр).
+        Обход идёт по связям самого редкого тега (keyset по индексу), остальные теги
+        проверяются по первичному ключу связи. Формат — как у list_bookmarks_page.
+        """
+        tag_ids = list(dict.fromkeys(tag_ids))
+        if not tag_ids:
+            return {'items': [], 'next_cursor': None, 'prev_cursor': None}
+        with get_db_session() as session:
+            if len(tag_ids) > 1:
+                # Порядок обхода: от самого редкого тега (счёт — по индексу связей)
+                counts = dict(session.execute(
+                    select(BookmarkTag.tag_id, func.count())
+                    .where(BookmarkTag.user_id == user_id, BookmarkTag.tag_id.in_(tag_ids))
+                    .group_by(BookmarkTag.tag_id)
+                ).all())
+                if len(counts) < len(tag_ids):
+                    return {'items': [], 'next_cursor': None, 'prev_cursor': None}
+                tag_ids.sort(key=counts.get)
+            rarest, *others = tag_ids
+            
+            driver = BookmarkTag
+            conditions = [driver.tag_id == rarest, Bookmark.id == driver.bookmark_id]
+            for tag_id in others:
+                other = aliased(BookmarkTag)
+                conditions.append(
+                    exists().where(other.bookmark_id == driver.bookmark_id, other.tag_id == tag_id)
+                )
+            return _list_page(
+                session,
+                [Bookmark.id, Bookmark.message_type,
+                 _truncated(Bookmark.message_text, preview_length).label('preview')],
+                driver.user_id, driver.saved_at, driver.bookmark_id,
+                user_id, cursor, backward, limit, conditions
+            )
+    
+    # ==================== НАПОМИНАНИЯ ====================
+    
+    def add_reminder(self, user_id: int, text: str, remind_at: datetime) -> int:
+        """Создать напоминание"""
+        with get_db_session() as session:
+            # Проверяем, есть ли пользователь
+            user = session.query(User).filter(User.user_id == user_id).first()
+            if not user:
+                self.add_user(user_id)
+            
+            reminder = Reminder(
+                user_id=user_id,
+                text=text,
+                remind_at=remind_at
+            )
+            session.add(reminder)
+            session.flush()
+            reminder_id = reminder.id
+            _bump_counters(session, user_id, reminders=1)
+            
+            logger.debug(f"⏰ Напоминание #{reminder_id} установлено на {remind_at}")
+        
+        self._notify_reminder('added', {
+            'id': reminder_id,
+            'user_id': user_id,
+            'text': text,
+            'remind_at': remind_at
+        })
+        return reminder_id
+    
+    def get_active_reminders(self, user_id: int) -> List[Dict]:
+        """Получить активные (не выполненные) напоминания"""
+        with get_db_session() as session:
+            reminders = session.query(Reminder)\
+                .filter(Reminder.user_id == user_id, Reminder.is_completed == False)\
+                .order_by(Reminder.remind_at.asc())\
+                .all()
+            
+            return [{
+                'id': rm.id,
+                'user_id': rm.user_id,
+                'text': rm.text,
+                'remind_at': rm.remind_at,
+                'is_completed': rm.is_completed,
+                'created_at': rm.created_at
+            } for rm in reminders]
+    
+    def get_due_reminders(self) -> List[Dict]:
+        """Получить напоминания, время которых наступило"""
+        with get_db_session() as session:
+            now = datetime.now()
+            reminders = session.query(Reminder)\
+                .filter(Reminder.is_completed == False, Reminder.remind_at <= now)\
+                .all()
+            
+            return [{
+                'id': rm.id,
+                'user_id': rm.user_id,
+                'text': rm.text,
+                'remind_at': rm.remind_at,
+                'is_completed': rm.is_completed
+            } for rm in reminders]
+    
+    def mark_reminder_completed(self, reminder_id: int):
+        """Отметить напоминание как выполненное"""
+        with get_db_session() as session:
+            reminder = session.query(Reminder).filter(Reminder.id == reminder_id).first()
+            if reminder and not reminder.is_completed:
+                reminder.is_completed = True
+                _bump_counters(session, reminder.user_id, reminders=-1)
+                logger.debug(f"✅ Напоминание #{reminder_id} выполнено")
+    
+    def delete_reminder(self, reminder_id: int, user_id: int) -> bool:
+        """Удалить напоминание"""
+        with get_db_session() as session:
+            deleted = session.execute(
+                delete(Reminder)
+                .where(Reminder.id == reminder_id, Reminder.user_id == user_id)
+                .returning(Reminder.is_completed)
+            ).all()
+            active = sum(1 for row in deleted if not row.is_completed)
+            _bump_counters(session, user_id, reminders=-active)
+        
+        if deleted:
+            self._notify_reminder('deleted', {'id': reminder_id, 'user_id': user_id})
+        return bool(deleted)
+    
+    def get_upcoming_reminders(self, until: datetime, limit: int = 500) -> List[Dict]:
+        """
+        Ближайшие невыполненные напоминания со временем до until (включая просроченные),
+        по возрастанию времени — окно для планировщика, идёт по индексу remind_at.
+        """
+        with get_db_session() as session:
+            rows = session.query(Reminder.id, Reminder.user_id, Reminder.text, Reminder.remind_at)\
+                .filter(Reminder.is_completed == False, Reminder.remind_at <= until)\
+                .order_by(Reminder.remind_at.asc(), Reminder.id.asc())\
+                .limit(limit)\
+                .all()
+            
+            return [{
+                'id': row.id,
+                'user_id': row.user_id,
+                'text': row.text,
+                'remind_at': row.remind_at
+            } for row in rows]
+    
+    @staticmethod
+    def _decrement_reminders(session, rows):
+        """Уменьшить счётчики активных напоминаний по строкам (user_id) из RETURNING"""
+        for user_id, completed in Counter(row.user_id for row in rows).items():
+            _bump_counters(session, user_id, reminders=-completed)
+    
+    # ==================== ДОСТАВКА С АРЕНДОЙ (несколько реплик) ====================
+    
+    def claim_due_reminders(self, worker_id: str, limit: int = 100,
+                            lease_seconds: int = 120) -> List[Dict]:
+        """
+        Забрать до limit наступивших напоминаний в аренду воркеру worker_id.
+        PostgreSQL: FOR UPDATE SKIP LOCKED — реплики не ждут и не делят строки.
+        SQLite: запись сериализована самой БД, исключает повторы колонка аренды.
+        Просроченная аренда (воркер упал) снова доступна — восстановление автоматическое.
+        """
+        now = datetime.now()
+        claimable = select(Reminder.id)\
+            .where(
+                Reminder.is_completed == False,
+                Reminder.remind_at <= now,
+                or_(Reminder.claimed_until.is_(None), Reminder.claimed_until < now)
+            )\
+            .order_by(Reminder.remind_at.asc(), Reminder.id.asc())\
+            .limit(limit)
+        if get_engine().dialect.name == "postgresql":
+            claimable = claimable.with_for_update(skip_locked=True)
+        
+        with get_db_session() as session:
+            rows = session.execute(
+                update(Reminder)
+                .where(Reminder.id.in_(claimable.scalar_subquery()))
+                .values(claimed_by=worker_id, claimed_until=now + timedelta(seconds=lease_seconds))
+                .returning(Reminder.id, Reminder.user_id, Reminder.text, Reminder.remind_at)
+                .execution_options(synchronize_session=False)
+            ).all()
+        
+        return sorted(({
+            'id': row.id,
+            'user_id': row.user_id,
+            'text': row.text,
+            'remind_at': row.remind_at
+        } for row in rows), key=lambda rm: (rm['remind_at'], rm['id']))
+    
+    def complete_claimed_reminders(self, reminder_ids: List[int], worker_id: str) -> int:
+        """Отметить выполненными напоминания, арендованные этим воркером (один UPDATE)"""
+        if not reminder_ids:
+            return 0
+        with get_db_session() as session:
+            rows = session.execute(
+                update(Reminder)
+                .where(
+                    Reminder.id.in_(reminder_ids),
+                    Reminder.claimed_by == worker_id,
+                    Reminder.is_completed == False
+                )
+                .values(is_completed=True, claimed_by=None, claimed_until=None)
+                .returning(Reminder.user_id)
+                .execution_options(synchronize_session=False)
+            ).all()
+            self._decrement_reminders(session, rows)
+            logger.debug(f"✅ Выполнено арендованных напоминаний: {len(rows)}")
+            return len(rows)
+    
+    def release_claimed_reminders(self, reminder_ids: List[int], worker_id: str,
+                                  retry_after_seconds: int = 60) -> int:
+        """Вернуть недоставленные напоминания: повторная попытка не раньше retry_after_seconds"""
+        if not reminder_ids:
+            return 0
+        with get_db_session() as session:
+            return session.query(Reminder)\
+                .filter(Reminder.id.in_(reminder_ids), Reminder.claimed_by == worker_id)\
+                .update({
+                    Reminder.claimed_by: None,
+                    Reminder.claimed_until: datetime.now() + timedelta(seconds=retry_after_seconds)
+                }, synchronize_session=False)
+    
+    def count_active_reminders(self, user_id: int) -> int:
+        """Подсчитать активные напоминания"""
+        with get_db_session() as session:
+            return session.query(Reminder)\
+                .filter(Reminder.user_id == user_id, Reminder.is_completed == False)\
+                .count()
+    
+    # ==================== ЗАМЕТКИ ====================
+    
+    def add_note(self, user_id: int, title: str, content: str = '') -> int:
+        """Создать заметку"""
+        with get_db_session() as session:
+            # Проверяем, есть ли пользователь
+            user = session.query(User).filter(User.user_id == user_id).first()
+            if not user:
+                self.add_user(user_id)
+            
+            note = Note(
+                user_id=user_id,
+                title=title,
+                content=content
+            )
+            session.add(note)
+            session.flush()
+            note_id = note.id
+            _bump_counters(session, user_id, notes=1)
+            
+            logger.debug(f"📝 Заметка #{note_id} создана")
+            return note_id
+    
+    def get_notes(self, user_id: int, limit: int = 50) -> List[Dict]:
+        """Получить заметки пользователя"""
+        with get_db_session() as session:
+            notes = session.query(Note)\
+                .filter(Note.user_id == user_id)\
+                .order_by(Note.updated_at.desc())\
+                .limit(limit)\
+                .all()
+            
+            return [{
+                'id': n.id,
+                'user_id': n.user_id,
+                'title': n.title or note_title(n.content),
+                'content': n.content,
+                'created_at': n.created_at,
+                'updated_at': n.updated_at
+            } for n in notes]
+    
+    def list_notes_page(self, user_id: int, cursor: str = None, backward: bool = False,
+                        limit: int = LIST_PAGE_SIZE, title_length: int = 40) -> Dict:
+        """
+        Страница заметок для списка: id и заголовок (обрезан в SQL), без content.
+        Keyset по (updated_at, id): cursor — откуда продолжать, backward=True — к более новым.
+        Возвращает {'items', 'next_cursor', 'prev_cursor'}.
+        """
+        with get_db_session() as session:
+            return _list_page(
+                session,
+                # title пуст у заметок старого формата, пока их не дозаполнила миграция
+                [Note.id, _truncated(func.coalesce(Note.title, Note.content), title_length).label('title')],
+                Note.user_id, Note.updated_at, Note.id,
+                user_id, cursor, backward, limit
+            )
+    
+    def update_note(self, note_id: int, user_id: int, title: str = None, content: str = None):
+        """Обновить заметку"""
+        with get_db_session() as session:
+            note = session.query(Note)\
+                .filter(Note.id == note_id, Note.user_id == user_id)\
+                .first()
+            
+            if note:
+                if title:
+                    note.title = title
+                if content:
+                    note.content = content
+                logger.debug(f"✏️ Заметка #{note_id} обновлена")
+    
+    def delete_note(self, note_id: int, user_id: int) -> bool:
+        """Удалить заметку"""
+        with get_db_session() as session:
+            result = session.query(Note)\
+                .filter(Note.id == note_id, Note.user_id == user_id)\
+                .delete()
+            _bump_counters(session, user_id, notes=-result)
+            return result > 0
+    
+    def count_notes(self, user_id: int) -> int:
+        """Подсчитать заметки"""
+        with get_db_session() as session:
+            return session.query(Note)\
+                .filter(Note.user_id == user_id)\
+                .count()
+    
+    def add_notes(self, rows: List[Dict]) -> List[int]:
+        """
+        Сохранить пачку заметок ({'user_id', 'content'}) одним multi-row INSERT; id в порядке rows.
+        Заголовок — начало текста, пользователи и счётчики — в той же транзакции.
+        """
+        if not rows:
+            return []
+        with get_db_session() as session:
+            # Заметка может прийти раньше, чем кэш профилей сбросит пользователя
+            session.execute(_upsert(User)
+                            .values([{'user_id': user_id} for user_id in sorted({row['user_id'] for row in rows})])
+                            .on_conflict_do_nothing(index_elements=[User.user_id]))
+            result = session.execute(
+                insert(Note).returning(Note.id, sort_by_parameter_order=True),
+                [dict(row, title=row.get('title') or note_title(row['content'])) for row in rows]
+            )
+            note_ids = list(result.scalars())
+            added = Counter(row['user_id'] for row in rows)
+            stmt = _upsert(UserCounters).values([
+                {'user_id': user_id, 'notes_count': count} for user_id, count in sorted(added.items())
+            ])
+            session.execute(stmt.on_conflict_do_update(
+                index_elements=[UserCounters.user_id],
+                set_={'notes_count': UserCounters.notes_count + stmt.excluded.notes_count, 'updated_at': datetime.now()}
+            ))
+            return note_ids
+    
+    def search_notes(self, user_id: int, query: str, cursor: str = None, backward: bool = False,
+                     limit: int = LIST_PAGE_SIZE) -> Dict:
+        """Страница поиска по тексту заметок (keyset по (created_at, id))"""
+        with get_db_session() as session:
+            return fulltext.search_notes(
+                session, self.search_backend, user_id, query,
+                cursor=cursor, backward=backward, limit=limit
+            )
+    
+    def search_first_page(self, user_id: int, query: str, limit: int = LIST_PAGE_SIZE,
+                          count_cap: int = 100) -> Tuple[Dict, int]:
+        """Первая страница + оценка числа совпадений (не больше count_cap + 1)"""
+        with get_db_session() as session:
+            page = fulltext.search_notes(session, self.search_backend, user_id, query, limit=limit)
+            if page['next_cursor'] is None:
+                return page, len(page['items'])
+            return page, fulltext.count_matches(session, self.search_backend, user_id, query, cap=count_cap)
+    
+    # ==================== ЭКСПОРТ / ИМПОРТ ====================
+    
+    def iter_export(self, kind: str, user_id: int, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[Dict]:
+        """
+        Потоково отдать строки пользователя для экспорта (kind — ключ EXPORT_COLUMNS).
+        yield_per: на PostgreSQL — серверный курсор, в памяти не больше batch_size строк.
+        """
+        model, columns = EXPORT_COLUMNS[kind]
+        stmt = select(*columns).where(model.user_id == user_id).order_by(model.id)
+        with get_engine().connect() as conn:
+            result = conn.execution_options(yield_per=batch_size).execute(stmt)
+            for row in result:
+                yield dict(row._mapping)
+    
+    def import_batch(self, kind: str, user_id: int, rows: List[Dict]) -> int:
+        """
+        Вставить пачку строк пользователя одним executemany (kind — ключ EXPORT_COLUMNS).
+        Счётчики сдвигаются в той же транзакции. Возвращает число вставленных строк.
+        """
+        if not rows:
+            return 0
+        model, _ = EXPORT_COLUMNS[kind]
+        with get_db_session() as session:
+            session.execute(_upsert(User).values(user_id=user_id)
+                            .on_conflict_do_nothing(index_elements=[User.user_id]))
+            if kind == 'bookmarks':
+                rows = self._import_bookmarks(session, user_id, rows)
+            else:
+                session.execute(insert(model), [dict(row, user_id=user_id) for row in rows])
+            if kind == 'reminders':
+                pending = sum(1 for row in rows if not row.get('is_completed'))
+                _bump_counters(session, user_id, reminders=pending)
+            else:
+                _bump_counters(session, user_id, **{kind: len(rows)})
+        
+        if kind == 'reminders':
+            # id вставленных строк executemany не возвращает — планировщик перечитает окно
+            self._notify_reminder('reload', {'user_id': user_id})
+        logger.debug(f"📥 Импорт {kind}: {len(rows)} строк для пользователя {user_id}")
+        return len(rows)
+    
+    @staticmethod
+    def _import_bookmarks(session, user_id: int, rows: List[Dict]) -> List[Dict]:
+        """
+        Закладки импорта: один INSERT с RETURNING, затем связи с тегами из строки tags.
+        Медиа, которое у пользователя уже есть (или повторяется в пачке), пропускается —
+        повторный импорт того же архива не плодит копии. Возвращает вставленные строки.
+        """
+        unique_ids = {row['file_unique_id'] for row in rows if row.get('file_unique_id')}
+        seen = set(session.scalars(
+            select(Bookmark.file_unique_id)
+            .where(Bookmark.user_id == user_id, Bookmark.file_unique_id.in_(unique_ids))
+        )) if unique_ids else set()
+        fresh = []
+        for row in rows:
+            file_unique_id = row.get('file_unique_id')
+            if file_unique_id:
+                if file_unique_id in seen:
+                    continue
+                seen.add(file_unique_id)
+            fresh.append(row)
+        if not fresh:
+            return fresh
+        
+        tag_names = [normalize_tags(row.get('tags')) for row in fresh]
+        result = session.execute(
+            insert(Bookmark).returning(Bookmark.id, sort_by_parameter_order=True),
+            [dict(row, user_id=user_id, tags=",".join(names)) for row, names in zip(fresh, tag_names)]
+        )
+        _link_tags(session, user_id, [
+            (bookmark_id, names) for bookmark_id, names in zip(result.scalars(), tag_names) if names
+        ])
+        return fresh
+    
+    # ==================== СТАТИСТИКА ====================
+    
+    def get_user_stats(self, user_id: int) -> Dict:
+        """Получить статистику пользователя — одно чтение строки счётчиков"""
+        with get_db_session() as session:
+            counters = session.get(UserCounters, user_id)
+            counts = tuple(getattr(counters, name) for name in COUNTER_COLUMNS) if counters else (0, 0, 0)
+        
+        stats = dict(zip(COUNTER_COLUMNS, counts))
+        stats['total_items'] = sum(counts)
+        return stats
+    
+    def reconcile_user_counters(self, batch_size: int = 1000) -> int:
+        """
+        Пересчитать счётчики и исправить расхождения (каскадные удаления, ручные правки БД).
+        Идёт по пользователям порциями, пишет только разошедшиеся строки. Возвращает их число.
+
+        Пересчёт и запись — один UPDATE с подзапросами, под FOR UPDATE на строках счётчиков:
+        запись, закоммиченная между подсчётом и перезаписью, не теряется (на PostgreSQL
+        UPDATE после блокировки видит всё, что закоммитили до неё, а новые сдвиги ждут нас)
+        """
+        actual = {
+            'bookmarks_count': select(func.count()).where(Bookmark.user_id == UserCounters.user_id),
+            'reminders_count': select(func.count()).where(Reminder.user_id == UserCounters.user_id,
+                                                          Reminder.is_completed == False),
+            'notes_count': select(func.count()).where(Note.user_id == UserCounters.user_id),
+        }
+        actual = {name: query.scalar_subquery() for name, query in actual.items()}
+        
+        fixed = 0
+        last_user_id = None
+        while True:
+            with get_db_session() as session:
+                query = session.query(User.user_id).order_by(User.user_id.asc()).limit(batch_size)
+                if last_user_id is not None:
+                    query = query.filter(User.user_id > last_user_id)
+                user_ids = [row.user_id for row in query]
+                if not user_ids:
+                    break
+                
+                # Строка счётчиков есть у каждого из порции (нулевая — пересчёт ниже её исправит)
+                session.execute(
+                    _upsert(UserCounters).values([{'user_id': user_id} for user_id in user_ids])
+                    .on_conflict_do_nothing(index_elements=[UserCounters.user_id])
+                )
+                session.execute(
+                    select(UserCounters.user_id).where(UserCounters.user_id.in_(user_ids))
+                    .order_by(UserCounters.user_id).with_for_update()
+                )
+                result = session.execute(
+                    update(UserCounters)
+                    .where(UserCounters.user_id.in_(user_ids),
+                           or_(*(getattr(UserCounters, name) != count for name, count in actual.items())))
+                    .values(**actual, updated_at=datetime.now())
+                    .execution_options(synchronize_session=False)
+                )
+                fixed += result.rowcount
+            
+            last_user_id = user_ids[-1]
+            if len(user_ids) < batch_size:
+                break
+        
+        if fixed:
+            logger.info(f"🧮 Исправлено счётчиков пользователей: {fixed}")
+        return fixed
+
+# ==================== АСИНХРОННЫЙ ДОСТУП ====================
+
+class AsyncDatabase:
+    """
+    Те же операции, что и у Database, но для await из хендлеров:
+    запросы уходят в выделенный пул потоков (async_db.run_db).
+    """
+    
+    def __init__(self, database: Database):
+        self.db = database
+    
+    # ==================== ПОЛЬЗОВАТЕЛИ ====================
+    
+    async def add_user(self, user_id: int, username: str = None, first_name: str = None,
+                       last_name: str = None, language_code: str = 'ru'):
+        return await run_db(self.db.add_user, user_id, username, first_name, last_name, language_code)
+    
+    async def get_user(self, user_id: int) -> Optional[Dict]:
+        return await run_db(self.db.get_user, user_id)
+    
+    # ==================== ЗАКЛАДКИ ====================
+    
+    async def add_bookmark(self, user_id: int, message_text: str = None,
+                           message_type: str = 'text', file_id: str = None, tags: str = '',
+                           file_unique_id: str = None, media: List[Dict] = None) -> int:
+        return await run_db(self.db.add_bookmark, user_id, message_text, message_type, file_id, tags,
+                            file_unique_id, media)
+    
+    async def get_bookmarks(self, user_id: int, limit: int = 50) -> List[Dict]:
+        return await run_db(self.db.get_bookmarks, user_id, limit)
+    
+    async def list_bookmarks_page(self, user_id: int, cursor: str = None, backward: bool = False,
+                                  limit: int = LIST_PAGE_SIZE) -> Dict:
+        return await run_db(self.db.list_bookmarks_page, user_id, cursor, backward, limit)
+    
+    async def delete_bookmark(self, bookmark_id: int, user_id: int) -> bool:
+        return await run_db(self.db.delete_bookmark, bookmark_id, user_id)
+    
+    async def clear_bookmarks(self, user_id: int) -> int:
+        return await run_db(self.db.clear_bookmarks, user_id)
+    
+    async def count_bookmarks(self, user_id: int) -> int:
+        return await run_db(self.db.count_bookmarks, user_id)
+    
+    # ==================== ТЕГИ ЗАКЛАДОК ====================
+    
+    async def tag_bookmarks(self, user_id: int, bookmark_ids: Iterable[int], tags, replace: bool = False) -> int:
+        return await run_db(self.db.tag_bookmarks, user_id, list(bookmark_ids), tags, replace)
+    
+    async def list_tags(self, user_id: int) -> List[Dict]:
+        return await run_db(self.db.list_tags, user_id)
+    
+    async def get_tag_ids(self, user_id: int, tags) -> Dict[str, int]:
+        return await run_db(self.db.get_tag_ids, user_id, tags)
+    
+    async def list_bookmarks_by_tags_page(self, user_id: int, tag_ids: Sequence[int], cursor: str = None,
+                                          backward: bool = False, limit: int = LIST_PAGE_SIZE) -> Dict:
+        return await run_db(self.db.list_bookmarks_by_tags_page, user_id, list(tag_ids), cursor, backward, limit)
+    
+    # ==================== НАПОМИНАНИЯ ====================
+    
+    async def add_reminder(self, user_id: int, text: str, remind_at: datetime) -> int:
+        return await run_db(self.db.add_reminder, user_id, text, remind_at)
+    
+    async def get_active_reminders(self, user_id: int) -> List[Dict]:
+        return await run_db(self.db.get_active_reminders, user_id)
+    
+    async def get_due_reminders(self) -> List[Dict]:
+        return await run_db(self.db.get_due_reminders)
+    
+    async def mark_reminder_completed(self, reminder_id: int):
+        return await run_db(self.db.mark_reminder_completed, reminder_id)
+    
+    async def delete_reminder(self, reminder_id: int, user_id: int) -> bool:
+        return await run_db(self.db.delete_reminder, reminder_id, user_id)
+    
+    async def count_active_reminders(self, user_id: int) -> int:
+        return await run_db(self.db.count_active_reminders, user_id)
+    
+    async def get_upcoming_reminders(self, until: datetime, limit: int = 500) -> List[Dict]:
+        return await run_db(self.db.get_upcoming_reminders, until, limit)
+    
+    async def claim_due_reminders(self, worker_id: str, limit: int = 100,
+                                  lease_seconds: int = 120) -> List[Dict]:
+        return await run_db(self.db.claim_due_reminders, worker_id, limit, lease_seconds)
+    
+    async def complete_claimed_reminders(self, reminder_ids: List[int], worker_id: str) -> int:
+        return await run_db(self.db.complete_claimed_reminders, reminder_ids, worker_id)
+    
+    async def release_claimed_reminders(self, reminder_ids: List[int], worker_id: str,
+                                        retry_after_seconds: int = 60) -> int:
+        return await run_db(self.db.release_claimed_reminders, reminder_ids, worker_id, retry_after_seconds)
+    
+    # ==================== ЗАМЕТКИ ====================
+    
+    async def add_note(self, user_id: int, title: str, content: str = '') -> int:
+        return await run_db(self.db.add_note, user_id, title, content)
+    
+    async def get_notes(self, user_id: int, limit: int = 50) -> List[Dict]:
+        return await run_db(self.db.get_notes, user_id, limit)
+    
+    async def list_notes_page(self, user_id: int, cursor: str = None, backward: bool = False,
+                              limit: int = LIST_PAGE_SIZE) -> Dict:
+        return await run_db(self.db.list_notes_page, user_id, cursor, backward, limit)
+    
+    async def update_note(self, note_id: int, user_id: int, title: str = None, content: str = None):
+        return await run_db(self.db.update_note, note_id, user_id, title, content)
+    
+    async def delete_note(self, note_id: int, user_id: int) -> bool:
+        return await run_db(self.db.delete_note, note_id, user_id)
+    
+    async def count_notes(self, user_id: int) -> int:
+        return await run_db(self.db.count_notes, user_id)
+    
+    # ==================== ЭКСПОРТ / ИМПОРТ ====================
+    
+    async def import_batch(self, kind: str, user_id: int, rows: List[Dict]) -> int:
+        return await run_db(self.db.import_batch, kind, user_id, rows)
+    
+    # ==================== СТАТИСТИКА ====================
+    
+    async def get_user_stats(self, user_id: int) -> Dict:
+        return await run_db(self.db.get_user_stats, user_id)
+    
+    async def reconcile_user_counters(self, batch_size: int = 1000) -> int:
+        return await run_db(self.db.reconcile_user_counters, batch_size)
+
+# Идентификатор этого процесса для аренды напоминаний
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}"
+
+# Глобальный экземпляр БД
+db = Database()
+adb = AsyncDatabase(db)
@@ -0,0 +1,455 @@
+"""
+Миграции единой схемы и подготовка БД при запуске.
+
+Слияние двух форматов notes (лёгкий бот: content + created_at; роутеры:
+title + content + updated_at) идёт без остановки бота — expand / backfill:
+• 5 — только добавления: недостающие nullable-колонки, индекс поиска, строки
+  users для заметок, сохранённых раньше профиля (в старом формате не было FK)
+• 6 — онлайн-дозаполнение: title из начала content и updated_at порциями
+  по id, каждая порция — своя короткая транзакция; затем пересчёт notes_count
+Код с самого начала читает title через coalesce с content, поэтому строки,
+ещё не дошедшие до порции (или записанные старой репликой), показываются верно.
+
+Теги закладок (7, 8) — так же: сначала таблицы tags / bookmark_tags, затем
+онлайн-перенос строк Bookmark.tags порциями по id.
+
+Медиа без повторов (9, 10): колонка file_unique_id с уникальным индексом
+(у старых строк NULL — индекс создаётся сразу), затем разовое схлопывание
+уже сохранённых повторов. 11 — колонка media: альбом хранится одной закладкой.
+
+12 (онлайн, только SQLite): время, записанное прежним default=func.now()
+('YYYY-MM-DD HH:MM:SS'), приводится к виду, в котором пишет SQLAlchemy и
+сравнивает курсор страницы ('… .ffffff'), — порциями по rowid.
+13 — таблица fsm_states SQL-хранилища FSM (fsm_storage): её создаёт миграция,
+а не само хранилище при запуске.
+
+DDL каждой миграции записан явно (раздел «DDL МИГРАЦИЙ»), а не берётся из
+текущих моделей: новая колонка в модели требует новой миграции.
+"""
+import os
+import threading
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import List
+from sqlalchemy import (
+    Boolean, Column, DateTime, ForeignKey, Index, Integer, MetaData, String, Table, Text,
+    bindparam, exists, func, inspect, insert, literal, or_, select, text, update, delete
+)
+from sqlalchemy.engine import Connection
+import search as fulltext
+from fsm_storage import metadata as fsm_metadata
+from webhook import metadata as webhook_metadata
+from migrations import (
+    Migration, HotQuery, run_migrations, check_query_plans,
+    create_tables, add_missing_columns, create_indexes
+)
+from database.engine import get_engine, _upsert
+from database.models import (
+    Base, User, Bookmark, Reminder, Note, UserCounters, BookmarkTag, NOTE_TITLE_LENGTH, normalize_tags, _pending
+)
+from database.repository import db, LIST_PAGE_SIZE, _bump_counters, _link_tags, _sync_tag_strings
+
+logger = logging.getLogger(__name__)
+
+# Применять миграции при старте (0 — только через python migrations.py upgrade)
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "1") != "0"
+BACKFILL_BATCH_SIZE = int(os.getenv("DB_BACKFILL_BATCH_SIZE", "5000"))
+
+MIGRATIONS_NAMESPACE = "database"
+
+# ==================== DDL МИГРАЦИЙ ====================
+# Каждая миграция создаёт ровно то, что ввела в своей версии, — не сверяется с текущими
+# моделями: колонка или индекс, добавленные в модель позже, придут своей миграцией.
+# У каждой версии своя MetaData; таблицы, на которые только ссылаются, — заглушки с нужными колонками.
+
+_ddl_v1 = MetaData()
+Table(
+    "users", _ddl_v1,
+    Column("user_id", Integer, primary_key=True, index=True),
+    Column("username", String), Column("first_name", String), Column("last_name", String),
+    Column("language_code", String), Column("is_premium", Boolean), Column("joined_at", DateTime),
+)
+Table(
+    "bookmarks", _ddl_v1,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False),
+    Column("message_text", Text), Column("message_type", String), Column("file_id", String),
+    Column("saved_at", DateTime, index=True), Column("tags", String),
+)
+Table(
+    "reminders", _ddl_v1,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False),
+    Column("text", Text, nullable=False),
+    Column("remind_at", DateTime, nullable=False, index=True),
+    Column("is_completed", Boolean, index=True),  # индекс удаляет миграция 4
+    Column("created_at", DateTime),
+)
+Table(
+    "notes", _ddl_v1,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False),
+    Column("title", String),  # nullable — как в единой схеме: у заметок лёгкого бота title не было
+    Column("content", Text), Column("created_at", DateTime), Column("updated_at", DateTime, index=True),
+)
+
+_ddl_v2 = MetaData()
+Table("reminders", _ddl_v2, Column("claimed_by", String), Column("claimed_until", DateTime))
+
+_ddl_v3 = MetaData()
+Table("users", _ddl_v3, Column("user_id", Integer, primary_key=True))
+Table(
+    "user_counters", _ddl_v3,
+    Column("user_id", Integer, ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True),
+    Column("bookmarks_count", Integer, nullable=False),
+    Column("reminders_count", Integer, nullable=False),
+    Column("notes_count", Integer, nullable=False),
+    Column("updated_at", DateTime),
+)
+
+_ddl_v4 = MetaData()
+_bookmarks_v4 = Table("bookmarks", _ddl_v4, Column("id", Integer), Column("user_id", Integer), Column("saved_at", DateTime))
+_notes_v4 = Table("notes", _ddl_v4, Column("id", Integer), Column("user_id", Integer), Column("updated_at", DateTime))
+_reminders_v4 = Table(
+    "reminders", _ddl_v4,
+    Column("id", Integer), Column("user_id", Integer), Column("remind_at", DateTime), Column("is_completed", Boolean),
+)
+_pending_v4 = _reminders_v4.c.is_completed == False
+Index("ix_bookmarks_user_saved", _bookmarks_v4.c.user_id, _bookmarks_v4.c.saved_at.desc(), _bookmarks_v4.c.id.desc())
+Index("ix_notes_user_updated", _notes_v4.c.user_id, _notes_v4.c.updated_at.desc(), _notes_v4.c.id.desc())
+Index("ix_reminders_pending_remind_at", _reminders_v4.c.remind_at, _reminders_v4.c.id,
+      postgresql_where=_pending_v4, sqlite_where=_pending_v4)
+Index("ix_reminders_user_pending", _reminders_v4.c.user_id, _reminders_v4.c.remind_at,
+      postgresql_where=_pending_v4, sqlite_where=_pending_v4)
+
+# Единая схема: колонки обоих форматов, которых может не хватать (добавляются только недостающие)
+_ddl_v5 = MetaData()
+Table(
+    "users", _ddl_v5,
+    Column("username", String), Column("first_name", String), Column("last_name", String),
+    Column("language_code", String), Column("is_premium", Boolean),
+    Column("joined_at", DateTime), Column("last_active", DateTime),
+)
+_notes_v5 = Table(
+    "notes", _ddl_v5,
+    Column("id", Integer, nullable=False), Column("user_id", Integer, nullable=False),
+    Column("title", String), Column("content", Text), Column("created_at", DateTime), Column("updated_at", DateTime),
+)
+Index("ix_notes_user_created", _notes_v5.c.user_id, _notes_v5.c.created_at.desc(), _notes_v5.c.id.desc())
+
+_ddl_v7 = MetaData()
+Table("users", _ddl_v7, Column("user_id", Integer, primary_key=True))
+Table("bookmarks", _ddl_v7, Column("id", Integer, primary_key=True))
+Table(
+    "tags", _ddl_v7,
+    Column("id", Integer, primary_key=True),
+    Column("user_id", Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False),
+    Column("name", String(32), nullable=False),
+    Index("ux_tags_user_name", "user_id", "name", unique=True),
+)
+_bookmark_tags_v7 = Table(
+    "bookmark_tags", _ddl_v7,
+    Column("bookmark_id", Integer, ForeignKey("bookmarks.id", ondelete="CASCADE"), primary_key=True),
+    Column("tag_id", Integer, ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True),
+    Column("user_id", Integer, nullable=False),
+    Column("saved_at", DateTime, nullable=False),
+)
+Index("ix_bookmark_tags_user_tag", _bookmark_tags_v7.c.user_id, _bookmark_tags_v7.c.tag_id,
+      _bookmark_tags_v7.c.saved_at.desc(), _bookmark_tags_v7.c.bookmark_id.desc())
+
+_ddl_v9 = MetaData()
+_bookmarks_v9 = Table("bookmarks", _ddl_v9, Column("user_id", Integer, nullable=False), Column("file_unique_id", String))
+Index("ux_bookmarks_user_file", _bookmarks_v9.c.user_id, _bookmarks_v9.c.file_unique_id, unique=True)
+
+_ddl_v11 = MetaData()
+Table("bookmarks", _ddl_v11, Column("media", Text))
+
+# ==================== МИГРАЦИИ ====================
+
+def _backfill_user_counters(conn):
+    """Заполнить счётчики по уже существующим данным"""
+    def count(model, *conditions):
+        return select(func.count()).where(model.user_id == User.user_id, *conditions).scalar_subquery()
+
+    conn.execute(delete(UserCounters))
+    conn.execute(UserCounters.__table__.insert().from_select(
+        ['user_id', 'bookmarks_count', 'reminders_count', 'notes_count'],
+        select(User.user_id, count(Bookmark), count(Reminder, _pending), count(Note))
+    ))
+
+def _create_pending_indexes(conn):
+    create_indexes(
+        _ddl_v4,
+        "ix_bookmarks_user_saved", "ix_notes_user_updated",
+        "ix_reminders_pending_remind_at", "ix_reminders_user_pending"
+    )(conn)
+    # Индекс по булеву флагу почти не отсекает строки, а планировщик SQLite его предпочитал
+    conn.execute(text("DROP INDEX IF EXISTS ix_reminders_is_completed"))
+
+def _create_user_counters(conn):
+    create_tables(_ddl_v3, "user_counters")(conn)
+    _backfill_user_counters(conn)
+
+def _expand_unified_schema(conn: Connection):
+    """Миграция 5: всё, что нужно единой схеме, только добавлениями (старые реплики не ломаются)"""
+    add_missing_columns(_ddl_v5)(conn)
+    create_indexes(_ddl_v5, "ix_notes_user_created")(conn)
+
+    # Лёгкий бот писал заметку раньше, чем кэш профилей — строку users
+    conn.execute(insert(User).from_select(
+        ['user_id'],
+        select(Note.user_id).distinct().where(~exists().where(User.user_id == Note.user_id))
+    ))
+    conn.execute(UserCounters.__table__.insert().from_select(
+        ['user_id'],
+        select(User.user_id).where(~exists().where(UserCounters.user_id == User.user_id))
+    ))
+
+    inspector = inspect(conn)
+    user_columns = {column['name'] for column in inspector.get_columns("users")}
+    if "created_at" in user_columns:
+        # users старого формата: created_at → joined_at
+        conn.execute(text("UPDATE users SET joined_at = created_at WHERE joined_at IS NULL"))
+    note_columns = {column['name']: column for column in inspector.get_columns("notes")}
+    if conn.dialect.name == "postgresql" and not note_columns["content"]["nullable"]:
+        # В формате лёгкого бота content был NOT NULL; снять ограничение — изменение только метаданных
+        conn.execute(text("ALTER TABLE notes ALTER COLUMN content DROP NOT NULL"))
+
+def _backfill_unified_notes(conn: Connection, batch_size: int = BACKFILL_BATCH_SIZE):
+    """Миграция 6 (онлайн): title / updated_at старых заметок и пересчёт notes_count, порциями"""
+    derived_title = func.replace(func.substr(func.coalesce(Note.content, ''), 1, NOTE_TITLE_LENGTH), '\n', ' ')
+    incomplete = or_(Note.title.is_(None), Note.updated_at.is_(None))
+    low, high = conn.execute(select(func.min(Note.id), func.max(Note.id)).where(incomplete)).one()
+    filled = 0
+    if low is not None:
+        for start in range(low, high + 1, batch_size):
+            result = conn.execute(
+                update(Note)
+                .where(Note.id >= start, Note.id < start + batch_size, incomplete)
+                .values(title=func.coalesce(Note.title, derived_title),
+                        updated_at=func.coalesce(Note.updated_at, Note.created_at))
+            )
+            conn.commit()
+            filled += result.rowcount
+    logger.info(f"🧱 Заметки старого формата дозаполнены: {filled}")
+
+    # Заметки лёгкого бота не двигали счётчики — пересчитываем notes_count порциями пользователей
+    notes_of_user = select(func.count()).where(Note.user_id == UserCounters.user_id).scalar_subquery()
+    last_user_id = None
+    while True:
+        query = select(UserCounters.user_id).order_by(UserCounters.user_id).limit(batch_size)
+        if last_user_id is not None:
+            query = query.where(UserCounters.user_id > last_user_id)
+        user_ids = list(conn.execute(query).scalars())
+        if not user_ids:
+            break
+        conn.execute(update(UserCounters).where(UserCounters.user_id.in_(user_ids))
+                     .values(notes_count=notes_of_user))
+        conn.commit()
+        last_user_id = user_ids[-1]
+
+def backfill_bookmark_tags(conn: Connection, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """Миграция 8 (онлайн): строки Bookmark.tags → tags / bookmark_tags, порциями по id. Возвращает число связей"""
+    bookmarks = Bookmark.__table__
+    last_id = 0
+    linked = 0
+    while True:
+        rows = conn.execute(
+            select(Bookmark.id, Bookmark.user_id, Bookmark.tags)
+            .where(Bookmark.id > last_id, Bookmark.tags.is_not(None), Bookmark.tags != '')
+            .order_by(Bookmark.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        links = defaultdict(list)
+        normalized = []
+        for row in rows:
+            names = normalize_tags(row.tags)
+            if names:
+                links[row.user_id].append((row.id, names))
+            if ",".join(names) != row.tags:
+                normalized.append({'bookmark_id': row.id, 'normalized': ",".join(names)})
+        for user_id, user_links in links.items():
+            linked += _link_tags(conn, user_id, user_links)
+        if normalized:
+            conn.execute(bookmarks.update().where(bookmarks.c.id == bindparam('bookmark_id'))
+                         .values(tags=bindparam('normalized')), normalized)
+        conn.commit()
+        last_id = rows[-1].id
+    logger.info(f"🏷️ Теги закладок перенесены: {linked} связей")
+    return linked
+
+def _expand_bookmark_media(conn: Connection):
+    """Миграция 9: file_unique_id и уникальный индекс (у старых строк NULL — конфликтов нет)"""
+    add_missing_columns(_ddl_v9)(conn)
+    create_indexes(_ddl_v9, "ux_bookmarks_user_file")(conn)
+
+def collapse_bookmark_duplicates(conn: Connection, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """
+    Миграция 10 (онлайн, разовая): схлопнуть уже сохранённые повторы одного медиа.
+    У старых строк file_unique_id нет, поэтому повтор — тот же file_id у того же пользователя.
+    Остаётся самая ранняя закладка с самым поздним saved_at, последней непустой подписью
+    и тегами всех копий. Порциями пользователей, каждая — своя транзакция. Возвращает число удалённых.
+    """
+    removed = 0
+    last_user_id = None
+    while True:
+        query = select(UserCounters.user_id).order_by(UserCounters.user_id).limit(batch_size)
+        if last_user_id is not None:
+            query = query.where(UserCounters.user_id > last_user_id)
+        user_ids = list(conn.execute(query).scalars())
+        if not user_ids:
+            break
+        groups = {tuple(row) for row in conn.execute(
+            select(Bookmark.user_id, Bookmark.file_id)
+            .where(Bookmark.user_id.in_(user_ids), Bookmark.file_id.is_not(None))
+            .group_by(Bookmark.user_id, Bookmark.file_id).having(func.count() > 1)
+        )}
+        if groups:
+            members = defaultdict(list)
+            for row in conn.execute(
+                select(Bookmark.id, Bookmark.user_id, Bookmark.file_id, Bookmark.file_unique_id, Bookmark.message_text)
+                .where(Bookmark.user_id.in_({user_id for user_id, _ in groups}),
+                       Bookmark.file_id.in_({file_id for _, file_id in groups}))
+                .order_by(Bookmark.id)
+            ):
+                if (row.user_id, row.file_id) in groups:
+                    members[row.user_id, row.file_id].append(row)
+            for (user_id, _), rows in members.items():
+                removed += _collapse_bookmarks(conn, user_id, rows)
+        conn.commit()
+        last_user_id = user_ids[-1]
+    logger.info(f"🧹 Повторы медиа в закладках схлопнуты: удалено {removed}")
+    return removed
+
+def _collapse_bookmarks(conn: Connection, user_id: int, rows) -> int:
+    """Слить копии одного медиа (rows — по возрастанию id) в первую. Возвращает число удалённых"""
+    survivor, duplicates = rows[0].id, [row.id for row in rows[1:]]
+    values = {'saved_at': select(func.max(Bookmark.saved_at))
+                          .where(Bookmark.id.in_([row.id for row in rows])).scalar_subquery()}
+    caption = next((row.message_text for row in reversed(rows) if row.message_text), None)
+    if caption:
+        values['message_text'] = caption
+    conn.execute(update(Bookmark).where(Bookmark.id == survivor).values(**values))
+
+    conn.execute(
+        _upsert(BookmarkTag)
+        .from_select(['bookmark_id', 'tag_id', 'user_id', 'saved_at'],
+                     select(literal(survivor), BookmarkTag.tag_id, BookmarkTag.user_id, BookmarkTag.saved_at)
+                     .where(BookmarkTag.bookmark_id.in_(duplicates)))
+        .on_conflict_do_nothing(index_elements=[BookmarkTag.bookmark_id, BookmarkTag.tag_id])
+    )
+    conn.execute(delete(BookmarkTag).where(BookmarkTag.bookmark_id.in_(duplicates)))
+    conn.execute(delete(Bookmark).where(Bookmark.id.in_(duplicates)))
+    # file_unique_id — только после удаления копий: уникальный индекс
+    file_unique_id = next((row.file_unique_id for row in rows if row.file_unique_id), None)
+    if file_unique_id and not rows[0].file_unique_id:
+        conn.execute(update(Bookmark).where(Bookmark.id == survivor).values(file_unique_id=file_unique_id))
+    conn.execute(
+        update(BookmarkTag).where(BookmarkTag.bookmark_id == survivor)
+        .values(saved_at=select(Bookmark.saved_at).where(Bookmark.id == survivor).scalar_subquery())
+    )
+    _sync_tag_strings(conn, [survivor])
+    _bump_counters(conn, user_id, bookmarks=-len(duplicates))
+    return len(duplicates)
+
+def normalize_sqlite_timestamps(conn: Connection, batch_size: int = BACKFILL_BATCH_SIZE):
+    """Миграция 12 (онлайн): DateTime-строки SQLite без дробной части секунд → '.000000', порциями по rowid"""
+    if conn.dialect.name != "sqlite":
+        return
+    normalized = 0
+    for table in Base.metadata.sorted_tables:
+        columns = [column.name for column in table.columns if isinstance(column.type, DateTime)]
+        if not columns:
+            continue
+        low, high = conn.execute(text(f"SELECT min(rowid), max(rowid) FROM {table.name}")).one()
+        if low is None:
+            continue
+        for column in columns:
+            statement = text(
+                f"UPDATE {table.name} SET {column} = {column} || '.000000' "
+                f"WHERE rowid >= :start AND rowid < :end AND length({column}) = 19"
+            )
+            for start in range(low, high + 1, batch_size):
+                normalized += conn.execute(statement, {"start": start, "end": start + batch_size}).rowcount
+                conn.commit()
+    logger.info(f"🕒 Время SQLite приведено к одному виду: {normalized} значений")
+
+MIGRATIONS = [
+    Migration(1, "baseline", create_tables(_ddl_v1, "users", "bookmarks", "reminders", "notes")),
+    Migration(2, "reminder lease columns", add_missing_columns(_ddl_v2)),
+    Migration(3, "user counters", _create_user_counters),
+    Migration(4, "hot-path composite indexes", _create_pending_indexes),
+    Migration(5, "unified users/notes: expand", _expand_unified_schema),
+    Migration(6, "unified notes: backfill", _backfill_unified_notes, online=True),
+    Migration(7, "bookmark tags", create_tables(_ddl_v7, "tags", "bookmark_tags")),
+    Migration(8, "bookmark tags: backfill", backfill_bookmark_tags, online=True),
+    Migration(9, "bookmark media: file_unique_id", _expand_bookmark_media),
+    Migration(10, "bookmark media: collapse duplicates", collapse_bookmark_duplicates, online=True),
+    Migration(11, "bookmark albums", add_missing_columns(_ddl_v11)),
+    Migration(12, "sqlite timestamps: one format", normalize_sqlite_timestamps, online=True),
+    Migration(13, "fsm states table", create_tables(fsm_metadata, "fsm_states")),
+    Migration(14, "webhook update ids", create_tables(webhook_metadata, "webhook_updates")),
+]
+
+def hot_queries() -> List[HotQuery]:
+    """Горячие запросы (те же условия и сортировки) и индексы, по которым они должны идти"""
+    now = datetime.now()
+    return [
+        HotQuery("list_bookmarks_page",
+                 select(Bookmark.id).where(Bookmark.user_id == 1)
+                 .order_by(Bookmark.saved_at.desc(), Bookmark.id.desc()).limit(LIST_PAGE_SIZE + 1),
+                 "ix_bookmarks_user_saved"),
+        HotQuery("add_bookmark (file_unique_id)",
+                 select(Bookmark.id).where(Bookmark.user_id == 1, Bookmark.file_unique_id == "x"),
+                 "ux_bookmarks_user_file"),
+        HotQuery("list_bookmarks_by_tags_page",
+                 select(BookmarkTag.bookmark_id).where(BookmarkTag.user_id == 1, BookmarkTag.tag_id == 1)
+                 .order_by(BookmarkTag.saved_at.desc(), BookmarkTag.bookmark_id.desc()).limit(LIST_PAGE_SIZE + 1),
+                 "ix_bookmark_tags_user_tag"),
+        HotQuery("list_notes_page",
+                 select(Note.id).where(Note.user_id == 1)
+                 .order_by(Note.updated_at.desc(), Note.id.desc()).limit(LIST_PAGE_SIZE + 1),
+                 "ix_notes_user_updated"),
+        HotQuery("search_notes (ilike)",
+                 select(Note.id).where(Note.user_id == 1, Note.content.icontains("x"))
+                 .order_by(Note.created_at.desc(), Note.id.desc()).limit(LIST_PAGE_SIZE + 1),
+                 "ix_notes_user_created"),
+        HotQuery("claim_due_reminders",
+                 select(Reminder.id).where(_pending, Reminder.remind_at <= now)
+                 .order_by(Reminder.remind_at.asc(), Reminder.id.asc()).limit(100),
+                 "ix_reminders_pending_remind_at"),
+        HotQuery("get_active_reminders",
+                 select(Reminder.id).where(Reminder.user_id == 1, _pending)
+                 .order_by(Reminder.remind_at.asc()),
+                 "ix_reminders_user_pending"),
+    ]
+
+def migrate() -> List[int]:
+    """Применить недостающие миграции; после изменений схемы — проверить планы горячих запросов"""
+    applied = run_migrations(get_engine(), MIGRATIONS, MIGRATIONS_NAMESPACE)
+    if applied:
+        check_query_plans(get_engine(), hot_queries())
+    return applied
+
+# ==================== ПОДГОТОВКА ПРИ ЗАПУСКЕ ====================
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+def init_db():
+    """
+    Явная подготовка БД, один раз на процесс: миграции (если не выключены DB_AUTO_MIGRATE=0 —
+    тогда схему применяют заранее: python migrations.py upgrade) и полнотекстовый поиск.
+    """
+    global _schema_ready
+    with _schema_lock:
+        if _schema_ready:
+            return
+        if DB_AUTO_MIGRATE:
+            migrate()
+            logger.info("✅ Таблицы созданы / проверены")
+        # 🔎 tsvector/GIN на PostgreSQL, FTS5 на SQLite, иначе ILIKE
+        db.search_backend = fulltext.setup_fulltext(get_engine())
+        _schema_ready = True
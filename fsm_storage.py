@@ -0,0 +1,243 @@
+"""
+Хранилища состояний FSM (и режима поиска) с истечением по TTL.
+
+• MemoryTTLStorage — в памяти процесса, брошенные состояния вычищаются
+• SQLStorage — таблица fsm_states (миграция 13), общая для нескольких реплик бота
+
+Выбор: FSM_STORAGE=memory | sql, время жизни — FSM_STATE_TTL (секунды).
+"""
+import os
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from loguru import logger
+from sqlalchemy import Column, DateTime, MetaData, String, Table, Text, delete, inspect, select
+from sqlalchemy.engine import Engine
+
+from async_db import run_db
+
+FSM_STORAGE = os.getenv("FSM_STORAGE", "memory")
+FSM_STATE_TTL = int(os.getenv("FSM_STATE_TTL", str(24 * 3600)))
+# Кэш чтений SQL-хранилища в процессе (секунды). 0 — всегда читать из БД:
+# с несколькими репликами кэш может отдать чужое устаревшее состояние
+FSM_READ_CACHE_TTL = float(os.getenv("FSM_READ_CACHE_TTL", "0"))
+
+
+def _state_name(state: StateType) -> Optional[str]:
+    return state.state if isinstance(state, State) else state
+
+
+def _key_str(key: StorageKey) -> str:
+    return ":".join(str(part) if part is not None else "" for part in (
+        key.bot_id, key.chat_id, key.user_id, key.thread_id, key.business_connection_id, key.destiny
+    ))
+
+
+# ==================== В ПАМЯТИ ====================
+
+class MemoryTTLStorage(BaseStorage):
+    """Как MemoryStorage из aiogram, но записи истекают через ttl и их число ограничено"""
+
+    def __init__(self, ttl: float = FSM_STATE_TTL, maxsize: int = 100_000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        # key -> [state, data, expires_at]; порядок — по последней записи
+        self._records: "OrderedDict[StorageKey, list]" = OrderedDict()
+
+    def _get(self, key: StorageKey) -> Optional[list]:
+        record = self._records.get(key)
+        if record is not None and record[2] <= time.monotonic():
+            del self._records[key]
+            return None
+        return record
+
+    def _put(self, key: StorageKey, state: Optional[str], data: Dict[str, Any]):
+        if state is None and not data:
+            self._records.pop(key, None)
+            return
+        self._records[key] = [state, data, time.monotonic() + self.ttl]
+        self._records.move_to_end(key)
+        self._evict()
+
+    def _evict(self):
+        """Записи упорядочены по времени записи — истёкшие всегда в начале"""
+        now = time.monotonic()
+        while self._records:
+            key, record = next(iter(self._records.items()))
+            if record[2] > now and len(self._records) <= self.maxsize:
+                break
+            self._records.popitem(last=False)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = self._get(key)
+        self._put(key, _state_name(state), record[1] if record else {})
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = self._get(key)
+        return record[0] if record else None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        record = self._get(key)
+        self._put(key, record[0] if record else None, data.copy())
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = self._get(key)
+        return record[1].copy() if record else {}
+
+    async def close(self) -> None:
+        pass
+
+
+# ==================== SQL (общее для реплик) ====================
+
+metadata = MetaData()
+
+fsm_states = Table(
+    "fsm_states", metadata,
+    Column("key", String, primary_key=True),
+    Column("state", String, nullable=True),
+    Column("data", Text, nullable=True),
+    Column("expires_at", DateTime, nullable=False, index=True),
+)
+
+
+class SQLStorage(BaseStorage):
+    """
+    Состояния в таблице fsm_states: одна строка на ключ, чтение — по первичному ключу.
+    Просроченные строки не читаются и удаляются purge_expired (раз в purge_interval).
+    """
+
+    def __init__(self, engine: Engine, ttl: float = FSM_STATE_TTL,
+                 read_cache_ttl: float = FSM_READ_CACHE_TTL, purge_interval: float = 600.0):
+        self.engine = engine
+        self.ttl = ttl
+        self.read_cache_ttl = read_cache_ttl
+        self.purge_interval = purge_interval
+        self._last_purge = time.monotonic()
+        self._cache: Dict[str, tuple] = {}  # key -> (state, data, cached_until)
+        # Диалектный INSERT ... ON CONFLICT импортируем только когда SQL-хранилище выбрано
+        if engine.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        self._insert = insert
+
+    def setup(self):
+        """Таблицу создаёт миграция 13 (database.schema), здесь — только проверка"""
+        if not inspect(self.engine).has_table(fsm_states.name):
+            raise RuntimeError("Нет таблицы fsm_states — примените миграции: python migrations.py upgrade")
+
+    # ---------- синхронная часть (выполняется в пуле потоков БД) ----------
+
+    def _load(self, key: str) -> tuple:
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                select(fsm_states.c.state, fsm_states.c.data)
+                .where(fsm_states.c.key == key, fsm_states.c.expires_at > datetime.now())
+            ).first()
+        if row is None:
+            return None, {}
+        return row.state, json.loads(row.data) if row.data else {}
+
+    def _store(self, key: str, state: Optional[str], data: Optional[Dict[str, Any]]):
+        """Записать state и/или data (None — оставить как есть)"""
+        with self.engine.begin() as conn:
+            if state is None and data is None:
+                return
+            current_state, current_data = None, {}
+            if state is None or data is None:
+                row = conn.execute(
+                    select(fsm_states.c.state, fsm_states.c.data)
+                    .where(fsm_states.c.key == key, fsm_states.c.expires_at > datetime.now())
+                ).first()
+                if row is not None:
+                    current_state, current_data = row.state, json.loads(row.data) if row.data else {}
+            new_state = state if state is not None else current_state
+            new_data = data if data is not None else current_data
+            if state == "":
+                new_state = None
+
+            if new_state is None and not new_data:
+                conn.execute(delete(fsm_states).where(fsm_states.c.key == key))
+                return new_state, new_data
+
+            values = {
+                "key": key,
+                "state": new_state,
+                "data": json.dumps(new_data, ensure_ascii=False) if new_data else None,
+                "expires_at": datetime.now() + timedelta(seconds=self.ttl),
+            }
+            stmt = self._insert(fsm_states).values(**values)
+            conn.execute(stmt.on_conflict_do_update(
+                index_elements=[fsm_states.c.key],
+                set_={name: stmt.excluded[name] for name in ("state", "data", "expires_at")}
+            ))
+            return new_state, new_data
+
+    def purge_expired(self) -> int:
+        """Удалить брошенные (просроченные) состояния"""
+        with self.engine.begin() as conn:
+            result = conn.execute(delete(fsm_states).where(fsm_states.c.expires_at <= datetime.now()))
+        if result.rowcount:
+            logger.info(f"🧹 Удалено просроченных FSM-состояний: {result.rowcount}")
+        return result.rowcount
+
+    # ---------- BaseStorage ----------
+
+    async def _read(self, key: StorageKey) -> tuple:
+        key_str = _key_str(key)
+        cached = self._cache.get(key_str)
+        if cached is not None and cached[2] > time.monotonic():
+            return cached[0], cached[1]
+        state, data = await run_db(self._load, key_str)
+        self._remember(key_str, state, data)
+        return state, data
+
+    async def _write(self, key: StorageKey, state: Optional[str], data: Optional[Dict[str, Any]]):
+        key_str = _key_str(key)
+        result = await run_db(self._store, key_str, state, data)
+        if result is not None:
+            self._remember(key_str, *result)
+        if time.monotonic() - self._last_purge >= self.purge_interval:
+            self._last_purge = time.monotonic()
+            await run_db(self.purge_expired)
+
+    def _remember(self, key: str, state: Optional[str], data: Dict[str, Any]):
+        if self.read_cache_ttl > 0:
+            self._cache[key] = (state, data, time.monotonic() + self.read_cache_ttl)
+            if len(self._cache) > 100_000:
+                self._cache.clear()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        # "" — явный сброс состояния (None в _store означает «не менять»)
+        await self._write(key, _state_name(state) or "", None)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._read(key))[0]
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await self._write(key, None, data.copy())
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return dict((await self._read(key))[1])
+
+    async def close(self) -> None:
+        self._cache.clear()
+
+
+def create_storage(engine: Optional[Engine] = None, kind: str = FSM_STORAGE) -> BaseStorage:
+    """Хранилище по настройке FSM_STORAGE"""
+    if kind == "sql":
+        if engine is None:
+            raise ValueError("Для FSM_STORAGE=sql нужен engine")
+        storage = SQLStorage(engine)
+        storage.setup()
+        logger.info("🗂️ FSM: SQL-хранилище (общее для реплик)")
+        return storage
+    logger.info("🗂️ FSM: память процесса с TTL")
+    return MemoryTTLStorage()
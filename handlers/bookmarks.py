@@ -1,28 +1,21 @@
-from aiogram import Router, F, Bot
+import html
+import hashlib
+from typing import Dict, List, Optional
+from aiogram import Router, F
+from aiogram.filters import Command, CommandObject
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.enums import ChatMemberStatus
-from database import db
-from keyboards import get_bookmarks_menu, get_back_button
+from database import adb, normalize_tags
+from middlewares import message_media, album_captions
+from keyboards import (
+    get_bookmarks_menu, get_back_button, ListPageCallback, get_list_pagination_keyboard,
+    TagPageCallback, get_tags_keyboard, get_tag_pagination_keyboard, get_bookmark_tags_prompt_keyboard
+)
 
 router = Router()
 
-# 🔑 Константа канала (должна совпадать с .env)
-REQUIRED_CHANNEL = "@bot_pro_bot_you"
-
-# 🔑 Функция проверки подписки
-async def is_subscribed(bot: Bot, user_id: int) -> bool:
-    """Проверить, подписан ли пользователь на канал"""
-    try:
-        chat_member = await bot.get_chat_member(REQUIRED_CHANNEL, user_id)
-        return chat_member.status in [
-            ChatMemberStatus.MEMBER,
-            ChatMemberStatus.ADMINISTRATOR,
-            ChatMemberStatus.CREATOR
-        ]
-    except Exception as e:
-        return False
+# 🔒 Подписка проверяется один раз на апдейт в middlewares.SubscriptionMiddleware
 
 # FSM для добавления закладки
 class BookmarkStates(StatesGroup):
@@ -30,12 +23,7 @@ class BookmarkStates(StatesGroup):
     waiting_for_tags = State()
 
 @router.callback_query(F.data == "bookmarks_menu")
-async def bookmarks_menu(callback: CallbackQuery, bot: Bot):
-    # 🔑 Проверка подписки
-    if not await is_subscribed(bot, callback.from_user.id):
-        await callback.answer("🔒 Для доступа к функциям бота подпишитесь на канал @bot_pro_bot_you", show_alert=True)
-        return
-    
+async def bookmarks_menu(callback: CallbackQuery):
     try:
         await callback.message.edit_text(
             "📌 <b>Закладки</b>\n\n"
@@ -52,16 +40,21 @@ async def bookmarks_menu(callback: CallbackQuery, bot: Bot):
         )
     await callback.answer()
 
+def render_bookmarks_page(page: Dict, title: str = "📌 <b>Ваши закладки</b>") -> str:
+    text = f"{title}:\n\n"
+    for bm in page['items']:
+        text += f"• {html.escape(bm['preview']) if bm['preview'] else '📎 Файл/медиа'}\n"
+    return text
+
+def bookmarks_page_keyboard(page: Dict) -> InlineKeyboardMarkup:
+    return get_list_pagination_keyboard("bookmarks", page['prev_cursor'], page['next_cursor'], "bookmarks_menu")
+
 @router.callback_query(F.data == "bookmarks_list")
-async def show_bookmarks(callback: CallbackQuery, bot: Bot):
-    # 🔑 Проверка подписки
-    if not await is_subscribed(bot, callback.from_user.id):
-        await callback.answer("🔒 Для доступа к функциям бота подпишитесь на канал @bot_pro_bot_you", show_alert=True)
-        return
+async def show_bookmarks(callback: CallbackQuery):
+    # Только первая страница: id, тип и превью, обрезанное в SQL
+    page = await adb.list_bookmarks_page(callback.from_user.id)
     
-    bookmarks = db.get_bookmarks(callback.from_user.id, limit=20)
-    
-    if not bookmarks:
+    if not page['items']:
         text = "📭 У вас пока нет закладок.\n\nПерешлите любое сообщение мне, чтобы сохранить его!"
         try:
             await callback.message.edit_text(text, reply_markup=get_back_button("bookmarks_menu"))
@@ -69,27 +62,25 @@ async def show_bookmarks(callback: CallbackQuery, bot: Bot):
             await callback.message.answer(text, reply_markup=get_back_button("bookmarks_menu"))
         return
     
-    text = "📌 <b>Ваши закладки</b>:\n\n"
-    for i, bm in enumerate(bookmarks[:10], 1):
-        content = bm['message_text'][:50] + "..." if bm['message_text'] and len(bm['message_text']) > 50 else bm['message_text']
-        text += f"{i}. {content or '📎 Файл/медиа'}\n"
-    
-    if len(bookmarks) > 10:
-        text += f"\n...и ещё {len(bookmarks) - 10} закладок"
-    
+    text = render_bookmarks_page(page)
     try:
-        await callback.message.edit_text(text, reply_markup=get_back_button("bookmarks_menu"))
+        await callback.message.edit_text(text, reply_markup=bookmarks_page_keyboard(page))
     except Exception:
-        await callback.message.answer(text, reply_markup=get_back_button("bookmarks_menu"))
+        await callback.message.answer(text, reply_markup=bookmarks_page_keyboard(page))
     await callback.answer()
 
-@router.callback_query(F.data == "bookmarks_add")
-async def add_bookmark_start(callback: CallbackQuery, state: FSMContext, bot: Bot):
-    # 🔑 Проверка подписки
-    if not await is_subscribed(bot, callback.from_user.id):
-        await callback.answer("🔒 Для доступа к функциям бота подпишитесь на канал @bot_pro_bot_you", show_alert=True)
+@router.callback_query(ListPageCallback.filter(F.kind == "bookmarks"))
+async def bookmarks_page(callback: CallbackQuery, callback_data: ListPageCallback):
+    page = await adb.list_bookmarks_page(callback.from_user.id, callback_data.cursor, callback_data.back)
+    if not page['items']:
+        await callback.answer("Больше ничего нет")
         return
     
+    await callback.message.edit_text(render_bookmarks_page(page), reply_markup=bookmarks_page_keyboard(page))
+    await callback.answer()
+
+@router.callback_query(F.data == "bookmarks_add")
+async def add_bookmark_start(callback: CallbackQuery, state: FSMContext):
     try:
         await callback.message.edit_text(
             "📤 <b>Добавить закладку</b>\n\n"
@@ -105,70 +96,170 @@ async def add_bookmark_start(callback: CallbackQuery, state: FSMContext, bot: Bo
     await state.set_state(BookmarkStates.waiting_for_message)
     await callback.answer()
 
+def bookmark_fields(message: Message, album: Optional[List[Message]] = None) -> Dict:
+    """
+    Поля закладки из сообщения. file_unique_id — одно и то же медиа, пересланное снова,
+    не станет второй закладкой. Альбом — одна закладка со списком всех вложений.
+    """
+    if album:
+        media = [item for item in map(message_media, album) if item]
+        unique_ids = ",".join(sorted(item['file_unique_id'] for item in media))
+        return {
+            'message_text': album_captions(album),
+            'message_type': 'album',
+            'file_id': media[0]['file_id'] if media else None,
+            'file_unique_id': "album:" + hashlib.sha1(unique_ids.encode()).hexdigest() if media else None,
+            'media': media,
+        }
+    media = message_media(message)
+    if media is None:
+        return {'message_text': message.text or '', 'message_type': 'text'}
+    return {
+        'message_text': message.caption or '',
+        'message_type': media['type'],
+        'file_id': media['file_id'],
+        'file_unique_id': media['file_unique_id'],
+    }
+
 @router.message(BookmarkStates.waiting_for_message)
-async def save_bookmark(message: Message, state: FSMContext, bot: Bot):
-    # 🔑 Проверка подписки
-    if not await is_subscribed(bot, message.from_user.id):
-        await message.answer(
-            "🔒 <b>Требуется подписка</b>\n\n"
-            "Чтобы пользоваться ботом, подпишитесь на наш канал:\n"
-            f"<a href='https://t.me/{REQUIRED_CHANNEL.lstrip('@')}'>{REQUIRED_CHANNEL}</a>",
-            reply_markup=get_back_button(),
-            disable_web_page_preview=True
-        )
-        if state is not None:
-            await state.clear()
-        return
+async def save_bookmark(message: Message, state: FSMContext, album: Optional[List[Message]] = None):
+    # Альбом приходит одним апдейтом (MediaGroupMiddleware) — и сохраняется одной закладкой
+    fields = bookmark_fields(message, album)
+    bookmark_id = await adb.add_bookmark(user_id=message.from_user.id, **fields)
+    message_type = f"альбом, {len(fields['media'])} влож." if album else fields['message_type']
     
-    # Определяем тип сообщения
-    message_type = 'text'
-    file_id = None
+    # 🏷️ Следующий шаг — теги для этой закладки (можно пропустить)
+    await state.set_state(BookmarkStates.waiting_for_tags)
+    await state.update_data(bookmark_id=bookmark_id)
     
-    if message.text:
-        message_type = 'text'
-        content = message.text
-    elif message.photo:
-        message_type = 'photo'
-        file_id = message.photo[-1].file_id
-        content = message.caption or ''
-    elif message.document:
-        message_type = 'document'
-        file_id = message.document.file_id
-        content = message.caption or ''
-    elif message.video:
-        message_type = 'video'
-        file_id = message.video.file_id
-        content = message.caption or ''
-    else:
-        content = ''
+    await message.answer(
+        f"✅ <b>Сохранено!</b>\n\n"
+        f"Закладка #{bookmark_id} добавлена.\n"
+        f"Тип: {message_type}\n\n"
+        f"🏷️ Добавьте теги через запятую или пробел, например: <code>работа, идеи</code>",
+        reply_markup=get_bookmark_tags_prompt_keyboard()
+    )
+
+@router.message(BookmarkStates.waiting_for_tags, F.text)
+async def save_bookmark_tags(message: Message, state: FSMContext):
+    bookmark_id = (await state.get_data()).get('bookmark_id')
+    await state.clear()
+    if message.text.startswith("/") or bookmark_id is None:
+        await message.answer("Закладка сохранена без тегов", reply_markup=get_back_button("bookmarks_menu"))
+        return
     
-    # Сохраняем в БД
-    bookmark_id = db.add_bookmark(
-        user_id=message.from_user.id,
-        message_text=content,
-        message_type=message_type,
-        file_id=file_id
+    await adb.tag_bookmarks(message.from_user.id, [bookmark_id], message.text)
+    tags = await adb.list_tags(message.from_user.id)
+    await message.answer(
+        f"🏷️ Теги сохранены. Всего тегов: {len(tags)}",
+        reply_markup=get_tags_keyboard(tags)
     )
+
+@router.callback_query(F.data == "bookmarks_tags_skip")
+async def skip_bookmark_tags(callback: CallbackQuery, state: FSMContext):
+    await state.clear()
+    await callback.message.edit_text("✅ Закладка сохранена без тегов", reply_markup=get_back_button("bookmarks_menu"))
+    await callback.answer()
+
+# ==================== ТЕГИ ====================
+
+async def show_tags(message: Message, user_id: int, edit: bool = False):
+    tags = await adb.list_tags(user_id)
+    if tags:
+        text = "🏷️ <b>Ваши теги</b>\n\nЗакладки с несколькими тегами сразу: <code>/tags работа идеи</code>"
+    else:
+        text = "🏷️ Тегов пока нет — их можно добавить сразу после сохранения закладки."
+    if edit:
+        try:
+            await message.edit_text(text, reply_markup=get_tags_keyboard(tags))
+            return
+        except Exception:
+            pass
+    await message.answer(text, reply_markup=get_tags_keyboard(tags))
+
+def render_tag_page(page: Dict, names: str) -> str:
+    return render_bookmarks_page(page, f"🏷️ <b>{html.escape(names)}</b>")
+
+# Фильтр из нескольких тегов в callback_data не кладём (лимит 64 байта): там короткий
+# токен, сами id — в данных FSM пользователя, как запросы поиска. Один тег — просто его id
+TAG_FILTERS_MAX = 5
+TAG_FILTER_PREFIX = "f"
+
+async def remember_tag_filter(state: FSMContext, tag_ids: List[int]) -> str:
+    """Ключ фильтра для TagPageCallback.tags"""
+    if len(tag_ids) == 1:
+        return str(tag_ids[0])
+    key = ".".join(str(tag_id) for tag_id in tag_ids)
+    token = TAG_FILTER_PREFIX + hashlib.blake2b(key.encode(), digest_size=4).hexdigest()
+    filters = (await state.get_data()).get("tag_filters", {})
+    filters.pop(token, None)
+    filters[token] = tag_ids
+    while len(filters) > TAG_FILTERS_MAX:
+        filters.pop(next(iter(filters)))
+    await state.update_data(tag_filters=filters)
+    return token
+
+async def recall_tag_filter(state: FSMContext, key: str) -> Optional[List[int]]:
+    """id тегов по ключу из callback_data; None — ключ битый или фильтр уже забыт"""
+    if key.startswith(TAG_FILTER_PREFIX):
+        return (await state.get_data()).get("tag_filters", {}).get(key)
+    try:
+        return [int(key)]
+    except ValueError:
+        return None
+
+@router.callback_query(F.data == "bookmarks_tags")
+async def tags_menu(callback: CallbackQuery):
+    await show_tags(callback.message, callback.from_user.id, edit=True)
+    await callback.answer()
+
+@router.message(Command("tags"))
+async def tags_command(message: Message, command: CommandObject, state: FSMContext):
+    if not command.args:
+        await show_tags(message, message.from_user.id)
+        return
     
-    # 🔑 ВАЖНО: Проверяем, что state существует перед очисткой
-    if state is not None:
-        await state.clear()
+    wanted = normalize_tags(command.args)
+    found = await adb.get_tag_ids(message.from_user.id, wanted)
+    names = " ".join(f"#{name}" for name in wanted)
+    # Незнакомый тег — пересечение пустое, без запроса страницы
+    page = await adb.list_bookmarks_by_tags_page(message.from_user.id, list(found.values())) \
+        if wanted and len(found) == len(wanted) else None
+    if not page or not page['items']:
+        await message.answer("📭 Нет закладок со всеми этими тегами", reply_markup=get_back_button("bookmarks_tags"))
+        return
     
+    key = await remember_tag_filter(state, list(found.values()))
     await message.answer(
-        f"✅ <b>Сохранено!</b>\n\n"
-        f"Закладка #{bookmark_id} добавлена.\n"
-        f"Тип: {message_type}\n\n"
-        f"Посмотреть все: /bookmarks",
-        reply_markup=get_back_button("bookmarks_menu")
+        render_tag_page(page, names),
+        reply_markup=get_tag_pagination_keyboard(key, page['prev_cursor'], page['next_cursor'])
     )
 
-@router.callback_query(F.data == "bookmarks_clear")
-async def clear_bookmarks_confirm(callback: CallbackQuery, bot: Bot):
-    # 🔑 Проверка подписки
-    if not await is_subscribed(bot, callback.from_user.id):
-        await callback.answer("🔒 Для доступа к функциям бота подпишитесь на канал @bot_pro_bot_you", show_alert=True)
+@router.callback_query(TagPageCallback.filter())
+async def tag_page(callback: CallbackQuery, callback_data: TagPageCallback, state: FSMContext):
+    tag_ids = await recall_tag_filter(state, callback_data.tags)
+    try:
+        page = await adb.list_bookmarks_by_tags_page(
+            callback.from_user.id, tag_ids, callback_data.cursor or None, callback_data.back
+        ) if tag_ids else None
+    except ValueError:  # битый курсор
+        page = None
+    if page is None:
+        await callback.answer("⌛ Список устарел — повторите /tags", show_alert=True)
+        return
+    if not page['items']:
+        await callback.answer("Больше ничего нет")
         return
     
+    names = {tag['id']: tag['tag'] for tag in await adb.list_tags(callback.from_user.id)}
+    await callback.message.edit_text(
+        render_tag_page(page, " ".join(f"#{names.get(tag_id, tag_id)}" for tag_id in tag_ids)),
+        reply_markup=get_tag_pagination_keyboard(callback_data.tags, page['prev_cursor'], page['next_cursor'])
+    )
+    await callback.answer()
+
+@router.callback_query(F.data == "bookmarks_clear")
+async def clear_bookmarks_confirm(callback: CallbackQuery):
     try:
         await callback.message.edit_text(
             "⚠️ <b>Очистить все закладки?</b>\n\n"
@@ -190,13 +281,8 @@ async def clear_bookmarks_confirm(callback: CallbackQuery, bot: Bot):
     await callback.answer()
 
 @router.callback_query(F.data == "bookmarks_clear_confirm")
-async def clear_bookmarks(callback: CallbackQuery, bot: Bot):
-    # 🔑 Проверка подписки
-    if not await is_subscribed(bot, callback.from_user.id):
-        await callback.answer("🔒 Для доступа к функциям бота подпишитесь на канал @bot_pro_bot_you", show_alert=True)
-        return
-    
-    deleted = db.clear_bookmarks(callback.from_user.id)
+async def clear_bookmarks(callback: CallbackQuery):
+    deleted = await adb.clear_bookmarks(callback.from_user.id)
     text = f"✅ Все закладки удалены ({deleted} шт.)."
     try:
         await callback.message.edit_text(text, reply_markup=get_back_button("bookmarks_menu"))
@@ -205,52 +291,12 @@ async def clear_bookmarks(callback: CallbackQuery, bot: Bot):
     await callback.answer()
 
 # 🔑 НОВАЯ ФУНКЦИЯ: Безопасное сохранение из обычного сообщения (без FSM)
-async def save_bookmark_simple(message: Message, bot: Bot = None):
+async def save_bookmark_simple(message: Message, album: Optional[List[Message]] = None):
     """
     Сохранение закладки без использования FSM.
-    Параметр bot используется для проверки подписки.
+    Подписка уже проверена middleware на уровне апдейта.
     """
-    # Если бот передан — проверяем подписку
-    if bot is not None:
-        if not await is_subscribed(bot, message.from_user.id):
-            await message.answer(
-                "🔒 <b>Требуется подписка</b>\n\n"
-                "Чтобы пользоваться ботом, подпишитесь на наш канал:\n"
-                f"<a href='https://t.me/{REQUIRED_CHANNEL.lstrip('@')}'>{REQUIRED_CHANNEL}</a>",
-                reply_markup=get_back_button(),
-                disable_web_page_preview=True
-            )
-            return
-    
-    # Определяем тип сообщения
-    message_type = 'text'
-    file_id = None
-    
-    if message.text:
-        message_type = 'text'
-        content = message.text
-    elif message.photo:
-        message_type = 'photo'
-        file_id = message.photo[-1].file_id
-        content = message.caption or ''
-    elif message.document:
-        message_type = 'document'
-        file_id = message.document.file_id
-        content = message.caption or ''
-    elif message.video:
-        message_type = 'video'
-        file_id = message.video.file_id
-        content = message.caption or ''
-    else:
-        content = ''
-    
-    # Сохраняем в БД
-    bookmark_id = db.add_bookmark(
-        user_id=message.from_user.id,
-        message_text=content,
-        message_type=message_type,
-        file_id=file_id
-    )
+    bookmark_id = await adb.add_bookmark(user_id=message.from_user.id, **bookmark_fields(message, album))
     
     await message.reply(
         f"✅ <b>Сохранено в закладки!</b>\n\nID: #{bookmark_id}",
@@ -0,0 +1,125 @@
+import os
+import tempfile
+from datetime import datetime
+from typing import Set
+from aiogram import Router, F
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message, FSInputFile
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from loguru import logger
+from database import db
+from async_db import run_db_bulk
+from backup import EXPORT_FORMATS, write_export, read_import
+
+router = Router()
+
+# Лимит Bot API на скачивание файла ботом
+MAX_IMPORT_FILE_SIZE = 20 * 1024 * 1024
+
+# Один экспорт / импорт на пользователя одновременно
+_busy: Set[int] = set()
+
+class ImportStates(StatesGroup):
+    waiting_for_file = State()
+
+def _temp_path(suffix: str) -> str:
+    fd, path = tempfile.mkstemp(prefix="jarvis-", suffix=suffix)
+    os.close(fd)
+    return path
+
+def _export_to_file(user_id: int, fmt: str, path: str):
+    with open(path, "wb") as destination:
+        return write_export(db, user_id, destination, fmt)
+
+@router.message(Command("export"))
+async def export_data(message: Message, command: CommandObject):
+    user_id = message.from_user.id
+    fmt = (command.args or "jsonl").strip().lower()
+    if fmt == "markdown":
+        fmt = "md"
+    if fmt not in EXPORT_FORMATS:
+        await message.answer("Формат: <code>/export</code> (JSONL) или <code>/export md</code> (Markdown)")
+        return
+    if user_id in _busy:
+        await message.answer("⏳ Предыдущий экспорт или импорт ещё не закончился")
+        return
+
+    _busy.add(user_id)
+    path = _temp_path(".zip")
+    try:
+        await message.answer("📦 Собираю архив…")
+        counts = await run_db_bulk(_export_to_file, user_id, fmt, path)
+        filename = f"jarvis-{datetime.now():%Y-%m-%d}-{fmt}.zip"
+        # FSInputFile отдаётся с диска кусками — архив целиком в память не читается
+        await message.answer_document(
+            FSInputFile(path, filename=filename),
+            caption=(
+                f"📦 Экспорт: заметок {counts['notes']}, закладок {counts['bookmarks']}, "
+                f"напоминаний {counts['reminders']}"
+            )
+        )
+    except Exception as e:
+        logger.error(f"❌ Экспорт пользователя {user_id}: {e}")
+        await message.answer("❌ Не удалось собрать архив, попробуйте позже")
+    finally:
+        _busy.discard(user_id)
+        os.remove(path)
+
+@router.message(Command("import"))
+async def import_start(message: Message, state: FSMContext):
+    await message.answer(
+        "📥 <b>Импорт</b>\n\n"
+        "Пришлите zip-архив из /export (формат JSONL) "
+        "или файл notes.jsonl / bookmarks.jsonl / reminders.jsonl.\n"
+        "Данные добавятся к существующим."
+    )
+    await state.set_state(ImportStates.waiting_for_file)
+
+@router.message(ImportStates.waiting_for_file, F.document)
+async def import_file(message: Message, state: FSMContext):
+    user_id = message.from_user.id
+    document = message.document
+    if document.file_size and document.file_size > MAX_IMPORT_FILE_SIZE:
+        await message.answer("❌ Файл больше 20 МБ — Telegram не даст боту его скачать")
+        return
+    if user_id in _busy:
+        await message.answer("⏳ Предыдущий экспорт или импорт ещё не закончился")
+        return
+
+    await state.clear()
+    _busy.add(user_id)
+    # Имя файла важно для одиночного *.jsonl: по нему понятно, что импортируем
+    folder = tempfile.mkdtemp(prefix="jarvis-import-")
+    path = os.path.join(folder, os.path.basename(document.file_name or "import.zip"))
+    try:
+        await message.bot.download(document, destination=path)
+        result = await run_db_bulk(read_import, db, user_id, path)
+        imported = result['imported']
+        text = (
+            f"✅ <b>Импорт завершён</b>\n\n"
+            f"📝 Заметок: {imported['notes']}\n"
+            f"🔖 Закладок: {imported['bookmarks']}\n"
+            f"⏰ Напоминаний: {imported['reminders']}"
+        )
+        if result['skipped']:
+            text += f"\n\n⚠️ Пропущено строк: {result['skipped']}"
+        await message.answer(text)
+    except ValueError as e:
+        await message.answer(f"❌ {e}")
+    except Exception as e:
+        logger.error(f"❌ Импорт пользователя {user_id}: {e}")
+        await message.answer("❌ Не удалось импортировать файл")
+    finally:
+        _busy.discard(user_id)
+        if os.path.exists(path):
+            os.remove(path)
+        os.rmdir(folder)
+
+@router.message(ImportStates.waiting_for_file)
+async def import_wrong_input(message: Message, state: FSMContext):
+    if message.text and message.text.startswith("/"):
+        await state.clear()
+        await message.answer("Импорт отменён")
+        return
+    await message.answer("📎 Пришлите файл документом или любую команду для отмены")
@@ -0,0 +1,38 @@
+import os
+import asyncio
+from typing import Optional
+from aiogram import Router
+from loguru import logger
+from database import adb, init_db
+from async_db import run_db
+
+router = Router()
+
+# 🧮 Периодическая сверка счётчиков пользователей с реальными данными
+COUNTERS_RECONCILE_INTERVAL = float(os.getenv("COUNTERS_RECONCILE_INTERVAL", str(6 * 3600)))
+
+reconcile_task: Optional[asyncio.Task] = None
+
+async def reconcile_counters_periodically(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await adb.reconcile_user_counters()
+        except Exception as e:
+            logger.error(f"❌ Ошибка сверки счётчиков: {e}")
+
+@router.startup()
+async def start_maintenance():
+    global reconcile_task
+    await run_db(init_db)
+    if COUNTERS_RECONCILE_INTERVAL > 0:
+        reconcile_task = asyncio.create_task(reconcile_counters_periodically(COUNTERS_RECONCILE_INTERVAL))
+
+@router.shutdown()
+async def stop_maintenance():
+    if reconcile_task is not None:
+        reconcile_task.cancel()
+        try:
+            await reconcile_task
+        except asyncio.CancelledError:
+            pass
@@ -0,0 +1,23 @@
+from aiogram import Router, F
+from aiogram.filters import Command
+from aiogram.types import Message, CallbackQuery
+from keyboards import get_main_menu
+
+router = Router()
+
+MAIN_MENU_TEXT = (
+    "🗂️ <b>Разделы</b>\n\n"
+    "Заметки, закладки, напоминания и настройки:"
+)
+
+@router.message(Command("menu"))
+async def menu_command(message: Message):
+    await message.answer(MAIN_MENU_TEXT, reply_markup=get_main_menu())
+
+@router.callback_query(F.data == "main_menu")
+async def main_menu(callback: CallbackQuery):
+    try:
+        await callback.message.edit_text(MAIN_MENU_TEXT, reply_markup=get_main_menu())
+    except Exception:
+        await callback.message.answer(MAIN_MENU_TEXT, reply_markup=get_main_menu())
+    await callback.answer()
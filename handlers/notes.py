@@ -1,9 +1,11 @@
+import html
+from typing import Dict
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from database import db
-from keyboards import get_notes_menu, get_back_button
+from database import adb
+from keyboards import get_notes_menu, get_back_button, ListPageCallback, get_list_pagination_keyboard
 
 router = Router()
 
@@ -30,11 +32,21 @@ async def notes_menu(callback: CallbackQuery):
         )
     await callback.answer()
 
+def render_notes_page(page: Dict) -> str:
+    text = "📝 <b>Ваши заметки</b>:\n\n"
+    for note in page['items']:
+        text += f"• {html.escape(note['title'])}\n"
+    return text
+
+def notes_page_keyboard(page: Dict) -> InlineKeyboardMarkup:
+    return get_list_pagination_keyboard("notes", page['prev_cursor'], page['next_cursor'], "notes_menu")
+
 @router.callback_query(F.data == "notes_list")
 async def show_notes(callback: CallbackQuery):
-    notes = db.get_notes(callback.from_user.id, limit=20)
+    # Только первая страница: id и заголовок, обрезанный в SQL
+    page = await adb.list_notes_page(callback.from_user.id)
     
-    if not notes:
+    if not page['items']:
         text = "📭 У вас пока нет заметок.\n\nНажмите «✏️ Новая заметка», чтобы создать."
         try:
             await callback.message.edit_text(text, reply_markup=get_back_button("notes_menu"))
@@ -42,18 +54,21 @@ async def show_notes(callback: CallbackQuery):
             await callback.message.answer(text, reply_markup=get_back_button("notes_menu"))
         return
     
-    text = "📝 <b>Ваши заметки</b>:\n\n"
-    for i, note in enumerate(notes[:10], 1):
-        title = note['title'][:40] + "..." if len(note['title']) > 40 else note['title']
-        text += f"{i}. {title}\n"
-    
-    if len(notes) > 10:
-        text += f"\n...и ещё {len(notes) - 10} заметок"
-    
+    text = render_notes_page(page)
     try:
-        await callback.message.edit_text(text, reply_markup=get_back_button("notes_menu"))
+        await callback.message.edit_text(text, reply_markup=notes_page_keyboard(page))
     except Exception:
-        await callback.message.answer(text, reply_markup=get_back_button("notes_menu"))
+        await callback.message.answer(text, reply_markup=notes_page_keyboard(page))
+    await callback.answer()
+
+@router.callback_query(ListPageCallback.filter(F.kind == "notes"))
+async def notes_page(callback: CallbackQuery, callback_data: ListPageCallback):
+    page = await adb.list_notes_page(callback.from_user.id, callback_data.cursor, callback_data.back)
+    if not page['items']:
+        await callback.answer("Больше ничего нет")
+        return
+    
+    await callback.message.edit_text(render_notes_page(page), reply_markup=notes_page_keyboard(page))
     await callback.answer()
 
 @router.callback_query(F.data == "notes_add")
@@ -89,7 +104,7 @@ async def save_note(message: Message, state: FSMContext):
     title = data['title']
     content = message.text if message.text else ''
     
-    note_id = db.add_note(message.from_user.id, title, content)
+    note_id = await adb.add_note(message.from_user.id, title, content)
     
     # 🔑 ВАЖНО: Проверяем наличие state перед очисткой
     if state is not None:
@@ -108,19 +123,11 @@ async def save_note(message: Message, state: FSMContext):
 # 🔑 НОВАЯ ФУНКЦИЯ: Безопасное отображение заметок через команду
 async def show_notes_simple(message: Message):
     """Показать заметки через обычное сообщение (не колбэк)"""
-    notes = db.get_notes(message.from_user.id, limit=20)
+    page = await adb.list_notes_page(message.from_user.id)
     
-    if not notes:
+    if not page['items']:
         text = "📭 У вас пока нет заметок.\n\nНажмите «✏️ Новая заметка» в меню, чтобы создать."
         await message.answer(text, reply_markup=get_back_button("notes_menu"))
         return
     
-    text = "📝 <b>Ваши заметки</b>:\n\n"
-    for i, note in enumerate(notes[:10], 1):
-        title = note['title'][:40] + "..." if len(note['title']) > 40 else note['title']
-        text += f"{i}. {title}\n"
-    
-    if len(notes) > 10:
-        text += f"\n...и ещё {len(notes) - 10} заметок"
-    
-    await message.answer(text, reply_markup=get_back_button("notes_menu"))
+    await message.answer(render_notes_page(page), reply_markup=notes_page_keyboard(page))
@@ -1,13 +1,33 @@
-from aiogram import Router, F
+from typing import Optional
+from aiogram import Router, F, Bot
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from datetime import datetime, timedelta
-from database import db
+from loguru import logger
+from database import db, adb, init_db
+from async_db import run_db
+from scheduler import ReminderScheduler, make_bot_delivery
 from keyboards import get_reminders_menu, get_back_button
 
 router = Router()
 
+# ⏰ Доставка напоминаний запускается вместе с диспетчером, в который подключён роутер
+reminder_scheduler: Optional[ReminderScheduler] = None
+
+@router.startup()
+async def start_reminder_scheduler(bot: Bot):
+    global reminder_scheduler
+    await run_db(init_db)
+    reminder_scheduler = ReminderScheduler(db, make_bot_delivery(bot))
+    reminder_scheduler.start()
+
+@router.shutdown()
+async def stop_reminder_scheduler():
+    if reminder_scheduler is not None:
+        await reminder_scheduler.stop()
+        logger.info(f"⏰ Планировщик напоминаний: {reminder_scheduler.stats()}")
+
 # FSM для напоминаний
 class ReminderStates(StatesGroup):
     waiting_for_text = State()
@@ -35,7 +55,7 @@ async def reminders_menu(callback: CallbackQuery):
 
 @router.callback_query(F.data == "reminders_list")
 async def show_reminders(callback: CallbackQuery):
-    reminders = db.get_active_reminders(callback.from_user.id)
+    reminders = await adb.get_active_reminders(callback.from_user.id)
     
     if not reminders:
         text = "📭 У вас пока нет активных напоминаний.\n\nНажмите «➕ Новое напоминание», чтобы создать."
@@ -132,7 +152,7 @@ async def save_reminder(message: Message, state: FSMContext):
         logger.warning(f"Ошибка парсинга времени '{time_input}': {e}. Используем завтра 9:00")
     
     # Сохраняем
-    reminder_id = db.add_reminder(message.from_user.id, text, remind_at)
+    reminder_id = await adb.add_reminder(message.from_user.id, text, remind_at)
     
     # Очищаем состояние
     if state is not None:
@@ -149,7 +169,7 @@ async def save_reminder(message: Message, state: FSMContext):
 # 🔑 НОВАЯ ФУНКЦИЯ: Безопасное отображение напоминаний через команду
 async def show_reminders_simple(message: Message):
     """Показать напоминания через обычное сообщение (не колбэк)"""
-    reminders = db.get_active_reminders(message.from_user.id)
+    reminders = await adb.get_active_reminders(message.from_user.id)
     
     if not reminders:
         text = "📭 У вас пока нет активных напоминаний.\n\nНапишите: <code>напомни завтра в 10 сделать что-то</code>"
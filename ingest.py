@@ -0,0 +1,136 @@
+"""
+Групповой коммит для сохранения заметок.
+
+Заметки от всех пользователей копятся в очереди и уходят в БД одним
+multi-row INSERT в одной транзакции — каждые max_delay секунд или по
+достижении max_batch строк, что наступит раньше. Каждый вызывающий
+получает id своей заметки. Если пачка не записалась, её строки пишутся
+по одной: ошибку получает только владелец плохой строки.
+"""
+import os
+import time
+import asyncio
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from async_db import run_db
+from metrics import percentile
+
+NOTE_BATCH_SIZE = int(os.getenv("NOTE_BATCH_SIZE", "100"))
+NOTE_BATCH_DELAY_MS = float(os.getenv("NOTE_BATCH_DELAY_MS", "10"))
+
+
+class NoteIngestQueue:
+    """Очередь заметок с пакетной записью"""
+
+    def __init__(self, flush_func: Callable[[List[Dict]], List[int]],
+                 max_batch: int = NOTE_BATCH_SIZE, max_delay: float = NOTE_BATCH_DELAY_MS / 1000,
+                 window: int = 1000):
+        self.flush_func = flush_func
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: "asyncio.Queue[Tuple[Dict, asyncio.Future, float]]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        # Метрики: последние размеры пачек и время их записи
+        self.batch_sizes: deque = deque(maxlen=window)
+        self.flush_latencies: deque = deque(maxlen=window)
+        self.wait_latencies: deque = deque(maxlen=window)
+        self.batches = 0
+        self.rows = 0
+        self.errors = 0       # пачки, не записавшиеся целиком
+        self.row_errors = 0   # строки, не записавшиеся и по одной
+
+    async def submit(self, user_id: int, content: str) -> int:
+        """Поставить заметку в очередь и дождаться её id"""
+        if self._task is None:
+            self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(({"user_id": user_id, "content": content}, future, time.monotonic()))
+        return await future
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="note-ingest")
+
+    async def close(self):
+        """Дописать всё из очереди и остановить воркер"""
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _collect(self) -> List[Tuple[Dict, asyncio.Future, float]]:
+        """Первая заметка ждётся без таймаута, остальные — до дедлайна пачки"""
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # Всё, что уже лежит в очереди, забираем без ожидания
+        while len(batch) < self.max_batch and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            started = time.monotonic()
+            try:
+                ids = await run_db(self.flush_func, [row for row, _, _ in batch])
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"❌ Не удалось сохранить пачку из {len(batch)} заметок: {e}")
+                await self._flush_one_by_one(batch)
+            else:
+                for (_, future, _), note_id in zip(batch, ids):
+                    if not future.done():
+                        future.set_result(note_id)
+            finally:
+                finished = time.monotonic()
+                self.batches += 1
+                self.rows += len(batch)
+                self.batch_sizes.append(len(batch))
+                self.flush_latencies.append(finished - started)
+                self.wait_latencies.extend(started - queued_at for _, _, queued_at in batch)
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _flush_one_by_one(self, batch: List[Tuple[Dict, asyncio.Future, float]]):
+        """Пачка упала: каждую строку — отдельной транзакцией, чтобы чужая ошибка не досталась соседям"""
+        for row, future, _ in batch:
+            try:
+                note_id, = await run_db(self.flush_func, [row])
+            except Exception as e:
+                self.row_errors += 1
+                logger.error(f"❌ Не удалось сохранить заметку пользователя {row['user_id']}: {e}")
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(note_id)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "errors": self.errors,
+            "row_errors": self.row_errors,
+            "queued": self._queue.qsize(),
+            "avg_batch": self.rows / self.batches if self.batches else 0.0,
+            "max_batch": max(self.batch_sizes, default=0),
+            "flush_p50_ms": percentile(self.flush_latencies, 50) * 1000,
+            "flush_p99_ms": percentile(self.flush_latencies, 99) * 1000,
+            "wait_p99_ms": percentile(self.wait_latencies, 99) * 1000,
+        }
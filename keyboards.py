@@ -1,4 +1,6 @@
-from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
+from typing import Dict, List, Optional
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 
 def get_main_keyboard() -> ReplyKeyboardMarkup:
     """
@@ -29,3 +31,153 @@ def get_search_keyboard() -> ReplyKeyboardMarkup:
         one_time_keyboard=False,
         input_field_placeholder="Введите слово для поиска..."
     )
+
+# ==================== ПАГИНАЦИЯ ПОИСКА ====================
+
+class SearchPageCallback(CallbackData, prefix="sp"):
+    """Листание результатов поиска: токен запроса + keyset-курсор"""
+    token: str
+    cursor: str
+    back: bool = False
+
+def get_search_pagination_keyboard(token: str, prev_cursor: Optional[str],
+                                   next_cursor: Optional[str]) -> Optional[InlineKeyboardMarkup]:
+    """
+    Кнопки «назад / дальше» под страницей результатов.
+    None, если листать некуда.
+    """
+    buttons = []
+    if prev_cursor:
+        buttons.append(InlineKeyboardButton(
+            text="⬅️ Новее",
+            callback_data=SearchPageCallback(token=token, cursor=prev_cursor, back=True).pack()
+        ))
+    if next_cursor:
+        buttons.append(InlineKeyboardButton(
+            text="Старее ➡️",
+            callback_data=SearchPageCallback(token=token, cursor=next_cursor).pack()
+        ))
+    if not buttons:
+        return None
+    return InlineKeyboardMarkup(inline_keyboard=[buttons])
+
+# ==================== ПАГИНАЦИЯ СПИСКОВ ====================
+
+class ListPageCallback(CallbackData, prefix="lp"):
+    """Листание списков заметок и закладок: что листаем + keyset-курсор"""
+    kind: str  # notes | bookmarks
+    cursor: str
+    back: bool = False
+
+def get_list_pagination_keyboard(kind: str, prev_cursor: Optional[str], next_cursor: Optional[str],
+                                 back_to: str) -> InlineKeyboardMarkup:
+    """
+    Кнопки «назад / дальше» под страницей списка и возврат в меню раздела.
+    """
+    buttons = []
+    if prev_cursor:
+        buttons.append(InlineKeyboardButton(
+            text="⬅️ Новее",
+            callback_data=ListPageCallback(kind=kind, cursor=prev_cursor, back=True).pack()
+        ))
+    if next_cursor:
+        buttons.append(InlineKeyboardButton(
+            text="Старее ➡️",
+            callback_data=ListPageCallback(kind=kind, cursor=next_cursor).pack()
+        ))
+    rows = [buttons] if buttons else []
+    rows.append([InlineKeyboardButton(text="🔙 Назад", callback_data=back_to)])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+# ==================== ТЕГИ ЗАКЛАДОК ====================
+
+class TagPageCallback(CallbackData, prefix="tp"):
+    """Закладки по тегам: id тега или токен фильтра из нескольких (handlers.bookmarks) + keyset-курсор"""
+    tags: str
+    cursor: str = ""
+    back: bool = False
+
+def get_tags_keyboard(tags: List[Dict], limit: int = 30) -> InlineKeyboardMarkup:
+    """Теги с числом закладок, по три в ряд; нажатие — закладки с этим тегом"""
+    buttons = [
+        InlineKeyboardButton(text=f"#{tag['tag']} · {tag['count']}",
+                             callback_data=TagPageCallback(tags=str(tag['id'])).pack())
+        for tag in tags[:limit]
+    ]
+    rows = [buttons[i:i + 3] for i in range(0, len(buttons), 3)]
+    rows.append([InlineKeyboardButton(text="🔙 Назад", callback_data="bookmarks_menu")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+def get_tag_pagination_keyboard(tags: str, prev_cursor: Optional[str],
+                                next_cursor: Optional[str]) -> InlineKeyboardMarkup:
+    """Листание закладок по тегам и возврат к списку тегов"""
+    buttons = []
+    if prev_cursor:
+        buttons.append(InlineKeyboardButton(
+            text="⬅️ Новее",
+            callback_data=TagPageCallback(tags=tags, cursor=prev_cursor, back=True).pack()
+        ))
+    if next_cursor:
+        buttons.append(InlineKeyboardButton(
+            text="Старее ➡️",
+            callback_data=TagPageCallback(tags=tags, cursor=next_cursor).pack()
+        ))
+    rows = [buttons] if buttons else []
+    rows.append([InlineKeyboardButton(text="🏷️ Все теги", callback_data="bookmarks_tags")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+def get_bookmark_tags_prompt_keyboard() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="➡️ Без тегов", callback_data="bookmarks_tags_skip")],
+        [InlineKeyboardButton(text="🔙 Назад", callback_data="bookmarks_menu")]
+    ])
+
+# ==================== МЕНЮ РАЗДЕЛОВ ====================
+
+def _inline_menu(*rows) -> InlineKeyboardMarkup:
+    """Инлайн-меню из рядов (текст, callback_data)"""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=text, callback_data=data) for text, data in row] for row in rows
+    ])
+
+def get_main_menu() -> InlineKeyboardMarkup:
+    """Главное меню разделов (/menu)"""
+    return _inline_menu(
+        [("📝 Заметки", "notes_menu"), ("📌 Закладки", "bookmarks_menu")],
+        [("✅ Напоминания", "reminders_menu"), ("⚙️ Настройки", "settings_menu")]
+    )
+
+def get_back_button(back_to: str = "main_menu") -> InlineKeyboardMarkup:
+    """Одна кнопка возврата в меню back_to"""
+    return _inline_menu([("🔙 Назад", back_to)])
+
+def get_notes_menu() -> InlineKeyboardMarkup:
+    return _inline_menu(
+        [("➕ Новая заметка", "notes_add"), ("📋 Мои заметки", "notes_list")],
+        [("🔙 Назад", "main_menu")]
+    )
+
+def get_bookmarks_menu() -> InlineKeyboardMarkup:
+    return _inline_menu(
+        [("➕ Сохранить", "bookmarks_add"), ("📋 Мои закладки", "bookmarks_list")],
+        [("🏷️ Теги", "bookmarks_tags"), ("🗑️ Очистить все", "bookmarks_clear")],
+        [("🔙 Назад", "main_menu")]
+    )
+
+def get_reminders_menu() -> InlineKeyboardMarkup:
+    return _inline_menu(
+        [("➕ Новое напоминание", "reminders_add"), ("📋 Активные", "reminders_list")],
+        [("🔙 Назад", "main_menu")]
+    )
+
+def get_settings_menu() -> InlineKeyboardMarkup:
+    return _inline_menu(
+        [("🌐 Язык", "settings_language"), ("ℹ️ О боте", "settings_about")],
+        [("🔙 Назад", "main_menu")]
+    )
+
+def get_language_menu() -> InlineKeyboardMarkup:
+    return _inline_menu(
+        [("🇷🇺 Русский", "lang_ru"), ("🇺🇸 English", "lang_en"), ("🇨🇳 中文", "lang_zh")],
+        [("🔙 Назад", "settings_menu")]
+    )
@@ -0,0 +1,201 @@
+"""
+Дорожки обработки апдейтов: по порядку для одного пользователя, параллельно для разных.
+
+Апдейты обрабатываются конкурентно (polling — задачей на апдейт, webhook — в
+фоне), поэтому два быстрых сообщения одного пользователя могли обогнать друг
+друга, а переходы FSM — перемешаться. UpdateLanes — внешний middleware
+диспетчера: апдейт встаёт в дорожку user_id % lanes, у каждой дорожки один
+воркер, он выполняет остальную цепочку (FSM, подписка, роутеры, хендлер)
+строго по очереди. Разные дорожки работают параллельно.
+
+Дорожка назначается до первого await в цепочке: регистрировать через
+register_before_fsm — перед FSM-middleware aiogram, который уже на входе
+читает состояние из хранилища. Иначе два апдейта могли войти в дорожку не в
+том порядке, в каком пришли, а состояние читалось бы до предыдущего апдейта.
+
+Очередь дорожки ограничена: если дорожка полна, ждёт места только апдейт,
+который в неё встаёт, — остальные дорожки продолжают работать. Бот
+перестаёт забирать новые апдейты, только когда в обработке их слишком много
+всего (max_in_flight): poll_gate придерживает getUpdates, webhook отвечает
+Telegram только когда место появится (wait_for_room).
+Порядок постановки в дорожку — порядок прихода апдейтов, в том числе когда
+очередь полна: вход в дорожку — через справедливый (FIFO) asyncio.Lock.
+"""
+import os
+import time
+import asyncio
+import contextvars
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.fsm.middleware import FSMContextMiddleware
+from aiogram.methods import GetUpdates
+from aiogram.types import Chat, TelegramObject, Update, User
+from loguru import logger
+
+from metrics import REGISTRY, Registry, percentile
+
+UPDATE_LANES = int(os.getenv("UPDATE_LANES", "128"))
+UPDATE_LANE_QUEUE_SIZE = int(os.getenv("UPDATE_LANE_QUEUE_SIZE", "64"))
+UPDATE_MAX_IN_FLIGHT = int(os.getenv("UPDATE_MAX_IN_FLIGHT", "1024"))
+
+# Задание дорожки: остаток цепочки middleware, апдейт, данные, контекст, результат, время постановки
+Job = Tuple[Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]], TelegramObject, Dict[str, Any],
+            contextvars.Context, asyncio.Future, float]
+
+
+def register_before_fsm(dp: Dispatcher, middleware: Callable) -> Callable:
+    """Внешний middleware апдейта — перед FSM-middleware диспетчера (после UserContextMiddleware).
+
+    У MiddlewareManager есть только register (в конец), поэтому вставляем в его список.
+    Повторные вызовы сохраняют порядок регистрации.
+    """
+    manager = dp.update.outer_middleware
+    position = next(
+        index for index, registered in enumerate(manager) if isinstance(registered, FSMContextMiddleware)
+    )
+    manager._middlewares.insert(position, middleware)
+    return middleware
+
+
+class _Lane:
+    __slots__ = ("queue", "entry", "worker", "processed", "backpressure")
+
+    def __init__(self, queue_size: int):
+        self.queue: "asyncio.Queue[Job]" = asyncio.Queue(maxsize=queue_size)
+        self.entry = asyncio.Lock()  # FIFO: пока один ждёт места, следующие ждут за ним
+        self.worker: Optional[asyncio.Task] = None
+        self.processed = 0
+        self.backpressure = 0
+
+
+class UpdateLanes(BaseMiddleware):
+    """Шардированная обработка апдейтов по user_id (регистрировать через register_before_fsm)"""
+
+    def __init__(self, lanes: int = UPDATE_LANES, queue_size: int = UPDATE_LANE_QUEUE_SIZE,
+                 max_in_flight: int = UPDATE_MAX_IN_FLIGHT, registry: Registry = REGISTRY, window: int = 1000):
+        self.queue_size = queue_size
+        self.max_in_flight = max(1, max_in_flight)
+        self._lanes: List[_Lane] = [_Lane(queue_size) for _ in range(max(1, lanes))]
+        # Апдейтов в обработке (в очередях, ждут места, выполняются); на max_in_flight _room сброшен
+        self.in_flight = 0
+        self._room = asyncio.Event()
+        self._room.set()
+        self.wait = registry.histogram("jarvis_lane_wait_seconds", "Ожидание апдейта в очереди дорожки")
+        self.wait_latencies: deque = deque(maxlen=window)
+        registry.gauge("jarvis_lane_depth", "Апдейтов в очереди дорожки", self.depths, ("lane",))
+        registry.gauge("jarvis_lane_depth_max", "Самая длинная очередь дорожки",
+                       lambda: max(lane.queue.qsize() for lane in self._lanes))
+        registry.gauge("jarvis_lane_backpressure_total", "Апдейтов, ждавших места в полной дорожке",
+                       lambda: sum(lane.backpressure for lane in self._lanes))
+        registry.gauge("jarvis_lanes_in_flight", "Апдейтов в обработке во всех дорожках", lambda: self.in_flight)
+
+    @staticmethod
+    def lane_key(update: TelegramObject, data: Dict[str, Any]) -> int:
+        """Ключ дорожки: пользователь, иначе чат, иначе сам апдейт"""
+        user: Optional[User] = data.get("event_from_user")
+        if user is not None:
+            return user.id
+        chat: Optional[Chat] = data.get("event_chat")
+        if chat is not None:
+            return chat.id
+        return update.update_id if isinstance(update, Update) else 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        index = self.lane_key(event, data) % len(self._lanes)
+        lane = self._lanes[index]
+        if lane.worker is None:
+            self._start_worker(lane)
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight += 1
+        if self.in_flight >= self.max_in_flight:
+            self._room.clear()
+        try:
+            async with lane.entry:
+                if lane.queue.full():
+                    # Ждёт только этот апдейт (и следующие в ту же дорожку), остальные дорожки работают
+                    lane.backpressure += 1
+                    logger.debug(f"⏳ Дорожка {index} полна ({self.queue_size}): апдейт ждёт места")
+                # Контекст апдейта (metrics.current_update и т.п.) — с собой: воркер его не наследует
+                await lane.queue.put((handler, event, data, contextvars.copy_context(), future, time.monotonic()))
+            # Результат хендлера возвращается как раньше: внешние middleware (метрики) видят полное время
+            return await future
+        finally:
+            self.in_flight -= 1
+            if self.in_flight < self.max_in_flight:
+                self._room.set()
+
+    def _start_worker(self, lane: _Lane):
+        index = self._lanes.index(lane)
+        lane.worker = asyncio.create_task(self._run(lane), name=f"update-lane-{index}")
+
+    def start(self):
+        for lane in self._lanes:
+            if lane.worker is None:
+                self._start_worker(lane)
+
+    async def _run(self, lane: _Lane):
+        loop = asyncio.get_running_loop()
+        while True:
+            handler, event, data, context, future, queued_at = await lane.queue.get()
+            waited = time.monotonic() - queued_at
+            self.wait.observe(waited)
+            self.wait_latencies.append(waited)
+            try:
+                # FSM-middleware — дальше по цепочке: состояние читается уже в очереди пользователя.
+                # Цепочка выполняется в контексте того, кто поставил апдейт в дорожку
+                result = await loop.create_task(handler(event, data), context=context)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                lane.processed += 1
+                lane.queue.task_done()
+
+    async def wait_for_room(self):
+        """Дождаться, пока апдейтов в обработке меньше max_in_flight (backpressure для webhook)"""
+        await self._room.wait()
+
+    async def poll_gate(self, make_request, bot: Bot, method):
+        """Request-middleware сессии: не забирать новые апдейты, пока их в обработке max_in_flight"""
+        if isinstance(method, GetUpdates) and not self._room.is_set():
+            logger.debug(f"⏸️ getUpdates придержан: в обработке {self.in_flight} апдейтов")
+            await self._room.wait()
+        return await make_request(bot, method)
+
+    async def close(self):
+        """Доработать всё, что уже в очередях, и остановить воркеры"""
+        for lane in self._lanes:
+            if lane.worker is None:
+                continue
+            await lane.queue.join()
+            lane.worker.cancel()
+            try:
+                await lane.worker
+            except asyncio.CancelledError:
+                pass
+            lane.worker = None
+
+    def depths(self) -> Dict[Tuple[str], int]:
+        return {(str(index),): lane.queue.qsize() for index, lane in enumerate(self._lanes)}
+
+    def stats(self) -> Dict[str, float]:
+        depths = [lane.queue.qsize() for lane in self._lanes]
+        return {
+            "lanes": len(self._lanes),
+            "processed": sum(lane.processed for lane in self._lanes),
+            "queued": sum(depths),
+            "in_flight": self.in_flight,
+            "max_depth": max(depths),
+            "backpressure": sum(lane.backpressure for lane in self._lanes),
+            "wait_p99_ms": percentile(self.wait_latencies, 99) * 1000,
+        }
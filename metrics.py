@@ -0,0 +1,318 @@
+"""
+Общие помощники для метрик бота.
+
+Кроме перцентилей и таймера запуска — небольшой реестр метрик в текстовом
+формате Prometheus (0.0.4) и локальный HTTP-эндпоинт /metrics. prometheus_client
+не тянем: нужны только счётчики, гистограммы и gauge-колбэки.
+
+Режимы (METRICS_MODE):
+• off   — ничего не меряем, middleware просто пропускают апдейт
+• light — для постоянной работы в проде: латентность хендлеров, апдейтов и
+          вызовы Telegram API меряются всегда, запросы к БД — у каждого
+          METRICS_SAMPLE_EVERY-го апдейта
+• full  — БД меряется у каждого апдейта, плюс гистограмма времени каждого
+          запроса по типу (SELECT / INSERT / ...), в том числе вне апдейтов
+"""
+import os
+import time
+import bisect
+import threading
+import contextvars
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from aiohttp import web
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+METRICS_MODE = os.getenv("METRICS_MODE", "light")  # off | light | full
+METRICS_SAMPLE_EVERY = max(1, int(os.getenv("METRICS_SAMPLE_EVERY", "10")))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))  # 0 — не поднимать эндпоинт
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def percentile(samples: Iterable[float], q: float) -> float:
+    """Перцентиль q (0–100) по выборке; 0.0 для пустой выборки"""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+class StartupTimer:
+    """Отметки этапов запуска (секунды от started) для отчёта в лог"""
+
+    def __init__(self, started: Optional[float] = None):
+        self.started = started if started is not None else time.monotonic()
+        self.marks: Dict[str, float] = {}
+
+    def mark(self, stage: str) -> float:
+        """Запомнить первое наступление этапа; повторные отметки игнорируются"""
+        return self.marks.setdefault(stage, time.monotonic() - self.started)
+
+    def report(self) -> str:
+        return " → ".join(f"{stage} {seconds:.2f}s" for stage, seconds in self.marks.items())
+
+
+# ==================== РЕЕСТР PROMETHEUS ====================
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Монотонный счётчик с метками"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}_total{_format_labels(self.labels, key)} {_format_value(value)}"
+                for key, value in items]
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами: observe — bisect и три сложения"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, list] = {}  # метки -> [счётчики корзин..., +Inf, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, hits in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += hits
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class GaugeCallback:
+    """Gauge, значение которого читается колбэком в момент выгрузки"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str,
+                 read: Callable[[], Union[float, Dict[LabelValues, float]]], labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.read = read
+
+    def samples(self) -> List[str]:
+        try:
+            value = self.read()
+        except Exception as e:
+            logger.warning(f"⚠️ Метрика {self.name}: {e}")
+            return []
+        items = value.items() if isinstance(value, dict) else [((), value)]
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(item)}" for key, item in items]
+
+
+class Registry:
+    """Набор метрик процесса и их выгрузка в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Union[Counter, Histogram, GaugeCallback]] = {}
+
+    def _add(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, documentation, labels, buckets))
+
+    def gauge(self, name: str, documentation: str, read: Callable, labels: Sequence[str] = ()) -> GaugeCallback:
+        """Gauge-колбэк; повторная регистрация заменяет колбэк (например, после перезапуска компонента)"""
+        metric = GaugeCallback(name, documentation, read, labels)
+        self._metrics[name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+# ==================== МЕТРИКИ АПДЕЙТА И БД ====================
+
+class UpdateStats:
+    """Счётчики одного апдейта; живут в contextvar и видны в потоках run_db"""
+
+    __slots__ = ("sampled", "db_statements", "db_seconds", "api_calls")
+
+    def __init__(self, sampled: bool):
+        self.sampled = sampled
+        self.db_statements = 0
+        self.db_seconds = 0.0
+        self.api_calls = 0
+
+
+current_update: contextvars.ContextVar[Optional[UpdateStats]] = contextvars.ContextVar(
+    "current_update", default=None
+)
+
+DB_STATEMENTS = REGISTRY.counter(
+    "jarvis_db_statements", "SQL-запросы по типу (только METRICS_MODE=full)", ("operation",)
+)
+DB_STATEMENT_SECONDS = REGISTRY.histogram(
+    "jarvis_db_statement_duration_seconds", "Время SQL-запроса по типу (только METRICS_MODE=full)", ("operation",)
+)
+
+_db_instrumented = False
+
+
+def _operation(statement: str) -> str:
+    """SELECT / INSERT / UPDATE / ... — первое слово запроса (метка с ограниченной кардинальностью)"""
+    head = statement.lstrip()[:16].split(None, 1)
+    word = head[0].upper() if head else ""
+    return word if word.isalpha() else "OTHER"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Начало — на контексте выполнения, а не на соединении: у упавшего запроса
+    # after_cursor_execute не будет, и его время не должно достаться следующему
+    if context is None:
+        return
+    stats = current_update.get()
+    if (stats is not None and stats.sampled) or METRICS_MODE == "full":
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    stats = current_update.get()
+    if stats is not None:
+        stats.db_statements += 1
+        stats.db_seconds += elapsed
+    if METRICS_MODE == "full":
+        operation = _operation(statement)
+        DB_STATEMENTS.inc(operation)
+        DB_STATEMENT_SECONDS.observe(elapsed, operation)
+
+
+def instrument_db():
+    """Подписаться на cursor-события всех движков процесса (один раз; в режиме off — никогда)"""
+    global _db_instrumented
+    if _db_instrumented or METRICS_MODE == "off":
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    _db_instrumented = True
+
+
+# ==================== ЭНДПОИНТ /metrics ====================
+
+class MetricsServer:
+    """Локальный aiohttp-сервер, отдающий REGISTRY на GET /metrics"""
+
+    def __init__(self, registry: Registry = REGISTRY, host: str = METRICS_HOST, port: int = METRICS_PORT):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        return web.Response(
+            text=self.registry.render(),
+            content_type="text/plain",
+            headers={"X-Content-Type-Options": "nosniff"},
+            charset="utf-8",
+        )
+
+    async def start(self):
+        if self._runner is not None or not self.port or METRICS_MODE == "off":
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        try:
+            await web.TCPSite(self._runner, self.host, self.port).start()
+        except OSError as e:
+            # Занятый порт не должен мешать боту работать
+            logger.warning(f"⚠️ /metrics не поднят на {self.host}:{self.port}: {e}")
+            await self.stop()
+            return
+        logger.info(f"📈 Метрики: http://{self.host}:{self.port}/metrics (режим {METRICS_MODE})")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,11 @@
+from middlewares.subscription import SubscriptionMiddleware, SubscriptionCache
+from middlewares.metrics import UpdateMetricsMiddleware, HandlerMetricsMiddleware, ApiMetricsMiddleware
+from middlewares.query_audit import QueryAuditMiddleware
+from middlewares.media_group import MediaGroupMiddleware, message_media, album_captions
+
+__all__ = [
+    "SubscriptionMiddleware", "SubscriptionCache",
+    "UpdateMetricsMiddleware", "HandlerMetricsMiddleware", "ApiMetricsMiddleware",
+    "QueryAuditMiddleware",
+    "MediaGroupMiddleware", "message_media", "album_captions",
+]
@@ -0,0 +1,118 @@
+"""
+Альбомы (media group) — одним апдейтом.
+
+Альбом из N фото Telegram присылает N отдельными апдейтами с общим
+media_group_id. Два шага, оба — внешние middleware апдейта:
+• сам MediaGroupMiddleware (до дорожек lanes.UpdateLanes) ничего не ждёт:
+  первую часть пропускает дальше, остальные поглощает и дописывает к ней;
+• complete (после дорожек, уже в очереди пользователя) держит первую часть,
+  пока части приходят (окно тишины window секунд или все 10 частей), и
+  отдаёт дальше — проверка подписки, хендлер — data["album"]: все сообщения
+  по порядку. Хендлеру достаточно объявить параметр album.
+Ждать в дорожке, а собирать до неё — иначе остальные части альбома стояли бы
+в той же дорожке за первой и не дошли бы до неё никогда.
+"""
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import Message, TelegramObject, Update
+
+MEDIA_GROUP_WINDOW_MS = float(os.getenv("MEDIA_GROUP_WINDOW_MS", "500"))
+MEDIA_GROUP_MAX_SIZE = 10  # больше частей в альбоме Telegram не бывает
+
+# Вид вложения → атрибут сообщения (у фото — список размеров, берём самый большой)
+MEDIA_KINDS = ("photo", "video", "document", "audio", "animation")
+
+
+def message_media(message: Message) -> Optional[Dict[str, str]]:
+    """Вложение сообщения: {'type', 'file_id', 'file_unique_id'} или None"""
+    for kind in MEDIA_KINDS:
+        media = getattr(message, kind)
+        if media:
+            if kind == "photo":
+                media = media[-1]
+            return {'type': kind, 'file_id': media.file_id, 'file_unique_id': media.file_unique_id}
+    return None
+
+
+def album_captions(album: List[Message]) -> str:
+    """Подписи частей альбома без повторов (обычно подписана только первая)"""
+    captions = dict.fromkeys(message.caption for message in album if message.caption)
+    return "\n".join(captions)
+
+
+class _PendingAlbum:
+    __slots__ = ("key", "messages", "arrived")
+
+    def __init__(self, key: Tuple[int, str], message: Message):
+        self.key = key
+        self.messages = [message]
+        self.arrived = asyncio.Event()
+
+
+class MediaGroupMiddleware(BaseMiddleware):
+    """Склеивает апдейты одного альбома в один (сбор — до дорожек, ожидание — complete после них)"""
+
+    def __init__(self, window: float = MEDIA_GROUP_WINDOW_MS / 1000, max_size: int = MEDIA_GROUP_MAX_SIZE):
+        self.window = window
+        self.max_size = max_size
+        self._pending: Dict[Tuple[int, str], _PendingAlbum] = {}
+        self.albums = 0
+        self.coalesced = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        message = event.message if isinstance(event, Update) else event
+        if not isinstance(message, Message) or message.media_group_id is None:
+            return await handler(event, data)
+
+        key = (message.chat.id, message.media_group_id)
+        album = self._pending.get(key)
+        if album is not None:
+            # Часть уже ожидающего альбома: отдаём её первому апдейту и на этом заканчиваем
+            album.messages.append(message)
+            album.arrived.set()
+            self.coalesced += 1
+            return None
+
+        album = self._pending[key] = _PendingAlbum(key, message)
+        data["media_group"] = album
+        try:
+            return await handler(event, data)
+        finally:
+            # Если complete не дошёл до альбома (например, апдейт не прошёл фильтры) — не копим
+            self._pending.pop(key, None)
+
+    async def complete(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        """Дождаться остальных частей альбома и передать их дальше как data["album"]"""
+        album: Optional[_PendingAlbum] = data.pop("media_group", None)
+        if album is None:
+            return await handler(event, data)
+
+        try:
+            while len(album.messages) < self.max_size:
+                try:
+                    await asyncio.wait_for(album.arrived.wait(), self.window)
+                except asyncio.TimeoutError:
+                    break
+                album.arrived.clear()
+        finally:
+            self._pending.pop(album.key, None)
+
+        self.albums += 1
+        data["album"] = sorted(album.messages, key=lambda part: part.message_id)
+        return await handler(event, data)
+
+    def stats(self) -> Dict[str, int]:
+        return {"albums": self.albums, "coalesced": self.coalesced, "pending": len(self._pending)}
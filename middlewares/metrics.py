@@ -0,0 +1,154 @@
+"""
+Метрики обработки апдейтов.
+
+• UpdateMetricsMiddleware — внешний (outer) middleware апдейта: полное время
+  апдейта, число и время SQL-запросов за апдейт, число вызовов Telegram API
+• HandlerMetricsMiddleware — внутренний middleware message / callback_query:
+  гистограмма латентности по роутеру, хендлеру и префиксу callback data
+• ApiMetricsMiddleware — middleware сессии бота: вызовы Telegram API по методу
+
+Счётчики апдейта лежат в contextvar (metrics.current_update), поэтому их видят
+и потоки run_db, и запросы к API из хендлера.
+"""
+import itertools
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import CallbackQuery, TelegramObject, Update
+
+from metrics import (
+    METRICS_MODE, METRICS_SAMPLE_EVERY, COUNT_BUCKETS, REGISTRY, Registry, UpdateStats, current_update
+)
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Время апдейта и его «стоимость»: SQL-запросы и вызовы API (регистрировать первым)"""
+
+    def __init__(self, registry: Registry = REGISTRY, sample_every: int = METRICS_SAMPLE_EVERY):
+        self.sample_every = 1 if METRICS_MODE == "full" else sample_every
+        self._sequence = itertools.count()
+        self.duration = registry.histogram(
+            "jarvis_update_duration_seconds", "Полное время обработки апдейта", ("event",)
+        )
+        self.db_statements = registry.histogram(
+            "jarvis_update_db_statements", "SQL-запросов за апдейт (по выборке апдейтов)", ("event",),
+            buckets=COUNT_BUCKETS,
+        )
+        self.db_seconds = registry.histogram(
+            "jarvis_update_db_seconds", "Суммарное время SQL за апдейт (по выборке апдейтов)", ("event",)
+        )
+        self.api_calls = registry.histogram(
+            "jarvis_update_api_calls", "Вызовов Telegram API за апдейт", ("event",), buckets=COUNT_BUCKETS
+        )
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if METRICS_MODE == "off":
+            return await handler(event, data)
+
+        stats = UpdateStats(sampled=next(self._sequence) % self.sample_every == 0)
+        token = current_update.set(stats)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_update.reset(token)
+            kind = event.event_type if isinstance(event, Update) else type(event).__name__
+            self.duration.observe(elapsed, kind)
+            self.api_calls.observe(stats.api_calls, kind)
+            if stats.sampled:
+                self.db_statements.observe(stats.db_statements, kind)
+                self.db_seconds.observe(stats.db_seconds, kind)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Латентность конкретного хендлера: метки router / handler / callback"""
+
+    def __init__(self, registry: Registry = REGISTRY):
+        self.duration = registry.histogram(
+            "jarvis_handler_duration_seconds", "Время хендлера",
+            ("router", "handler", "callback"),
+        )
+        self.errors = registry.counter(
+            "jarvis_handler_errors", "Исключения в хендлерах", ("router", "handler", "callback")
+        )
+        self._labels: Dict[Any, tuple] = {}
+
+    def _handler_labels(self, data: Dict[str, Any]) -> tuple:
+        """(router, handler) — кэшируются по функции, строки собираются один раз"""
+        handler_object = data.get("handler")
+        callback = getattr(handler_object, "callback", None)
+        labels = self._labels.get(callback)
+        if labels is None:
+            module = getattr(callback, "__module__", "?")
+            name = f"{module}.{getattr(callback, '__qualname__', '?')}"
+            router = data.get("event_router")
+            router_name = getattr(router, "name", "")
+            # Роутеры без имени получают hex(id(...)) — для метки бесполезно, берём модуль хендлера
+            if not router_name or router_name.startswith("0x"):
+                router_name = module
+            labels = self._labels[callback] = (router_name, name)
+        return labels
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if METRICS_MODE == "off":
+            return await handler(event, data)
+
+        router_name, handler_name = self._handler_labels(data)
+        # Префикс callback data (до ":") — это тип кнопки; сам payload в метку не идёт
+        callback = "-"
+        if isinstance(event, CallbackQuery) and event.data:
+            callback = event.data.split(":", 1)[0]
+        labels = (router_name, handler_name, callback)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            self.errors.inc(*labels)
+            raise
+        finally:
+            self.duration.observe(time.perf_counter() - started, *labels)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """
+    Вызовы Telegram API по методу и результату. Регистрировать до outbox:
+    первый middleware сессии — внешний, он ещё выполняется в контексте апдейта.
+    """
+
+    def __init__(self, registry: Registry = REGISTRY):
+        self.calls = registry.counter("jarvis_telegram_api_calls", "Вызовы Telegram API", ("method", "result"))
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ):
+        if METRICS_MODE == "off":
+            return await make_request(bot, method)
+
+        stats = current_update.get()
+        if stats is not None:
+            stats.api_calls += 1
+        try:
+            result = await make_request(bot, method)
+        except Exception:
+            self.calls.inc(method.__api_method__, "error")
+            raise
+        self.calls.inc(method.__api_method__, "ok")
+        return result
@@ -0,0 +1,29 @@
+"""
+Область аудита запросов на каждый хендлер.
+
+Внутренний middleware message / callback_query: всё, что хендлер выполнил
+в БД (в том числе через run_db), считается одной областью QueryAuditor —
+повторы одного отпечатка сверх порога помечаются как N+1 с именем хендлера.
+"""
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from query_audit import QueryAuditor, auditor as default_auditor
+
+
+class QueryAuditMiddleware(BaseMiddleware):
+    def __init__(self, auditor: QueryAuditor = default_auditor):
+        self.auditor = auditor
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        callback = getattr(data.get("handler"), "callback", None)
+        name = f"{getattr(callback, '__module__', '?')}.{getattr(callback, '__qualname__', '?')}"
+        with self.auditor.scope(name):
+            return await handler(event, data)
@@ -0,0 +1,165 @@
+"""
+Проверка подписки на канал — один раз на апдейт.
+
+Внешний (outer) middleware диспетчера: результат get_chat_member кэшируется
+в ограниченном LRU-кэше с раздельным TTL для «подписан» / «не подписан»,
+а одновременные проверки одного пользователя схлопываются в один запрос к API.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.enums import ChatMemberStatus
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.types import CallbackQuery, Message, TelegramObject, Update, User
+from loguru import logger
+
+SUBSCRIBED_STATUSES = (
+    ChatMemberStatus.MEMBER,
+    ChatMemberStatus.ADMINISTRATOR,
+    ChatMemberStatus.CREATOR,
+)
+
+
+class SubscriptionCache:
+    """Ограниченный LRU-кэш статусов подписки с раздельными TTL"""
+
+    def __init__(self, maxsize: int = 10_000, positive_ttl: float = 600.0, negative_ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self._items: "OrderedDict[int, tuple]" = OrderedDict()  # user_id -> (subscribed, expires_at)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id: int) -> Optional[bool]:
+        """Вернуть статус из кэша или None, если записи нет / она протухла"""
+        item = self._items.get(user_id)
+        if item is None:
+            self.misses += 1
+            return None
+        subscribed, expires_at = item
+        if expires_at <= time.monotonic():
+            del self._items[user_id]
+            self.misses += 1
+            return None
+        self._items.move_to_end(user_id)
+        self.hits += 1
+        return subscribed
+
+    def set(self, user_id: int, subscribed: bool):
+        """Запомнить статус (TTL зависит от результата)"""
+        ttl = self.positive_ttl if subscribed else self.negative_ttl
+        self._items[user_id] = (subscribed, time.monotonic() + ttl)
+        self._items.move_to_end(user_id)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, user_id: int):
+        self._items.pop(user_id, None)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class SubscriptionMiddleware(BaseMiddleware):
+    """Пропускает апдейт к хендлерам только подписчикам канала"""
+
+    def __init__(self, channel: str, cache: Optional[SubscriptionCache] = None):
+        self.channel = channel
+        # Не `cache or ...`: пустой кэш (len == 0) ложен и подменился бы кэшем по умолчанию
+        self.cache = cache if cache is not None else SubscriptionCache()
+        self._inflight: Dict[int, asyncio.Future] = {}
+        self.api_calls = 0
+        self.coalesced = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user: Optional[User] = data.get("event_from_user")
+        if user is None or user.is_bot:
+            return await handler(event, data)
+
+        if await self.is_subscribed(data["bot"], user.id):
+            return await handler(event, data)
+
+        await self._deny(event)
+        return None
+
+    async def is_subscribed(self, bot: Bot, user_id: int) -> bool:
+        """Статус подписки: кэш → уже летящий запрос → один запрос к API"""
+        cached = self.cache.get(user_id)
+        if cached is not None:
+            return cached
+
+        future = self._inflight.get(user_id)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[user_id] = future
+        try:
+            subscribed, cacheable = await self._fetch(bot, user_id)
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            self._inflight.pop(user_id, None)
+
+        if cacheable:
+            self.cache.set(user_id, subscribed)
+        future.set_result(subscribed)
+        return subscribed
+
+    async def _fetch(self, bot: Bot, user_id: int) -> tuple:
+        """Запрос к Telegram. Возвращает (подписан, можно_ли_кэшировать)"""
+        self.api_calls += 1
+        try:
+            member = await bot.get_chat_member(self.channel, user_id)
+            return member.status in SUBSCRIBED_STATUSES, True
+        except (TelegramBadRequest, TelegramForbiddenError):
+            # Бот не админ канала / канал недоступен — не блокируем пользователей
+            return True, True
+        except Exception as e:
+            # Сетевые сбои не кэшируем, чтобы не запирать пользователя на negative TTL
+            logger.warning(f"⚠️ Не удалось проверить подписку {user_id}: {e}")
+            return False, False
+
+    async def _deny(self, event: TelegramObject):
+        """Ответить неподписанному пользователю"""
+        if isinstance(event, Update):
+            event = event.event
+        channel_link = f"https://t.me/{self.channel.lstrip('@')}"
+
+        if isinstance(event, CallbackQuery):
+            await event.answer(
+                f"🔒 Для доступа к функциям бота подпишитесь на канал {self.channel}",
+                show_alert=True
+            )
+        elif isinstance(event, Message):
+            await event.answer(
+                "🔒 <b>Подписка обязательна</b>\n\n"
+                "Подпишитесь на канал, чтобы пользоваться ботом:\n"
+                f"<a href='{channel_link}'>{self.channel}</a>",
+                parse_mode="HTML",
+                disable_web_page_preview=True
+            )
+
+    def stats(self) -> Dict[str, int]:
+        """Счётчики для логов и метрик"""
+        return {
+            "hits": self.cache.hits,
+            "misses": self.cache.misses,
+            "evictions": self.cache.evictions,
+            "api_calls": self.api_calls,
+            "coalesced": self.coalesced,
+            "cached_users": len(self.cache),
+        }
@@ -0,0 +1,194 @@
+"""
+Версионированные миграции схемы вместо create_all при импорте.
+
+Каждая миграция — (версия, имя, функция(conn)), выполняется один раз в своей
+транзакции; применённые версии хранятся в schema_migrations отдельно для каждой
+схемы (namespace). Онлайн-миграция (online=True) получает соединение без общей
+транзакции и сама коммитит короткими порциями — для дозаполнения больших таблиц
+без долгих блокировок; прерванная, она просто повторится при следующем запуске.
+На PostgreSQL реплики ждут друг друга на advisory-lock, поэтому при одновременном
+деплое миграцию выполнит только одна.
+
+check_query_plans — самопроверка через EXPLAIN: горячие запросы идут по своим индексам.
+
+CLI (схема — модуль с MIGRATIONS, по умолчанию пакет database):
+    python migrations.py upgrade     # применить недостающие миграции
+    python migrations.py status      # версии: применённые и ожидающие
+    python migrations.py check       # EXPLAIN горячих запросов, код 1 при проблеме
+"""
+import sys
+import zlib
+import importlib
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Sequence
+
+from loguru import logger
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.sql import Executable
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable[[Connection], None]
+    online: bool = False  # True — apply сам коммитит порциями, общей транзакции нет
+
+
+class HotQuery(NamedTuple):
+    """Горячий запрос и индекс, по которому он обязан идти"""
+    name: str
+    statement: Executable
+    index: str
+
+
+_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations", _metadata,
+    Column("namespace", String, primary_key=True),
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False, server_default=func.now()),
+)
+
+
+# ==================== ПРИМЕНЕНИЕ ====================
+
+def applied_versions(engine: Engine, namespace: str) -> Dict[int, datetime]:
+    """Применённые версии схемы namespace"""
+    schema_migrations.create(engine, checkfirst=True)
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(schema_migrations.c.version, schema_migrations.c.applied_at)
+            .where(schema_migrations.c.namespace == namespace)
+        )
+        return {row.version: row.applied_at for row in rows}
+
+
+def run_migrations(engine: Engine, migrations: Sequence[Migration], namespace: str) -> List[int]:
+    """Применить недостающие миграции по возрастанию версии. Возвращает применённые сейчас"""
+    schema_migrations.create(engine, checkfirst=True)
+    applied_now = []
+    with engine.connect() as lock_conn:
+        lock_key = zlib.crc32(namespace.encode())
+        if engine.dialect.name == "postgresql":
+            lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": lock_key})
+        try:
+            # Версии читаем уже под блокировкой: соседняя реплика могла успеть всё применить
+            applied = applied_versions(engine, namespace)
+            for migration in sorted(migrations, key=lambda m: m.version):
+                if migration.version in applied:
+                    continue
+                if migration.online:
+                    with engine.connect() as conn:
+                        migration.apply(conn)
+                        conn.commit()
+                with engine.begin() as conn:
+                    if not migration.online:
+                        migration.apply(conn)
+                    conn.execute(schema_migrations.insert().values(
+                        namespace=namespace, version=migration.version, name=migration.name
+                    ))
+                applied_now.append(migration.version)
+                logger.info(f"🧱 Миграция {namespace}#{migration.version} «{migration.name}» применена")
+        finally:
+            if engine.dialect.name == "postgresql":
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": lock_key})
+            lock_conn.commit()
+    return applied_now
+
+
+# ==================== ПОМОЩНИКИ ДЛЯ МИГРАЦИЙ ====================
+
+def create_tables(metadata: MetaData, *names: str) -> Callable[[Connection], None]:
+    """Миграция: создать таблицы (если их ещё нет) по моделям"""
+    def apply(conn: Connection):
+        tables = [metadata.tables[name] for name in names] if names else None
+        metadata.create_all(conn, tables=tables, checkfirst=True)
+    return apply
+
+
+def add_missing_columns(metadata: MetaData) -> Callable[[Connection], None]:
+    """Миграция: досоздать nullable-колонки, которых нет в существующих таблицах"""
+    def apply(conn: Connection):
+        inspector = inspect(conn)
+        for table in metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    column_type = column.type.compile(dialect=conn.dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                    logger.info(f"✅ Добавлена колонка {table.name}.{column.name}")
+    return apply
+
+
+def create_indexes(metadata: MetaData, *names: str) -> Callable[[Connection], None]:
+    """Миграция: создать индексы, объявленные в моделях (если их ещё нет)"""
+    def apply(conn: Connection):
+        indexes = {index.name: index for table in metadata.tables.values() for index in table.indexes}
+        for name in names:
+            indexes[name].create(conn, checkfirst=True)
+    return apply
+
+
+# ==================== САМОПРОВЕРКА ПЛАНОВ ====================
+
+def check_query_plans(engine: Engine, queries: Sequence[HotQuery]) -> List[Dict]:
+    """
+    EXPLAIN каждого горячего запроса: в плане должен встретиться его индекс.
+    На PostgreSQL seq scan на время проверки запрещён — на маленькой таблице
+    планировщик честно выбрал бы его и проверка была бы бессмысленной.
+    """
+    prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    report = []
+    with engine.connect() as conn:
+        with conn.begin() as transaction:
+            if engine.dialect.name == "postgresql":
+                conn.execute(text("SET LOCAL enable_seqscan = off"))
+            for query in queries:
+                sql = str(query.statement.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+                plan = "\n".join(str(row[-1]) for row in conn.execute(text(prefix + sql)))
+                report.append({
+                    'name': query.name,
+                    'index': query.index,
+                    'ok': query.index in plan,
+                    'plan': plan,
+                })
+            transaction.rollback()
+
+    for entry in report:
+        if entry['ok']:
+            logger.info(f"✅ {entry['name']}: {entry['index']}")
+        else:
+            logger.warning(f"⚠️ {entry['name']} не использует {entry['index']}:\n{entry['plan']}")
+    return report
+
+
+# ==================== CLI ====================
+
+def main(argv: List[str]) -> int:
+    command = argv[1] if len(argv) > 1 else "upgrade"
+    schema = importlib.import_module(argv[2] if len(argv) > 2 else "database")
+
+    if command == "upgrade":
+        schema.migrate()
+        return 0
+    if command == "status":
+        applied = applied_versions(schema.get_engine(), schema.MIGRATIONS_NAMESPACE)
+        for migration in schema.MIGRATIONS:
+            mark = f"применена {applied[migration.version]}" if migration.version in applied else "ожидает"
+            print(f"{migration.version:>4}  {migration.name:<40} {mark}")
+        return 0
+    if command == "check":
+        report = check_query_plans(schema.get_engine(), schema.hot_queries())
+        return 0 if all(entry['ok'] for entry in report) else 1
+
+    print(__doc__)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
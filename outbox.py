@@ -0,0 +1,329 @@
+"""
+Исходящие сообщения с учётом лимитов Telegram.
+
+Подключается как request-middleware сессии бота, поэтому message.answer,
+message.reply, edit_text и bot.send_message проходят через очередь без
+изменений в хендлерах. Приоритет задаётся контекстом: outbound_priority(...).
+
+• глобальный token bucket (~30 сообщений/с на бота)
+• token bucket на каждый чат (личка ~1/с, группы ~20/мин)
+• приоритетные полосы: ответы пользователю → напоминания → рассылки
+• TelegramRetryAfter обрабатывается автоматически: чат ставится на паузу,
+  сообщение уходит повторно после retry_after
+"""
+import time
+import heapq
+import asyncio
+import itertools
+import contextvars
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from enum import IntEnum
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from loguru import logger
+
+from metrics import percentile
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # ответы на действия пользователя
+    REMINDER = 1     # напоминания
+    BROADCAST = 2    # рассылки
+
+
+_current_priority: contextvars.ContextVar = contextvars.ContextVar("outbound_priority", default=Priority.INTERACTIVE)
+
+# Методы, которые Telegram ограничивает по частоте сообщений в чат
+RATE_LIMITED_PREFIXES = ("send", "edit", "copy", "forward")
+
+
+@contextmanager
+def outbound_priority(priority: Priority) -> Iterator[None]:
+    """Все отправки внутри блока идут в полосу priority"""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+class TokenBucket:
+    """Классический token bucket: rate токенов в секунду, не больше capacity"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0  # пауза после retry_after
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Сколько ждать до свободного токена (0 — можно отправлять)"""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class _Outgoing:
+    __slots__ = ("make_request", "bot", "method", "priority", "chat_id", "future", "enqueued_at",
+                 "attempts", "holds_chat")
+
+    def __init__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod,
+                 priority: Priority, chat_id: Any, future: asyncio.Future):
+        self.make_request = make_request
+        self.bot = bot
+        self.method = method
+        self.priority = priority
+        self.chat_id = chat_id
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+        # Чат занят ради этого сообщения: повтор после retry_after или следующий из ожидающих
+        self.holds_chat = False
+
+
+class OutboundSender(BaseRequestMiddleware):
+    """
+    Очередь отправки с глобальным и per-chat ограничением скорости.
+    Подключение: bot.session.middleware(OutboundSender())
+    """
+
+    def __init__(self, global_rate: float = 30.0, private_rate: float = 1.0,
+                 private_burst: float = 3.0, group_rate: float = 20 / 60, group_burst: float = 3.0,
+                 concurrency: int = 16, max_attempts: int = 5, max_chat_buckets: int = 50_000,
+                 window: int = 2000):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.private_rate, self.private_burst = private_rate, private_burst
+        self.group_rate, self.group_burst = group_rate, group_burst
+        self.max_attempts = max_attempts
+        self.max_chat_buckets = max_chat_buckets
+
+        self._seq = itertools.count()
+        self._ready: List[Tuple[int, int, _Outgoing]] = []    # (priority, seq, item)
+        self._delayed: List[Tuple[float, int, _Outgoing]] = []  # (ready_at, seq, item)
+        # Чат, у которого сообщение уже в полёте, ждёт: порядок внутри чата сохраняется
+        self._chat_busy: set = set()
+        self._chat_waiting: Dict[Any, Deque[_Outgoing]] = {}
+        self._chat_buckets: "OrderedDict[Any, TokenBucket]" = OrderedDict()
+
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(concurrency)
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: set = set()
+
+        self.sent = 0
+        self.failed = 0
+        self.retry_after_hits = 0
+        self.latencies: Dict[Priority, deque] = {lane: deque(maxlen=window) for lane in Priority}
+
+    # ==================== ПУБЛИЧНЫЙ API ====================
+
+    async def __call__(self, make_request: NextRequestMiddlewareType[TelegramType], bot: Bot,
+                       method: TelegramMethod[TelegramType]) -> Response[TelegramType]:
+        """Отправляющие методы — через очередь, остальные (getChatMember и т.п.) — напрямую"""
+        if not method.__api_method__.lower().startswith(RATE_LIMITED_PREFIXES):
+            return await make_request(bot, method)
+
+        if self._task is None:
+            self.start()
+        future = asyncio.get_running_loop().create_future()
+        item = _Outgoing(make_request, bot, method, _current_priority.get(),
+                         getattr(method, "chat_id", None), future)
+        self._push_ready(item)
+        return await future
+
+    @staticmethod
+    async def send(bot: Bot, method: TelegramMethod[TelegramType],
+                   priority: Priority = Priority.BROADCAST) -> TelegramType:
+        """Отправить метод в заданной полосе (для рассылок и фоновых задач)"""
+        with outbound_priority(priority):
+            return await bot(method)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="outbound-sender")
+
+    async def close(self, timeout: float = 10.0):
+        """Дослать очередь (не дольше timeout) и остановиться"""
+        deadline = time.monotonic() + timeout
+        while self.depth() and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # ==================== ПЛАНИРОВАНИЕ ====================
+
+    def _push_ready(self, item: _Outgoing):
+        heapq.heappush(self._ready, (item.priority, next(self._seq), item))
+        self._wakeup.set()
+
+    def _push_delayed(self, item: _Outgoing, ready_at: float):
+        heapq.heappush(self._delayed, (ready_at, next(self._seq), item))
+        self._wakeup.set()
+
+    def _chat_bucket(self, chat_id: Any) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            # Отрицательные id — группы и каналы: у них лимит строже
+            is_group = isinstance(chat_id, str) or (isinstance(chat_id, int) and chat_id < 0)
+            bucket = TokenBucket(self.group_rate, self.group_burst) if is_group \
+                else TokenBucket(self.private_rate, self.private_burst)
+            self._chat_buckets[chat_id] = bucket
+            while len(self._chat_buckets) > self.max_chat_buckets:
+                self._chat_buckets.popitem(last=False)
+        else:
+            self._chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            while self._delayed and self._delayed[0][0] <= now:
+                _, _, item = heapq.heappop(self._delayed)
+                self._push_ready(item)
+
+            if not self._ready:
+                timeout = self._delayed[0][0] - now if self._delayed else None
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, item = heapq.heappop(self._ready)
+            if item.future.done():
+                if item.holds_chat:
+                    self._release_chat(item.chat_id)
+                continue
+
+            if item.chat_id is not None and item.chat_id in self._chat_busy and not item.holds_chat:
+                self._chat_waiting.setdefault(item.chat_id, deque()).append(item)
+                continue
+
+            chat_bucket = self._chat_bucket(item.chat_id) if item.chat_id is not None else None
+            chat_wait = chat_bucket.delay(now) if chat_bucket else 0.0
+            if chat_wait > 0:
+                # Этот чат подождёт, остальные — нет
+                self._push_delayed(item, now + chat_wait)
+                continue
+
+            global_wait = self.global_bucket.delay(now)
+            if global_wait > 0:
+                heapq.heappush(self._ready, (item.priority, next(self._seq), item))
+                await asyncio.sleep(global_wait)
+                continue
+
+            await self._slots.acquire()
+            now = time.monotonic()  # пока ждали слот, корзины пополнились
+            item.holds_chat = False
+            self.global_bucket.consume(now)
+            if chat_bucket:
+                chat_bucket.consume(now)
+                self._chat_busy.add(item.chat_id)
+            task = asyncio.create_task(self._deliver(item))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _deliver(self, item: _Outgoing):
+        item.attempts += 1
+        try:
+            response = await item.make_request(item.bot, item.method)
+        except TelegramRetryAfter as e:
+            self.retry_after_hits += 1
+            if item.chat_id is not None:
+                self._chat_bucket(item.chat_id).block(e.retry_after)
+            else:
+                self.global_bucket.block(e.retry_after)
+            if item.attempts < self.max_attempts:
+                logger.warning(f"⏳ Flood control для {item.chat_id}: повтор через {e.retry_after} с")
+                # Чат остаётся занятым: следующие сообщения не обгонят повторяемое
+                item.holds_chat = True
+                self._push_delayed(item, time.monotonic() + e.retry_after)
+            else:
+                self._finish(item, error=e)
+        except Exception as e:
+            self._finish(item, error=e)
+        else:
+            self._finish(item, result=response)
+        finally:
+            self._slots.release()
+            if not item.holds_chat:
+                self._release_chat(item.chat_id)
+
+    def _release_chat(self, chat_id: Any):
+        if chat_id is None:
+            return
+        waiting = self._chat_waiting.get(chat_id)
+        if not waiting:
+            self._chat_busy.discard(chat_id)
+            return
+        # Чат остаётся занятым и переходит к следующему: новые сообщения его не обгонят,
+        # а если следующий уже отменён — _run передаст чат дальше
+        item = waiting.popleft()
+        if not waiting:
+            del self._chat_waiting[chat_id]
+        item.holds_chat = True
+        self._push_ready(item)
+
+    def _finish(self, item: _Outgoing, result: Any = None, error: Optional[BaseException] = None):
+        if error is not None:
+            self.failed += 1
+            if not item.future.done():
+                item.future.set_exception(error)
+                item.future.exception()  # помечаем как полученную, даже если ожидающий уже отменён
+            return
+        self.sent += 1
+        self.latencies[item.priority].append(time.monotonic() - item.enqueued_at)
+        if not item.future.done():
+            item.future.set_result(result)
+
+    # ==================== МЕТРИКИ ====================
+
+    def depth(self) -> int:
+        waiting = sum(len(queue) for queue in self._chat_waiting.values())
+        return len(self._ready) + len(self._delayed) + waiting + len(self._inflight)
+
+    def lane_depths(self) -> Dict[str, int]:
+        depths = {lane.name.lower(): 0 for lane in Priority}
+        items = [entry[2] for entry in self._ready] + [entry[2] for entry in self._delayed]
+        items += [item for queue in self._chat_waiting.values() for item in queue]
+        for item in items:
+            depths[item.priority.name.lower()] += 1
+        return depths
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "depth": self.lane_depths(),
+            "inflight": len(self._inflight),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retry_after": self.retry_after_hits,
+            "latency_p50_ms": {lane.name.lower(): percentile(self.latencies[lane], 50) * 1000 for lane in Priority},
+            "latency_p99_ms": {lane.name.lower(): percentile(self.latencies[lane], 99) * 1000 for lane in Priority},
+        }
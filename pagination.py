@@ -0,0 +1,69 @@
+"""
+Keyset-пагинация по (время, id).
+
+Курсор — компактная строка для callback_data: микросекунды эпохи и id в base36.
+Страница строится из limit + 1 строк: лишняя строка говорит, что дальше есть ещё.
+"""
+import calendar
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_EPOCH = datetime(1970, 1, 1)
+SQLITE_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def _to_base36(value: int) -> str:
+    if value == 0:
+        return "0"
+    digits = []
+    while value:
+        value, rest = divmod(value, 36)
+        digits.append(_DIGITS[rest])
+    return "".join(reversed(digits))
+
+
+def encode_cursor(moment: datetime, row_id: int) -> str:
+    """(время, id) → «ts.id»"""
+    micros = calendar.timegm(moment.timetuple()) * 1_000_000 + moment.microsecond
+    return f"{_to_base36(micros)}.{_to_base36(row_id)}"
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """«ts.id» → (время, id). ValueError для битого курсора"""
+    micros, row_id = cursor.split(".")
+    return _EPOCH + timedelta(microseconds=int(micros, 36)), int(row_id, 36)
+
+
+def cursor_bind_value(dialect_name: str, moment: datetime) -> Any:
+    """
+    Значение времени для сравнения в SQL.
+    SQLite хранит DateTime строкой 'YYYY-MM-DD HH:MM:SS.ffffff' (всегда с микросекундами —
+    так пишет SQLAlchemy, к этому же виду приведены старые строки, миграция 12), поэтому
+    сравниваем со строкой того же вида. isoformat() для целой секунды дробь опускает —
+    и строки с тем же временем оказывались «позже» курсора.
+    """
+    if dialect_name == "sqlite":
+        return moment.strftime(SQLITE_DATETIME_FORMAT)
+    return moment
+
+
+def build_page(rows: List[Dict], limit: int, cursor: Optional[str], backward: bool,
+               key: Callable[[Dict], Tuple[datetime, int]]) -> Dict:
+    """
+    Собрать страницу из limit + 1 строк, выбранных в порядке обхода.
+    Строки в результате всегда идут от новых к старым.
+    """
+    has_more = len(rows) > limit
+    items = rows[:limit]
+    if backward:
+        items.reverse()
+        has_next, has_prev = cursor is not None, has_more
+    else:
+        has_next, has_prev = has_more, cursor is not None
+
+    return {
+        'items': items,
+        'next_cursor': encode_cursor(*key(items[-1])) if items and has_next else None,
+        'prev_cursor': encode_cursor(*key(items[0])) if items and has_prev else None,
+    }
@@ -0,0 +1,328 @@
+"""
+Аудит SQL-запросов: медленные запросы и N+1.
+
+Включается QUERY_AUDIT=1 (для стейджинга / нагрузочного теста; в проде — по
+необходимости, отпечатки и EXPLAIN стоят заметно дороже метрик из metrics.py).
+
+• запрос дольше QUERY_AUDIT_SLOW_MS попадает в лог с параметрами и планом
+  (EXPLAIN — один раз на отпечаток, чтобы не удваивать нагрузку)
+• внутри области (апдейт / хендлер, см. QueryAuditor.scope) запрос одной
+  формы, повторённый больше QUERY_AUDIT_REPEAT раз, помечается как N+1
+• всё копится по отпечатку — тексту запроса без литералов и параметров,
+  со схлопнутыми списками IN (...) и VALUES (...), (...)
+
+Отчёт пишется в лог при остановке и, если задан QUERY_AUDIT_FILE, в JSON.
+Два отчёта сравниваются, чтобы увидеть регрессии:
+    python query_audit.py diff before.json after.json
+"""
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+QUERY_AUDIT = os.getenv("QUERY_AUDIT", "0") == "1"
+QUERY_AUDIT_SLOW_MS = float(os.getenv("QUERY_AUDIT_SLOW_MS", "100"))
+QUERY_AUDIT_REPEAT = int(os.getenv("QUERY_AUDIT_REPEAT", "5"))
+QUERY_AUDIT_FILE = os.getenv("QUERY_AUDIT_FILE", "")
+
+MAX_FINGERPRINTS = 2000
+PARAMS_PREVIEW = 500
+
+EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT")
+
+
+# ==================== ОТПЕЧАТКИ ====================
+
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDERS = re.compile(r"%\(\w+\)s|%s|\$\d+|(?<![:\w]):\w+|\?")
+_SPACES = re.compile(r"\s+")
+_IN_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_ROW_LISTS = re.compile(r"(\([?, ]+\))(?:\s*,\s*\1)+")
+
+
+def fingerprint(statement: str) -> str:
+    """Форма запроса: литералы и параметры → ?, списки одинаковой формы схлопнуты"""
+    text = _STRINGS.sub("?", statement)
+    text = _PLACEHOLDERS.sub("?", text)
+    text = _NUMBERS.sub("?", text)
+    text = _SPACES.sub(" ", text).strip()
+    text = _ROW_LISTS.sub(r"\1, ...", text)
+    return _IN_LISTS.sub("(?+)", text)
+
+
+def fingerprint_id(shape: str) -> str:
+    return hashlib.sha1(shape.encode()).hexdigest()[:10]
+
+
+def _preview(parameters: Any) -> str:
+    text = repr(parameters)
+    return text if len(text) <= PARAMS_PREVIEW else text[:PARAMS_PREVIEW] + "…"
+
+
+# ==================== АУДИТОР ====================
+
+class _Scope:
+    """Запросы одной области: отпечаток → сколько раз встретился"""
+
+    __slots__ = ("name", "counts")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.counts: Dict[str, int] = {}
+
+
+_current_scope: contextvars.ContextVar[Optional[_Scope]] = contextvars.ContextVar(
+    "query_audit_scope", default=None
+)
+
+
+class QueryAuditor:
+    """Слушает cursor-события всех движков и копит статистику по отпечаткам"""
+
+    def __init__(self, slow_ms: float = QUERY_AUDIT_SLOW_MS, repeat_threshold: int = QUERY_AUDIT_REPEAT):
+        self.slow_seconds = slow_ms / 1000
+        self.repeat_threshold = repeat_threshold
+        self.fingerprints: Dict[str, Dict[str, Any]] = {}
+        self._shapes: Dict[str, str] = {}  # текст запроса → отпечаток (SQLAlchemy кэширует SQL, текстов немного)
+        self._explained: set = set()
+        self._lock = threading.Lock()
+        self._installed = False
+        self.scopes = 0
+        self.flagged_scopes = 0
+
+    def install(self):
+        if self._installed:
+            return
+        event.listen(Engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", self._after_cursor_execute)
+        self._installed = True
+        logger.info(
+            f"🔎 Аудит запросов: медленные > {self.slow_seconds * 1000:.0f} мс, "
+            f"N+1 > {self.repeat_threshold} повторов"
+        )
+
+    def uninstall(self):
+        if self._installed:
+            event.remove(Engine, "before_cursor_execute", self._before_cursor_execute)
+            event.remove(Engine, "after_cursor_execute", self._after_cursor_execute)
+            self._installed = False
+
+    @contextmanager
+    def scope(self, name: str) -> Iterator[None]:
+        """Область проверки N+1: обычно один хендлер; видна и в потоках run_db"""
+        current = _Scope(name)
+        token = _current_scope.set(current)
+        try:
+            yield
+        finally:
+            _current_scope.reset(token)
+            self._close_scope(current)
+
+    # ---------- события SQLAlchemy ----------
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # На контексте выполнения: у упавшего запроса after не будет, соединению ничего не остаётся
+        if context is not None:
+            context._query_audit_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_query_audit_started", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+
+        shape = self._shapes.get(statement)
+        if shape is None:
+            shape = self._shapes[statement] = fingerprint(statement)
+            if len(self._shapes) > MAX_FINGERPRINTS * 4:
+                self._shapes.clear()
+        key = fingerprint_id(shape)
+
+        with self._lock:
+            entry = self.fingerprints.get(key)
+            if entry is None:
+                if len(self.fingerprints) >= MAX_FINGERPRINTS:
+                    return
+                entry = self.fingerprints[key] = {
+                    'fingerprint': shape, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                    'slow': 0, 'n_plus_one': 0, 'max_per_scope': 0, 'scopes': [],
+                }
+            entry['count'] += 1
+            entry['total_ms'] += elapsed * 1000
+            entry['max_ms'] = max(entry['max_ms'], elapsed * 1000)
+            slow = elapsed >= self.slow_seconds
+            if slow:
+                entry['slow'] += 1
+
+        scope = _current_scope.get()
+        if scope is not None:
+            scope.counts[key] = scope.counts.get(key, 0) + 1
+
+        if slow:
+            self._log_slow(conn, key, statement, parameters, executemany, elapsed, scope)
+
+    # ---------- медленные запросы ----------
+
+    def _log_slow(self, conn, key: str, statement: str, parameters, executemany: bool,
+                  elapsed: float, scope: Optional[_Scope]):
+        where = f" в {scope.name}" if scope is not None else ""
+        message = (
+            f"🐢 Медленный запрос [{key}] {elapsed * 1000:.0f} мс{where}\n"
+            f"{statement.strip()}\nпараметры: {_preview(parameters)}"
+        )
+        if key not in self._explained and not executemany:
+            self._explained.add(key)
+            plan = self._explain(conn, statement, parameters)
+            if plan:
+                message += f"\nплан:\n{plan}"
+        logger.warning(message)
+
+    @staticmethod
+    def _explain(conn, statement: str, parameters) -> str:
+        """
+        План без выполнения (EXPLAIN, не ANALYZE) на том же соединении и с теми же параметрами.
+        PostgreSQL: внутри SAVEPOINT — упавший EXPLAIN иначе оборвал бы транзакцию вызывающего
+        кода. В SQLite ошибка транзакцию не обрывает, а ROLLBACK TO прервал бы ещё не
+        дочитанный запрос вызывающего — там без точки сохранения.
+        """
+        head = statement.lstrip()[:10].upper()
+        if not head.startswith(EXPLAINABLE):
+            return ""
+        sqlite = conn.dialect.name == "sqlite"
+        prefix = "EXPLAIN QUERY PLAN " if sqlite else "EXPLAIN "
+        try:
+            cursor = conn.connection.cursor()
+        except Exception as e:
+            return f"(EXPLAIN не удался: {e})"
+        try:
+            if not sqlite:
+                cursor.execute("SAVEPOINT query_audit_explain")
+            try:
+                cursor.execute(prefix + statement, parameters)
+                plan = "\n".join(str(row[-1]) for row in cursor.fetchall())
+            except Exception as e:
+                if not sqlite:
+                    cursor.execute("ROLLBACK TO SAVEPOINT query_audit_explain")
+                plan = f"(EXPLAIN не удался: {e})"
+            if not sqlite:
+                cursor.execute("RELEASE SAVEPOINT query_audit_explain")
+            return plan
+        except Exception as e:
+            return f"(EXPLAIN не удался: {e})"
+        finally:
+            cursor.close()
+
+    # ---------- N+1 ----------
+
+    def _close_scope(self, scope: _Scope):
+        flagged = False
+        with self._lock:
+            self.scopes += 1
+            for key, count in scope.counts.items():
+                entry = self.fingerprints.get(key)
+                if entry is None:
+                    continue
+                entry['max_per_scope'] = max(entry['max_per_scope'], count)
+                if count > self.repeat_threshold:
+                    flagged = True
+                    entry['n_plus_one'] += 1
+                    if scope.name not in entry['scopes'] and len(entry['scopes']) < 10:
+                        entry['scopes'].append(scope.name)
+                    logger.warning(
+                        f"🔁 N+1 в {scope.name}: [{key}] ×{count}\n{entry['fingerprint']}"
+                    )
+            if flagged:
+                self.flagged_scopes += 1
+
+    # ---------- отчёт ----------
+
+    def report(self) -> List[Dict[str, Any]]:
+        """Отпечатки по убыванию суммарного времени"""
+        with self._lock:
+            rows = [dict(entry, id=key, mean_ms=entry['total_ms'] / entry['count'])
+                    for key, entry in self.fingerprints.items() if entry['count']]
+        return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+
+    def log_report(self, limit: int = 10):
+        rows = self.report()
+        logger.info(
+            f"🔎 Аудит запросов: {len(rows)} отпечатков, областей {self.scopes}, "
+            f"с N+1 {self.flagged_scopes}"
+        )
+        for row in rows[:limit]:
+            flags = []
+            if row['slow']:
+                flags.append(f"медленных {row['slow']}")
+            if row['n_plus_one']:
+                flags.append(f"N+1 {row['n_plus_one']}")
+            logger.info(
+                f"   [{row['id']}] ×{row['count']} Σ{row['total_ms']:.0f} мс "
+                f"max {row['max_ms']:.1f} мс, до {row['max_per_scope']} за область"
+                f"{' — ' + ', '.join(flags) if flags else ''}: {row['fingerprint'][:120]}"
+            )
+
+    def dump(self, path: str = QUERY_AUDIT_FILE):
+        if not path:
+            return
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({'slow_ms': self.slow_seconds * 1000, 'repeat_threshold': self.repeat_threshold,
+                       'fingerprints': self.report()}, f, ensure_ascii=False, indent=2)
+        logger.info(f"🔎 Отчёт аудита запросов: {path}")
+
+
+auditor = QueryAuditor()
+
+
+# ==================== СРАВНЕНИЕ ОТЧЁТОВ ====================
+
+def diff_reports(before: Dict, after: Dict, growth: float = 1.5) -> List[str]:
+    """Что стало хуже: новые отпечатки, новые N+1, рост повторов за область и среднего времени"""
+    old = {row['id']: row for row in before['fingerprints']}
+    lines = []
+    for row in after['fingerprints']:
+        previous = old.get(row['id'])
+        if previous is None:
+            lines.append(f"+ новый [{row['id']}] ×{row['count']} mean {row['mean_ms']:.2f} мс: {row['fingerprint']}")
+            continue
+        problems = []
+        if row['n_plus_one'] and not previous['n_plus_one']:
+            problems.append(f"N+1 (до {row['max_per_scope']} за область)")
+        elif row['max_per_scope'] > previous['max_per_scope']:
+            problems.append(f"повторов за область {previous['max_per_scope']} → {row['max_per_scope']}")
+        if row['mean_ms'] > previous['mean_ms'] * growth:
+            problems.append(f"mean {previous['mean_ms']:.2f} → {row['mean_ms']:.2f} мс")
+        if row['slow'] and not previous['slow']:
+            problems.append(f"медленных {row['slow']}")
+        if problems:
+            lines.append(f"! [{row['id']}] {', '.join(problems)}: {row['fingerprint']}")
+    gone = set(old) - {row['id'] for row in after['fingerprints']}
+    lines.extend(f"- исчез [{key}]: {old[key]['fingerprint']}" for key in sorted(gone))
+    return lines
+
+
+def main(argv: List[str]) -> int:
+    if len(argv) == 4 and argv[1] == "diff":
+        with open(argv[2], encoding="utf-8") as f:
+            before = json.load(f)
+        with open(argv[3], encoding="utf-8") as f:
+            after = json.load(f)
+        lines = diff_reports(before, after)
+        print("\n".join(lines) if lines else "Регрессий не найдено")
+        return 1 if any(not line.startswith("-") for line in lines) else 0
+    print(__doc__)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,243 @@
+"""
+Планировщик доставки напоминаний.
+
+Держит в памяти min-heap ближайших напоминаний, подгружая их окнами по индексу
+remind_at, и спит до следующего срока. add_reminder / delete_reminder будят его,
+если меняется голова кучи. Наступившие напоминания забираются в аренду порциями
+(безопасно для нескольких реплик), доставленная порция закрывается одним UPDATE.
+"""
+import html
+import heapq
+import asyncio
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from loguru import logger
+
+from async_db import run_db
+from database import Database, WORKER_ID
+from outbox import Priority, outbound_priority
+
+# Результат доставки: True — больше не пытаться (отправлено или получатель недоступен)
+Deliver = Callable[[Dict], Awaitable[bool]]
+
+
+def make_bot_delivery(bot: Bot) -> Deliver:
+    """Стандартная доставка напоминания личным сообщением"""
+    async def deliver(reminder: Dict) -> bool:
+        try:
+            # Напоминания уступают очередь ответам пользователям
+            with outbound_priority(Priority.REMINDER):
+                await bot.send_message(
+                    reminder['user_id'],
+                    f"⏰ <b>Напоминание</b>\n\n{html.escape(reminder['text'])}",
+                    parse_mode="HTML"
+                )
+            return True
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            # Бот заблокирован / чат не найден — повторять бессмысленно
+            logger.warning(f"⚠️ Напоминание #{reminder['id']} не доставлено: {e}")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Ошибка доставки напоминания #{reminder['id']}: {e}")
+            return False
+    return deliver
+
+
+class ReminderScheduler:
+    """Таймер на min-heap поверх таблицы reminders"""
+
+    def __init__(self, database: Database, deliver: Deliver,
+                 window: timedelta = timedelta(minutes=10), window_limit: int = 500,
+                 retry_delay: timedelta = timedelta(minutes=1),
+                 worker_id: str = WORKER_ID, batch_size: int = 100, lease_seconds: int = 120):
+        self.database = database
+        self.deliver = deliver
+        self.window = window
+        self.window_limit = window_limit
+        self.retry_delay = retry_delay
+        self.worker_id = worker_id
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+
+        self._heap: List[tuple] = []          # (remind_at, id, reminder)
+        self._queued: Set[int] = set()         # id, лежащие в куче
+        self._cancelled: Set[int] = set()      # ленивое удаление из кучи
+        self._loaded_until: Optional[datetime] = None
+        self._retry_at: Optional[datetime] = None  # повторная попытка аренды / доставки
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.delivered = 0
+        self.failed = 0
+        self.window_loads = 0
+
+    # ==================== ЖИЗНЕННЫЙ ЦИКЛ ====================
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self.database.add_reminder_listener(self._on_reminder_event)
+        self._task = asyncio.create_task(self._run(), name="reminder-scheduler")
+
+    async def stop(self):
+        self.database.remove_reminder_listener(self._on_reminder_event)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # ==================== СОБЫТИЯ ИЗ БД ====================
+
+    def _on_reminder_event(self, event: str, reminder: Dict):
+        """Вызывается из потока БД — переносим обработку в event loop"""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._apply_event, event, reminder)
+
+    def _apply_event(self, event: str, reminder: Dict):
+        if event == 'added':
+            # Дальше загруженного окна — подхватим при следующей загрузке
+            if self._loaded_until is None or reminder['remind_at'] > self._loaded_until:
+                return
+            became_head = not self._heap or reminder['remind_at'] < self._heap[0][0]
+            self._push(reminder)
+            if became_head:
+                self._wakeup.set()
+        elif event == 'deleted':
+            if reminder['id'] in self._queued:
+                self._cancelled.add(reminder['id'])
+                if self._heap and self._heap[0][1] == reminder['id']:
+                    self._wakeup.set()
+        elif event == 'reload':
+            # Массовая вставка без id — перечитать окно (дубли отсекает _push)
+            self._loaded_until = None
+            self._wakeup.set()
+
+    def _push(self, reminder: Dict):
+        if reminder['id'] in self._queued:
+            return
+        self._queued.add(reminder['id'])
+        self._cancelled.discard(reminder['id'])
+        heapq.heappush(self._heap, (reminder['remind_at'], reminder['id'], reminder))
+
+    def _pop(self) -> Dict:
+        _, reminder_id, reminder = heapq.heappop(self._heap)
+        self._queued.discard(reminder_id)
+        return reminder
+
+    # ==================== ОСНОВНОЙ ЦИКЛ ====================
+
+    async def _load_window(self):
+        """Подгрузить следующее окно напоминаний по индексу remind_at"""
+        until = datetime.now() + self.window
+        # Граница ставится до запроса: напоминания, созданные пока он идёт,
+        # попадут в кучу через события (дубли отсекает _push)
+        self._loaded_until = until
+        rows = await run_db(self.database.get_upcoming_reminders, until, self.window_limit)
+        self.window_loads += 1
+        for reminder in rows:
+            self._push(reminder)
+        # Окно обрезано лимитом — граница там, где закончились загруженные строки
+        if len(rows) >= self.window_limit:
+            self._loaded_until = rows[-1]['remind_at']
+
+    async def _run(self):
+        while True:
+            try:
+                if self._loaded_until is None or datetime.now() >= self._loaded_until:
+                    await self._load_window()
+
+                # Выбрасываем удалённые с головы кучи
+                while self._heap and self._heap[0][1] in self._cancelled:
+                    self._cancelled.discard(self._pop()['id'])
+
+                deadline = self._loaded_until
+                if self._heap and self._heap[0][0] < deadline:
+                    deadline = self._heap[0][0]
+                if self._retry_at is not None and self._retry_at < deadline:
+                    deadline = self._retry_at
+
+                timeout = (deadline - datetime.now()).total_seconds()
+                if timeout > 0:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout)
+                        continue  # голова кучи поменялась — пересчитываем срок
+                    except asyncio.TimeoutError:
+                        pass
+
+                await self._dispatch_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Ошибка планировщика напоминаний: {e}")
+                await asyncio.sleep(self.retry_delay.total_seconds())
+
+    async def _dispatch_due(self):
+        """
+        Доставить наступившие напоминания.
+        Куча — только таймер: сами строки забираются в аренду через claim_due_reminders,
+        поэтому несколько реплик не отправят одно напоминание дважды.
+        """
+        now = datetime.now()
+        expected = 0
+        while self._heap and self._heap[0][0] <= now:
+            reminder = self._pop()
+            if reminder['id'] in self._cancelled:
+                self._cancelled.discard(reminder['id'])
+            else:
+                expected += 1
+        self._retry_at = None
+
+        claimed = 0
+        try:
+            while True:
+                # Бэклог после простоя идёт порциями, каждая — своя аренда
+                batch = await run_db(self.database.claim_due_reminders, self.worker_id,
+                                     self.batch_size, self.lease_seconds)
+                if not batch:
+                    break
+                claimed += len(batch)
+
+                results = await asyncio.gather(*(self.deliver(reminder) for reminder in batch))
+                done_ids = [reminder['id'] for reminder, ok in zip(batch, results) if ok]
+                failed_ids = [reminder['id'] for reminder, ok in zip(batch, results) if not ok]
+                await run_db(self.database.complete_claimed_reminders, done_ids, self.worker_id)
+                if failed_ids:
+                    await run_db(self.database.release_claimed_reminders, failed_ids, self.worker_id,
+                                 int(self.retry_delay.total_seconds()))
+                    self._schedule_retry(now + self.retry_delay)
+
+                self.delivered += len(done_ids)
+                self.failed += len(failed_ids)
+                logger.info(f"⏰ Доставлено напоминаний: {len(done_ids)}/{len(batch)}")
+                if len(batch) < self.batch_size:
+                    break
+        except Exception:
+            # Наступившие уже сняты с кучи — без повтора они ждали бы следующей загрузки окна
+            self._schedule_retry(now + self.retry_delay)
+            raise
+
+        # Часть наступивших арендована другой репликой — если она упадёт,
+        # заберём их после истечения аренды
+        if claimed < expected:
+            self._schedule_retry(now + timedelta(seconds=self.lease_seconds))
+
+    def _schedule_retry(self, moment: datetime):
+        if self._retry_at is None or moment < self._retry_at:
+            self._retry_at = moment
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": len(self._queued) - len(self._cancelled),
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "window_loads": self.window_loads,
+        }
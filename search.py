@@ -0,0 +1,268 @@
+"""
+Полнотекстовый поиск по заметкам.
+
+• PostgreSQL — генерируемая колонка tsvector (russian + simple) с GIN-индексом
+• SQLite — FTS5-таблица notes_fts, синхронизируемая триггерами
+• Иначе (или при ошибке) — прежний ILIKE-поиск
+
+Совпадения выдаются keyset-страницами от новых к старым, с фрагментом и подсветкой.
+"""
+import re
+import html
+from typing import Dict, List, Optional
+
+from loguru import logger
+from sqlalchemy import DateTime, Integer, Text, case, column, func, literal, select, table, text, tuple_
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlalchemy.orm import Session
+
+from pagination import build_page, cursor_bind_value, decode_cursor
+
+BACKEND_POSTGRES = "postgres"
+BACKEND_FTS5 = "fts5"
+BACKEND_ILIKE = "ilike"
+
+# Маркеры подсветки из Private Use Area: в тексте заметок их не бывает,
+# поэтому после html.escape их можно безопасно заменить на <b></b>
+HL_START = "\ue000"
+HL_STOP = "\ue001"
+
+SNIPPET_LENGTH = 120
+
+# Лёгкое описание таблицы: модуль не зависит от конкретной ORM-модели заметки
+notes_table = table(
+    "notes",
+    column("id", Integer), column("user_id", Integer), column("content", Text), column("created_at", DateTime)
+)
+
+_POSTGRES_DDL = [
+    """
+    ALTER TABLE notes ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', coalesce(content, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(content, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_notes_search_vector ON notes USING GIN (search_vector)",
+]
+
+_SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+        content, content='notes', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS notes_fts_ai AFTER INSERT ON notes BEGIN
+        INSERT INTO notes_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS notes_fts_ad AFTER DELETE ON notes BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS notes_fts_au AFTER UPDATE OF content ON notes BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO notes_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+]
+
+
+def setup_fulltext(engine: Engine) -> str:
+    """Создать индекс полнотекстового поиска и вернуть выбранный бэкенд"""
+    try:
+        if engine.dialect.name == "postgresql":
+            with engine.begin() as conn:
+                for ddl in _POSTGRES_DDL:
+                    conn.execute(text(ddl))
+            logger.info("🔎 Поиск: PostgreSQL tsvector + GIN")
+            return BACKEND_POSTGRES
+
+        if engine.dialect.name == "sqlite":
+            with engine.begin() as conn:
+                existed = conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'notes_fts'"
+                )).first() is not None
+                for ddl in _SQLITE_DDL:
+                    conn.execute(text(ddl))
+                if not existed:
+                    # Индексируем заметки, сохранённые до появления FTS
+                    conn.execute(text("INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')"))
+            logger.info("🔎 Поиск: SQLite FTS5")
+            return BACKEND_FTS5
+    except (OperationalError, DBAPIError) as e:
+        logger.warning(f"⚠️ Полнотекстовый индекс недоступен, используем ILIKE: {e}")
+
+    return BACKEND_ILIKE
+
+
+def _fts5_query(query: str) -> str:
+    """Запрос пользователя → безопасный FTS5 MATCH: каждое слово в кавычках, с префиксом"""
+    words = re.findall(r"\w+", query)
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def render_snippet(snippet: str) -> str:
+    """Экранировать фрагмент для HTML и превратить маркеры в подсветку"""
+    return html.escape(snippet).replace(HL_START, "<b>").replace(HL_STOP, "</b>")
+
+
+def search_notes(session: Session, backend: str, user_id: int, query: str,
+                 cursor: Optional[str] = None, backward: bool = False, limit: int = 10) -> Dict:
+    """
+    Страница найденных заметок пользователя, от новых к старым.
+    Keyset по (created_at, id): cursor — с какой заметки продолжать,
+    backward=True — листать к более новым.
+    content — фрагмент с маркерами HL_START/HL_STOP (см. render_snippet).
+    """
+    keyset = None
+    if cursor:
+        moment, note_id = decode_cursor(cursor)
+        keyset = (cursor_bind_value(session.get_bind().dialect.name, moment), note_id)
+
+    rows = None
+    if backend == BACKEND_POSTGRES:
+        try:
+            with session.begin_nested():
+                rows = _search_postgres(session, user_id, query, keyset, backward, limit + 1)
+        except DBAPIError as e:
+            logger.warning(f"⚠️ Ошибка полнотекстового поиска, используем ILIKE: {e}")
+    elif backend == BACKEND_FTS5:
+        match = _fts5_query(query)
+        if match:
+            try:
+                with session.begin_nested():
+                    rows = _search_fts5(session, user_id, match, keyset, backward, limit + 1)
+            except DBAPIError as e:
+                logger.warning(f"⚠️ Ошибка полнотекстового поиска, используем ILIKE: {e}")
+
+    if rows is None:
+        rows = _search_ilike(session, user_id, query, keyset, backward, limit + 1)
+
+    return build_page(rows, limit, cursor, backward, key=lambda row: (row['created_at'], row['id']))
+
+
+def count_matches(session: Session, backend: str, user_id: int, query: str, cap: int = 100) -> int:
+    """
+    Сколько заметок нашлось — но не больше cap + 1.
+    Точный COUNT по широкому запросу дорог, а показать «больше 100» достаточно.
+    """
+    if backend == BACKEND_POSTGRES:
+        sql = """
+            SELECT count(*) FROM (
+                SELECT 1 FROM notes
+                WHERE user_id = :user_id AND search_vector @@ (
+                    websearch_to_tsquery('russian', :query) || websearch_to_tsquery('simple', :query)
+                )
+                LIMIT :cap
+            ) AS matched
+        """
+        params = {"user_id": user_id, "query": query}
+    elif backend == BACKEND_FTS5 and _fts5_query(query):
+        sql = """
+            SELECT count(*) FROM (
+                SELECT 1 FROM notes_fts
+                JOIN notes n ON n.id = notes_fts.rowid
+                WHERE notes_fts MATCH :match AND n.user_id = :user_id
+                LIMIT :cap
+            ) AS matched
+        """
+        params = {"user_id": user_id, "match": _fts5_query(query)}
+    else:
+        return session.execute(
+            select(func.count()).select_from(
+                select(notes_table.c.id)
+                .where(notes_table.c.user_id == user_id,
+                       notes_table.c.content.icontains(query, autoescape=True))
+                .limit(cap + 1)
+                .subquery()
+            )
+        ).scalar_one()
+
+    try:
+        with session.begin_nested():
+            return session.execute(text(sql), dict(params, cap=cap + 1)).scalar_one()
+    except DBAPIError:
+        return count_matches(session, BACKEND_ILIKE, user_id, query, cap)
+
+
+def _keyset_sql(keyset: Optional[tuple], backward: bool) -> str:
+    if keyset is None:
+        return ""
+    return f"AND (n.created_at, n.id) {'>' if backward else '<'} (:cursor_at, :cursor_id)"
+
+
+def _keyset_params(keyset: Optional[tuple]) -> Dict:
+    return {"cursor_at": keyset[0], "cursor_id": keyset[1]} if keyset else {}
+
+
+def _search_postgres(session: Session, user_id: int, query: str, keyset: Optional[tuple],
+                     backward: bool, limit: int) -> List[Dict]:
+    order = "ASC" if backward else "DESC"
+    # ts_headline дорогой — считаем его только для строк страницы
+    rows = session.execute(text(f"""
+        WITH q AS (
+            SELECT websearch_to_tsquery('russian', :query) || websearch_to_tsquery('simple', :query) AS query
+        ), page AS (
+            SELECT n.id, n.created_at, n.content
+            FROM notes n, q
+            WHERE n.user_id = :user_id AND n.search_vector @@ q.query {_keyset_sql(keyset, backward)}
+            ORDER BY n.created_at {order}, n.id {order}
+            LIMIT :limit
+        )
+        SELECT page.id, page.created_at,
+               ts_headline('russian', page.content, q.query,
+                           'StartSel={HL_START}, StopSel={HL_STOP}, MaxWords=20, MinWords=8, MaxFragments=2') AS snippet
+        FROM page, q
+        ORDER BY page.created_at {order}, page.id {order}
+    """).columns(created_at=DateTime), dict(_keyset_params(keyset), query=query, user_id=user_id, limit=limit))
+    return [{'id': row.id, 'content': row.snippet, 'created_at': row.created_at} for row in rows]
+
+
+def _search_fts5(session: Session, user_id: int, match: str, keyset: Optional[tuple],
+                 backward: bool, limit: int) -> List[Dict]:
+    order = "ASC" if backward else "DESC"
+    rows = session.execute(text(f"""
+        SELECT n.id, n.created_at,
+               snippet(notes_fts, 0, '{HL_START}', '{HL_STOP}', '…', 16) AS snippet
+        FROM notes_fts
+        JOIN notes n ON n.id = notes_fts.rowid
+        WHERE notes_fts MATCH :match AND n.user_id = :user_id {_keyset_sql(keyset, backward)}
+        ORDER BY n.created_at {order}, n.id {order}
+        LIMIT :limit
+    """).columns(created_at=DateTime), dict(_keyset_params(keyset), match=match, user_id=user_id, limit=limit))
+    return [{'id': row.id, 'content': row.snippet, 'created_at': row.created_at} for row in rows]
+
+
+def _search_ilike(session: Session, user_id: int, query: str, keyset: Optional[tuple],
+                  backward: bool, limit: int) -> List[Dict]:
+    notes = notes_table.c
+    # Обрезка в SQL: длинный текст заметки не тянем в Python целиком
+    content = case(
+        (func.length(notes.content) > SNIPPET_LENGTH,
+         func.substr(notes.content, 1, SNIPPET_LENGTH) + '...'),
+        else_=notes.content
+    ).label("content")
+
+    stmt = select(notes.id, notes.created_at, content)\
+        .where(notes.user_id == user_id, notes.content.icontains(query, autoescape=True))
+    if keyset is not None:
+        position = tuple_(notes.created_at, notes.id)
+        bound = tuple_(literal(keyset[0]), literal(keyset[1]))
+        stmt = stmt.where(position > bound if backward else position < bound)
+    if backward:
+        stmt = stmt.order_by(notes.created_at.asc(), notes.id.asc())
+    else:
+        stmt = stmt.order_by(notes.created_at.desc(), notes.id.desc())
+
+    rows = session.execute(stmt.limit(limit))
+    # Маркеры подсветки в самом тексте заметки сломали бы разметку
+    return [{
+        'id': row.id,
+        'content': row.content.replace(HL_START, "").replace(HL_STOP, ""),
+        'created_at': row.created_at
+    } for row in rows]
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# Модули бота читают настройки при импорте: своя SQLite-база на прогон тестов
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/jarvis-test.db")
+os.environ.setdefault("BOT_TOKEN", "1:test")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,45 @@
+"""Импорт: архив, распаковывающийся слишком большим, отклоняется; слишком длинные строки пропускаются"""
+import json
+import zipfile
+
+import pytest
+
+import backup
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.rows = []
+
+    def import_batch(self, kind, user_id, rows):
+        self.rows += [(kind, row) for row in rows]
+        return len(rows)
+
+
+def write_archive(path, lines):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("notes.jsonl", "".join(line + "\n" for line in lines))
+    return str(path)
+
+
+def test_oversized_archive_rejected_before_reading(tmp_path, monkeypatch):
+    path = write_archive(tmp_path / "export.zip", [json.dumps({"content": "x" * 1000})] * 10)
+    monkeypatch.setattr(backup, "MAX_IMPORT_UNPACKED_SIZE", 5000)
+    database = FakeDatabase()
+    with pytest.raises(ValueError):
+        backup.read_import(database, 1, path)
+    assert database.rows == []
+
+
+def test_overlong_lines_skipped_and_counted(tmp_path, monkeypatch):
+    monkeypatch.setattr(backup, "MAX_IMPORT_LINE_LENGTH", 100)
+    lines = [
+        json.dumps({"content": "first"}),
+        json.dumps({"content": "y" * 500}),
+        json.dumps({"content": "second"}),
+        "z" * 250,
+    ]
+    database = FakeDatabase()
+    result = backup.read_import(database, 1, write_archive(tmp_path / "export.zip", lines))
+    assert [row["content"] for _, row in database.rows] == ["first", "second"]
+    assert result == {"imported": {"notes": 2, "bookmarks": 0, "reminders": 0}, "skipped": 2}
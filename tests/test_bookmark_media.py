@@ -0,0 +1,35 @@
+"""Медиа в закладках без повторов: повторное сохранение поднимает прежнюю закладку"""
+from database import db, init_db
+
+
+def test_resaved_media_bumps_existing_bookmark():
+    init_db()
+    user_id = 920001
+    first = db.add_bookmark(user_id, "подпись", message_type="photo", file_id="file-1",
+                            file_unique_id="unique-1", tags="работа")
+    db.add_bookmark(user_id, "текст")
+    db.add_bookmark(user_id, None, message_type="photo", file_id="file-2", file_unique_id="unique-2")
+
+    again = db.add_bookmark(user_id, None, message_type="photo", file_id="file-1-new",
+                            file_unique_id="unique-1", tags="идеи")
+
+    assert again == first
+    assert db.count_bookmarks(user_id) == 3
+    assert db.get_user_stats(user_id)['bookmarks_count'] == 3
+    newest = db.get_bookmarks(user_id)[0]
+    assert newest['id'] == first
+    assert newest['file_id'] == "file-1-new"
+    assert newest['message_text'] == "подпись"  # пустая подпись прежнюю не затирает
+    assert set(newest['tags'].split(",")) == {"работа", "идеи"}
+    assert db.list_bookmarks_page(user_id)['items'][0]['id'] == first
+    # Поднята и в списке по тегу: saved_at связей обновлён вместе с закладкой
+    tag_ids = db.get_tag_ids(user_id, "работа")
+    assert db.list_bookmarks_by_tags_page(user_id, list(tag_ids.values()))['items'][0]['id'] == first
+
+
+def test_same_text_is_not_deduplicated():
+    init_db()
+    user_id = 920002
+    db.add_bookmark(user_id, "одно и то же")
+    db.add_bookmark(user_id, "одно и то же")
+    assert db.count_bookmarks(user_id) == 2
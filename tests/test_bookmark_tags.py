@@ -0,0 +1,41 @@
+"""Фильтр закладок по тегам: callback_data укладывается в 64 байта при любом числе тегов"""
+import asyncio
+from datetime import datetime
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from handlers.bookmarks import recall_tag_filter, remember_tag_filter
+from keyboards import TagPageCallback
+from pagination import encode_cursor
+
+
+def make_state() -> FSMContext:
+    return FSMContext(MemoryStorage(), StorageKey(bot_id=1, chat_id=42, user_id=42))
+
+
+def test_many_tags_fit_callback_data():
+    async def scenario():
+        state = make_state()
+        tag_ids = [10_000_000 + i for i in range(10)]
+        key = await remember_tag_filter(state, tag_ids)
+        packed = TagPageCallback(tags=key, cursor=encode_cursor(datetime.now(), 10 ** 9), back=True).pack()
+        return len(packed.encode()), await recall_tag_filter(state, key), tag_ids
+
+    size, recalled, tag_ids = asyncio.run(scenario())
+    assert size <= 64
+    assert recalled == tag_ids
+
+
+def test_single_tag_and_broken_keys():
+    async def scenario():
+        state = make_state()
+        return (
+            await remember_tag_filter(state, [7]),
+            await recall_tag_filter(state, "7"),
+            await recall_tag_filter(state, "1.2"),
+            await recall_tag_filter(state, "fdeadbeef"),
+        )
+
+    assert asyncio.run(scenario()) == ("7", [7], None, None)
@@ -0,0 +1,75 @@
+"""Счётчики пользователя идут в ногу с данными: при записи и при сверке, в том числе одновременной"""
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, update
+
+from database import db, get_engine, init_db
+from database.models import Note, UserCounters
+
+
+def actual_counts(user_id: int) -> dict:
+    return {
+        'bookmarks_count': db.count_bookmarks(user_id),
+        'reminders_count': db.count_active_reminders(user_id),
+        'notes_count': db.count_notes(user_id),
+    }
+
+
+def stored_counts(user_id: int) -> dict:
+    stats = db.get_user_stats(user_id)
+    return {name: stats[name] for name in ('bookmarks_count', 'reminders_count', 'notes_count')}
+
+
+def test_counters_follow_add_delete_clear_complete():
+    init_db()
+    user_id = 910001
+    db.add_user(user_id)
+    later = datetime.now() + timedelta(days=1)
+    steps = [
+        lambda: [db.add_bookmark(user_id, f"b{i}") for i in range(3)],
+        lambda: [db.add_reminder(user_id, f"r{i}", later) for i in range(2)],
+        lambda: [db.add_note(user_id, f"n{i}") for i in range(2)],
+        lambda: db.delete_bookmark(db.get_bookmarks(user_id)[0]['id'], user_id),
+        lambda: db.mark_reminder_completed(db.get_active_reminders(user_id)[0]['id']),
+        lambda: db.delete_note(db.get_notes(user_id)[0]['id'], user_id),
+        lambda: db.clear_bookmarks(user_id),
+    ]
+    for step in steps:
+        step()
+        assert stored_counts(user_id) == actual_counts(user_id)
+    assert actual_counts(user_id) == {'bookmarks_count': 0, 'reminders_count': 1, 'notes_count': 1}
+
+    # Расхождение мимо счётчиков (ручная правка, каскад) сверка исправляет
+    with get_engine().begin() as conn:
+        conn.execute(delete(Note).where(Note.user_id == user_id))
+        conn.execute(update(UserCounters).where(UserCounters.user_id == user_id).values(bookmarks_count=5))
+    assert db.reconcile_user_counters() >= 1
+    assert stored_counts(user_id) == actual_counts(user_id)
+    assert db.reconcile_user_counters() == 0
+
+
+def test_reconcile_does_not_lose_concurrent_writes():
+    init_db()
+    user_id = 910002
+    db.add_user(user_id)
+    writing = threading.Event()
+    writing.set()
+
+    def reconcile_loop():
+        while writing.is_set():
+            db.reconcile_user_counters()
+
+    reconciler = threading.Thread(target=reconcile_loop)
+    reconciler.start()
+    try:
+        for i in range(60):
+            bookmark_id = db.add_bookmark(user_id, f"b{i}")
+            db.add_note(user_id, f"n{i}")
+            if i % 3 == 0:
+                db.delete_bookmark(bookmark_id, user_id)
+    finally:
+        writing.clear()
+        reconciler.join()
+
+    assert stored_counts(user_id) == actual_counts(user_id)
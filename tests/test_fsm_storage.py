@@ -0,0 +1,77 @@
+"""Хранилища FSM: истечение по TTL в памяти, SQL — состояние и данные туда-обратно и сброс"""
+import asyncio
+
+import pytest
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from sqlalchemy import create_engine, func, select
+
+from fsm_storage import MemoryTTLStorage, SQLStorage, fsm_states, metadata
+
+KEY = StorageKey(bot_id=1, chat_id=42, user_id=42)
+
+
+def test_memory_records_expire_after_ttl():
+    async def scenario():
+        storage = MemoryTTLStorage(ttl=0.05)
+        await storage.set_state(KEY, "search")
+        await storage.set_data(KEY, {"query": "идеи"})
+        before = await storage.get_state(KEY), await storage.get_data(KEY)
+        await asyncio.sleep(0.06)
+        return before, (await storage.get_state(KEY), await storage.get_data(KEY))
+
+    before, after = asyncio.run(scenario())
+    assert before == ("search", {"query": "идеи"})
+    assert after == (None, {})
+
+
+def test_memory_storage_bounded():
+    async def scenario():
+        storage = MemoryTTLStorage(maxsize=2)
+        for user_id in range(3):
+            await storage.set_state(StorageKey(bot_id=1, chat_id=user_id, user_id=user_id), "s")
+        return [await storage.get_state(StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)) for user_id in range(3)]
+
+    assert asyncio.run(scenario()) == [None, "s", "s"]
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fsm.db'}")
+    metadata.create_all(engine)
+    return engine
+
+
+def test_sql_state_and_data_round_trip_and_clear(engine):
+    async def scenario():
+        writer, reader = SQLStorage(engine), SQLStorage(engine)  # две реплики
+        state = FSMContext(writer, KEY)
+        await state.set_state("search")
+        await state.update_data(query="идеи", page=2)
+        seen = await reader.get_state(KEY), await reader.get_data(KEY)
+        await state.set_state(None)  # состояние сброшено, данные остаются
+        kept = await reader.get_state(KEY), await reader.get_data(KEY)
+        await state.clear()
+        cleared = await reader.get_state(KEY), await reader.get_data(KEY)
+        return seen, kept, cleared
+
+    seen, kept, cleared = asyncio.run(scenario())
+    assert seen == ("search", {"query": "идеи", "page": 2})
+    assert kept == (None, {"query": "идеи", "page": 2})
+    assert cleared == (None, {})
+    with engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(fsm_states)).scalar() == 0
+
+
+def test_sql_expired_state_not_read_and_purged(engine):
+    async def scenario():
+        storage = SQLStorage(engine, ttl=0)
+        await storage.set_state(KEY, "search")
+        return await storage.get_state(KEY), storage.purge_expired()
+
+    assert asyncio.run(scenario()) == (None, 1)
+
+
+def test_sql_storage_requires_migrated_table(tmp_path):
+    with pytest.raises(RuntimeError):
+        SQLStorage(create_engine(f"sqlite:///{tmp_path / 'empty.db'}")).setup()
@@ -0,0 +1,56 @@
+"""Пакетная запись заметок: общая пачка, свой id каждому и ошибка только у владельца плохой строки"""
+import asyncio
+
+from ingest import NoteIngestQueue
+
+
+class FakeNotes:
+    """flush_func: multi-row INSERT, который падает целиком, если в пачке есть плохая строка"""
+
+    def __init__(self):
+        self.calls = []
+        self.next_id = 1
+
+    def __call__(self, rows):
+        self.calls.append(len(rows))
+        if any(row["content"] == "bad" for row in rows):
+            raise ValueError("bad row")
+        ids = list(range(self.next_id, self.next_id + len(rows)))
+        self.next_id += len(rows)
+        return ids
+
+
+def run_queue(contents, **options):
+    async def scenario():
+        notes = FakeNotes()
+        queue = NoteIngestQueue(notes, **options)
+        results = await asyncio.gather(
+            *(queue.submit(user_id, content) for user_id, content in enumerate(contents)),
+            return_exceptions=True,
+        )
+        await queue.close()
+        return results, notes.calls, queue.stats()
+
+    return asyncio.run(scenario())
+
+
+def test_concurrent_notes_share_one_batch_with_own_ids():
+    results, calls, stats = run_queue([f"note {i}" for i in range(5)], max_batch=10, max_delay=0.05)
+    assert calls == [5]
+    assert sorted(results) == [1, 2, 3, 4, 5]
+    assert len(set(results)) == 5
+    assert stats["batches"] == 1 and stats["errors"] == 0
+
+
+def test_batch_size_limit_splits_batches():
+    results, calls, _ = run_queue([f"note {i}" for i in range(5)], max_batch=2, max_delay=0.05)
+    assert calls == [2, 2, 1]
+    assert sorted(results) == [1, 2, 3, 4, 5]
+
+
+def test_failed_batch_fails_only_the_bad_row():
+    results, calls, stats = run_queue(["ok 1", "bad", "ok 2"], max_batch=10, max_delay=0.05)
+    assert calls == [3, 1, 1, 1]
+    assert isinstance(results[1], ValueError)
+    assert sorted([results[0], results[2]]) == [1, 2]
+    assert stats["errors"] == 1 and stats["row_errors"] == 1
@@ -0,0 +1,123 @@
+"""Дорожки апдейтов: порядок апдейтов пользователя и контекст апдейта за дорожкой"""
+import asyncio
+
+from aiogram import Bot, Dispatcher
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Message, Update
+
+from lanes import UpdateLanes, register_before_fsm
+from metrics import Registry, current_update
+from middlewares.metrics import UpdateMetricsMiddleware
+
+
+def make_update(update_id: int, user_id: int, text: str = "x") -> Update:
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "u"},
+            "text": text,
+        },
+    })
+
+
+def test_current_update_visible_behind_lanes():
+    async def scenario():
+        lanes = UpdateLanes(lanes=4, queue_size=4, registry=Registry())
+        lanes.start()  # как в on_startup: воркеры созданы до первого апдейта
+        metrics = UpdateMetricsMiddleware(registry=Registry())
+        seen = []
+        expected = []
+
+        async def handler(event, data):
+            seen.append(current_update.get())
+
+        async def outer(event, data):
+            expected.append(current_update.get())
+            return await chain(event, data)
+
+        async def chain(event, data):
+            return await lanes(handler, event, data)
+
+        for update in (make_update(1, 42), make_update(2, 42)):
+            await metrics(outer, update, {"event_from_user": update.message.from_user})
+        await lanes.close()
+        return seen, expected
+
+    seen, expected = asyncio.run(scenario())
+    assert None not in expected
+    assert seen == expected
+
+
+class SlowStorage(MemoryStorage):
+    """Чтение состояния тем дольше, чем раньше пришёл апдейт — как медленная БД под нагрузкой"""
+
+    def __init__(self):
+        super().__init__()
+        self.delays = [0.05, 0.0]
+
+    async def get_state(self, key):
+        if self.delays:
+            await asyncio.sleep(self.delays.pop(0))
+        return await super().get_state(key)
+
+
+def test_user_updates_keep_order_and_see_previous_state():
+    async def scenario():
+        dp = Dispatcher(storage=SlowStorage())
+        lanes = UpdateLanes(lanes=4, queue_size=4, registry=Registry())
+        register_before_fsm(dp, lanes)
+        seen = []
+
+        @dp.message()
+        async def handler(message: Message, state: FSMContext, raw_state):
+            seen.append((message.text, raw_state))
+            await state.set_state(message.text)
+
+        bot = Bot("1:x")
+        updates = [make_update(1, 42, "first"), make_update(2, 42, "second")]
+        await asyncio.gather(*(dp.feed_update(bot, update) for update in updates))
+        await lanes.close()
+        await bot.session.close()
+        return seen
+
+    assert asyncio.run(scenario()) == [("first", None), ("second", "first")]
+
+
+def test_full_lane_does_not_stop_other_lanes():
+    async def scenario():
+        lanes = UpdateLanes(lanes=2, queue_size=1, max_in_flight=5, registry=Registry())
+        release = asyncio.Event()
+        done = []
+
+        async def handler(event, data):
+            if event.message.chat.id == 0:
+                await release.wait()
+            done.append(event.message.chat.id)
+
+        def feed(update_id, user_id):
+            update = make_update(update_id, user_id)
+            return asyncio.create_task(lanes(handler, update, {"event_from_user": update.message.from_user}))
+
+        # Дорожка 0 занята и полна: один апдейт выполняется, один в очереди, один ждёт места
+        blocked = [feed(update_id, 0) for update_id in range(3)]
+        await asyncio.sleep(0.01)
+        room_with_full_lane = lanes._room.is_set()
+        await asyncio.wait_for(feed(10, 1), 1)  # другая дорожка не стоит
+        other_lane_done = done == [1]
+
+        # Всего в обработке max_in_flight — getUpdates / webhook придерживаются
+        more = [feed(update_id, 0) for update_id in range(20, 22)]
+        await asyncio.sleep(0.01)
+        room_at_limit = lanes._room.is_set()
+
+        release.set()
+        await asyncio.gather(*blocked, *more)
+        room_after = lanes._room.is_set()
+        await lanes.close()
+        return room_with_full_lane, other_lane_done, room_at_limit, room_after
+
+    assert asyncio.run(scenario()) == (True, True, False, True)
@@ -0,0 +1,27 @@
+"""Метрики SQL: время упавшего запроса не достаётся следующему"""
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from metrics import UpdateStats, current_update, instrument_db
+
+
+def test_failed_statement_does_not_leak_timing():
+    instrument_db()
+    engine = create_engine("sqlite://")
+    with engine.connect() as conn:
+        sampled = UpdateStats(sampled=True)
+        token = current_update.set(sampled)
+        with pytest.raises(OperationalError):
+            conn.execute(text("SELECT * FROM missing_table"))
+        current_update.reset(token)
+
+        # Следующий апдейт не в выборке: его запрос не замеряется вовсе
+        unsampled = UpdateStats(sampled=False)
+        token = current_update.set(unsampled)
+        conn.execute(text("SELECT 1"))
+        current_update.reset(token)
+
+    assert sampled.db_statements == 0
+    assert unsampled.db_statements == 0
+    assert unsampled.db_seconds == 0
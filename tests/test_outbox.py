@@ -0,0 +1,93 @@
+"""Очередь исходящих: token bucket, приоритеты, retry_after и порядок сообщений внутри чата"""
+import asyncio
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from outbox import OutboundSender, Priority, TokenBucket, outbound_priority
+
+
+class FakeApi:
+    """make_request для сессии бота: записывает отправки, может притормозить или вернуть flood control"""
+
+    def __init__(self, hold: asyncio.Event = None, flood: dict = None):
+        self.sent = []
+        self.hold = hold
+        self.flood = dict(flood or {})  # text -> retry_after для первой попытки
+
+    async def __call__(self, bot, method):
+        self.sent.append(method.text)
+        if method.text in self.flood:
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=self.flood.pop(method.text))
+        if self.hold is not None and method.text == "hold":
+            await self.hold.wait()
+        return method.text
+
+
+def send(sender, api, chat_id, text, priority=Priority.INTERACTIVE):
+    with outbound_priority(priority):
+        return asyncio.create_task(sender(api, Bot("1:x"), SendMessage(chat_id=chat_id, text=text)))
+
+
+def test_token_bucket_refills_at_rate():
+    bucket = TokenBucket(rate=2.0, capacity=2.0)
+    now = bucket.updated
+    for _ in range(2):
+        assert bucket.delay(now) == 0
+        bucket.consume(now)
+    assert bucket.delay(now) == 0.5
+    assert bucket.delay(now + 0.5) == 0
+    bucket.blocked_until = now + 3
+    assert bucket.delay(now + 1) == 2
+
+
+def test_higher_priority_lane_goes_first():
+    async def scenario():
+        sender = OutboundSender(concurrency=1)
+        api = FakeApi()
+        tasks = [
+            send(sender, api, 1, "broadcast", Priority.BROADCAST),
+            send(sender, api, 2, "reminder", Priority.REMINDER),
+            send(sender, api, 3, "answer", Priority.INTERACTIVE),
+        ]
+        await asyncio.gather(*tasks)
+        await sender.close()
+        return api.sent
+
+    assert asyncio.run(scenario()) == ["answer", "reminder", "broadcast"]
+
+
+def test_retry_after_pauses_only_that_chat_and_keeps_order():
+    async def scenario():
+        sender = OutboundSender()
+        api = FakeApi(flood={"first": 1})
+        tasks = [send(sender, api, 1, "first"), send(sender, api, 1, "second"), send(sender, api, 2, "other")]
+        results = await asyncio.wait_for(asyncio.gather(*tasks), 5)
+        await sender.close()
+        return results, api.sent, sender.retry_after_hits
+
+    results, sent, hits = asyncio.run(scenario())
+    assert results == ["first", "second", "other"]
+    assert sent == ["first", "other", "first", "second"]
+    assert hits == 1
+
+
+def test_chat_fifo_survives_cancelled_waiter():
+    async def scenario():
+        sender = OutboundSender(private_burst=10)
+        api = FakeApi(hold=asyncio.Event())
+        first = send(sender, api, 1, "hold")
+        await asyncio.sleep(0.01)
+        waiting = [send(sender, api, 1, text) for text in ("cancelled", "second", "third")]
+        await asyncio.sleep(0.01)
+        waiting[0].cancel()
+        api.hold.set()
+        await asyncio.wait_for(asyncio.gather(first, *waiting[1:]), 2)
+        newer = await asyncio.wait_for(send(sender, api, 1, "newer"), 2)
+        await sender.close()
+        return api.sent, newer
+
+    sent, newer = asyncio.run(scenario())
+    assert sent == ["hold", "second", "third", "newer"]
+    assert newer == "newer"
@@ -0,0 +1,49 @@
+"""Keyset-пагинация: строки с одинаковым временем не теряются между страницами"""
+from datetime import datetime
+
+from sqlalchemy import text
+
+from database import db, get_engine, init_db
+from database.schema import normalize_sqlite_timestamps
+
+
+def read_all_pages(user_id: int, max_pages: int = 10) -> list:
+    """id заметок по всем страницам next_cursor (с ограничением — зацикленный курсор не подвесит тест)"""
+    seen, cursor = [], None
+    for _ in range(max_pages):
+        page = db.list_notes_page(user_id, cursor=cursor)
+        seen += [item['id'] for item in page['items']]
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    return seen
+
+
+def test_same_second_imported_notes_reachable_by_next_cursor():
+    init_db()
+    user_id = 900001
+    moment = datetime(2024, 1, 1, 10, 0, 0)
+    rows = [{'content': f"note {i}", 'created_at': moment, 'updated_at': moment} for i in range(25)]
+    db.import_batch('notes', user_id, rows)
+
+    seen = read_all_pages(user_id)
+
+    assert len(seen) == 25
+    assert len(set(seen)) == 25
+
+
+def test_legacy_second_precision_rows_normalized_by_migration():
+    init_db()
+    user_id = 900002
+    db.import_batch('notes', user_id, [{'content': f"old {i}"} for i in range(25)])
+    with get_engine().connect() as conn:
+        # Так писал прежний default=func.now() на SQLite — без дробной части секунд
+        conn.execute(text("UPDATE notes SET created_at = '2024-01-01 10:00:00', "
+                          "updated_at = '2024-01-01 10:00:00' WHERE user_id = :user_id"), {"user_id": user_id})
+        conn.commit()
+        normalize_sqlite_timestamps(conn, batch_size=7)
+
+    seen = read_all_pages(user_id)
+
+    assert sorted(seen) == sorted(set(seen))
+    assert len(seen) == 25
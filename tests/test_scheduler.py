@@ -0,0 +1,51 @@
+"""Планировщик напоминаний: сбой аренды не теряет наступившие напоминания"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from scheduler import ReminderScheduler
+
+
+class FlakyDatabase:
+    """Первая аренда падает (БД недоступна), дальше — как обычно"""
+
+    def __init__(self, reminder):
+        self.reminder = reminder
+        self.claims = 0
+        self.completed = []
+
+    def claim_due_reminders(self, worker_id, limit, lease_seconds):
+        self.claims += 1
+        if self.claims == 1:
+            raise ConnectionError("database is down")
+        return [self.reminder] if not self.completed else []
+
+    def complete_claimed_reminders(self, reminder_ids, worker_id):
+        self.completed += reminder_ids
+        return len(reminder_ids)
+
+
+def test_failed_claim_schedules_retry():
+    async def scenario():
+        reminder = {'id': 1, 'user_id': 1, 'text': "x", 'remind_at': datetime.now() - timedelta(seconds=1)}
+        database = FlakyDatabase(reminder)
+        delivered = []
+
+        async def deliver(item):
+            delivered.append(item['id'])
+            return True
+
+        scheduler = ReminderScheduler(database, deliver, worker_id="test")
+        scheduler._push(reminder)
+        with pytest.raises(ConnectionError):
+            await scheduler._dispatch_due()
+        retry_at = scheduler._retry_at
+
+        await scheduler._dispatch_due()
+        return retry_at, delivered, database.completed
+
+    retry_at, delivered, completed = asyncio.run(scenario())
+    assert retry_at is not None
+    assert delivered == [1]
+    assert completed == [1]
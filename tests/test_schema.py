@@ -0,0 +1,28 @@
+"""Миграции: у каждой свой DDL, а вместе они дают ровно схему моделей"""
+from sqlalchemy import create_engine, inspect
+
+from database.models import Base
+from database.schema import MIGRATIONS, MIGRATIONS_NAMESPACE
+from migrations import run_migrations
+
+
+def test_migrations_build_the_model_schema(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    run_migrations(engine, MIGRATIONS, MIGRATIONS_NAMESPACE)
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        columns = {column["name"]: column["nullable"] for column in inspector.get_columns(table.name)}
+        assert columns == {column.name: column.nullable for column in table.columns}, table.name
+        indexes = {index["name"]: tuple(index["column_names"]) for index in inspector.get_indexes(table.name)}
+        expected = {index.name: tuple(column.name for column in index.columns) for index in table.indexes}
+        assert indexes == expected, table.name
+
+
+def test_migration_ddl_does_not_follow_models(tmp_path):
+    """Миграция 2 добавляет только колонки аренды — даже если в модели появятся новые"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'v2.db'}")
+    run_migrations(engine, [m for m in MIGRATIONS if m.version <= 2], MIGRATIONS_NAMESPACE)
+    reminders = {column["name"] for column in inspect(engine).get_columns("reminders")}
+    bookmarks = {column["name"] for column in inspect(engine).get_columns("bookmarks")}
+    assert {"claimed_by", "claimed_until"} <= reminders
+    assert not {"file_unique_id", "media"} & bookmarks
@@ -0,0 +1,69 @@
+"""Проверка подписки: одновременные проверки — один запрос, отказ кэшируется на короткий TTL"""
+import asyncio
+from types import SimpleNamespace
+
+from aiogram.enums import ChatMemberStatus
+
+from middlewares.subscription import SubscriptionCache, SubscriptionMiddleware
+
+
+class FakeBot:
+    """get_chat_member с подсчётом вызовов; ответ можно придержать"""
+
+    def __init__(self, status=ChatMemberStatus.MEMBER, error: Exception = None):
+        self.status = status
+        self.error = error
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def get_chat_member(self, chat_id, user_id):
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return SimpleNamespace(status=self.status)
+
+
+def test_concurrent_checks_share_one_request():
+    async def scenario():
+        bot = FakeBot()
+        bot.release.clear()
+        middleware = SubscriptionMiddleware("@channel")
+        checks = [asyncio.create_task(middleware.is_subscribed(bot, 42)) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        bot.release.set()
+        results = await asyncio.gather(*checks)
+        cached = await middleware.is_subscribed(bot, 42)
+        return results, cached, bot.calls, middleware.stats()
+
+    results, cached, calls, stats = asyncio.run(scenario())
+    assert results == [True] * 5 and cached is True
+    assert calls == 1
+    assert stats["coalesced"] == 4 and stats["hits"] == 1
+
+
+def test_negative_result_expires_after_short_ttl():
+    async def scenario():
+        bot = FakeBot(status=ChatMemberStatus.LEFT)
+        middleware = SubscriptionMiddleware("@channel", SubscriptionCache(positive_ttl=600, negative_ttl=0.05))
+        first = await middleware.is_subscribed(bot, 42)
+        again = await middleware.is_subscribed(bot, 42)
+        calls_within_ttl = bot.calls
+        bot.status = ChatMemberStatus.MEMBER
+        await asyncio.sleep(0.06)
+        after_ttl = await middleware.is_subscribed(bot, 42)
+        return first, again, calls_within_ttl, after_ttl, bot.calls
+
+    assert asyncio.run(scenario()) == (False, False, 1, True, 2)
+
+
+def test_network_failure_is_not_cached():
+    async def scenario():
+        bot = FakeBot(error=ConnectionError("timeout"))
+        middleware = SubscriptionMiddleware("@channel")
+        failed = await middleware.is_subscribed(bot, 42)
+        bot.error = None
+        return failed, await middleware.is_subscribed(bot, 42), bot.calls
+
+    assert asyncio.run(scenario()) == (False, True, 2)
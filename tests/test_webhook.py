@@ -0,0 +1,117 @@
+"""Webhook: чужие запросы без секрета отклоняются, повторная доставка апдейта отбрасывается"""
+import asyncio
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.types import Message
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from sqlalchemy import create_engine
+
+from webhook import SECRET_HEADER, SQLUpdateDeduplicator, WebhookHandler, metadata, run_webhook
+
+SECRET = "test-secret"
+
+
+def update_json(update_id: int, text: str = "x") -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": 42, "type": "private"},
+            "from": {"id": 42, "is_bot": False, "first_name": "u"},
+            "text": text,
+        },
+    }
+
+
+async def serve(scenario, **handler_options):
+    dp = Dispatcher()
+    handled = []
+
+    @dp.message()
+    async def on_message(message: Message):
+        handled.append(message.message_id)
+
+    bot = Bot("1:x")
+    app = web.Application()
+    handler = WebhookHandler(dp, bot, secret=SECRET, **handler_options)
+    handler.register(app, "/webhook")
+    client = TestClient(TestServer(app))
+    await client.start_server()
+    try:
+        result = await scenario(client, handler)
+        await handler._drain(app)
+    finally:
+        await client.close()
+        await bot.session.close()
+    return result, handled, handler
+
+
+def test_requests_without_valid_secret_are_rejected():
+    async def scenario(client, handler):
+        statuses = []
+        for headers in ({}, {SECRET_HEADER: "wrong"}, {SECRET_HEADER: SECRET}):
+            response = await client.post("/webhook", json=update_json(len(statuses) + 1), headers=headers)
+            statuses.append(response.status)
+        return statuses
+
+    statuses, handled, handler = asyncio.run(serve(scenario))
+    assert statuses == [401, 401, 200]
+    assert handled == [3]
+    assert handler.stats()["rejected"] == 2
+
+
+def test_empty_secret_refused():
+    with pytest.raises(ValueError):
+        WebhookHandler(Dispatcher(), Bot("1:x"), secret="")
+    with pytest.raises(RuntimeError):
+        asyncio.run(run_webhook(Dispatcher(), Bot("1:x"), url="https://example.com", secret=""))
+
+
+def test_redelivered_update_is_dropped():
+    async def scenario(client, handler):
+        for update_id in (7, 7, 8):
+            response = await client.post("/webhook", json=update_json(update_id), headers={SECRET_HEADER: SECRET})
+            assert response.status == 200
+        return None
+
+    _, handled, handler = asyncio.run(serve(scenario))
+    assert sorted(handled) == [7, 8]
+    assert handler.stats()["duplicates"] == 1
+
+
+def test_sql_dedupe_shared_between_replicas(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'dedupe.db'}")
+    metadata.create_all(engine)
+
+    async def send(update_ids):
+        async def scenario(client, handler):
+            for update_id in update_ids:
+                response = await client.post("/webhook", json=update_json(update_id), headers={SECRET_HEADER: SECRET})
+                assert response.status == 200
+        _, handled, handler = await serve(scenario, deduplicator=SQLUpdateDeduplicator(engine))
+        return handled, handler.stats()["duplicates"]
+
+    async def replicas():
+        # Та же доставка приходит на две реплики за балансировщиком
+        return await send([5, 6]), await send([6, 7])
+
+    (first, first_dupes), (second, second_dupes) = asyncio.run(replicas())
+    assert sorted(first) == [5, 6] and first_dupes == 0
+    assert second == [7] and second_dupes == 1
+
+
+def test_sql_dedupe_purges_old_update_ids(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'dedupe.db'}")
+    metadata.create_all(engine)
+    deduplicator = SQLUpdateDeduplicator(engine, ttl=0)
+
+    async def scenario():
+        first = await deduplicator.seen(1)
+        purged = deduplicator.purge_expired()
+        return first, purged, await deduplicator.seen(1)
+
+    assert asyncio.run(scenario()) == (False, 1, False)
@@ -0,0 +1,213 @@
+"""
+Локальная замена Telegram Bot API для офлайн-проверки бота.
+
+Бот подключается к ней через TELEGRAM_API_URL=http://127.0.0.1:8081.
+Сервер отвечает на основные методы (getMe, sendMessage, editMessageText,
+getChatMember, setWebhook, getUpdates…), запоминает вызовы и умеет
+доставлять апдейты в webhook — в том числе повторно, как настоящий Telegram.
+
+Запуск:
+    python tools/fake_telegram.py --port 8081
+    python tools/fake_telegram.py --latency 0.03 --method-latency getChatMember=0.08,sendMessage=0.05
+Отправить боту сообщение (и продублировать доставку):
+    curl -X POST 127.0.0.1:8081/_fake/message -d '{"user_id": 1, "text": "привет", "deliveries": 2}'
+"""
+import time
+import asyncio
+import argparse
+import itertools
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+from aiohttp import ClientSession, TCPConnector, web
+
+BOT_USER = {"id": 1000, "is_bot": True, "first_name": "JARVIS", "username": "jarvis_fake_bot"}
+
+
+class FakeTelegram:
+    """Состояние фейкового Bot API: вызовы, очередь апдейтов, webhook"""
+
+    def __init__(self, latency: float = 0.0, method_latency: Optional[Dict[str, float]] = None):
+        self.latency = latency
+        # Задержка по методам (имена без учёта регистра), иначе — общая latency
+        self.method_latency = {name.lower(): value for name, value in (method_latency or {}).items()}
+        # Наблюдатели вызовов API: observer(method, params) — для нагрузочного теста
+        self.observers: List[Callable[[str, Dict], None]] = []
+        self.calls: deque = deque(maxlen=100_000)
+        self.call_counts: Dict[str, int] = {}
+        self.webhook_url: Optional[str] = None
+        self.webhook_secret: Optional[str] = None
+        self.updates: "asyncio.Queue[Dict]" = asyncio.Queue()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._client: Optional[ClientSession] = None
+
+    # ==================== BOT API ====================
+
+    async def api(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = await self._params(request)
+        self.call_counts[method] = self.call_counts.get(method, 0) + 1
+        self.calls.append({"method": method, "params": params, "at": time.time()})
+
+        for observer in self.observers:
+            observer(method, params)
+
+        latency = self.method_latency.get(method.lower(), self.latency)
+        if latency:
+            await asyncio.sleep(latency)
+
+        handler = getattr(self, f"_api_{method.lower()}", None)
+        result = await handler(params) if handler else True
+        return web.json_response({"ok": True, "result": result})
+
+    @staticmethod
+    async def _params(request: web.Request) -> Dict[str, Any]:
+        if request.content_type == "application/json":
+            return await request.json()
+        return dict(await request.post())
+
+    async def _api_getme(self, params: Dict) -> Dict:
+        return BOT_USER
+
+    async def _api_getchatmember(self, params: Dict) -> Dict:
+        user_id = int(params["user_id"])
+        return {"status": "member", "user": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}}
+
+    def _message(self, params: Dict) -> Dict:
+        chat_id = int(params["chat_id"])
+        return {
+            "message_id": int(params.get("message_id") or next(self._message_ids)),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"},
+            "from": BOT_USER,
+            "text": params.get("text", ""),
+        }
+
+    async def _api_sendmessage(self, params: Dict) -> Dict:
+        return self._message(params)
+
+    async def _api_editmessagetext(self, params: Dict) -> Dict:
+        return self._message(params)
+
+    async def _api_senddocument(self, params: Dict) -> Dict:
+        return self._message(params)
+
+    async def _api_setwebhook(self, params: Dict) -> bool:
+        self.webhook_url = params["url"]
+        self.webhook_secret = params.get("secret_token")
+        return True
+
+    async def _api_deletewebhook(self, params: Dict) -> bool:
+        self.webhook_url = None
+        return True
+
+    async def _api_getupdates(self, params: Dict) -> List[Dict]:
+        timeout = float(params.get("timeout") or 0)
+        updates = []
+        try:
+            updates.append(await asyncio.wait_for(self.updates.get(), timeout) if timeout else self.updates.get_nowait())
+        except (asyncio.TimeoutError, asyncio.QueueEmpty):
+            return []
+        while not self.updates.empty() and len(updates) < int(params.get("limit") or 100):
+            updates.append(self.updates.get_nowait())
+        return updates
+
+    # ==================== ДОСТАВКА АПДЕЙТОВ ====================
+
+    def make_message_update(self, user_id: int, text: str, **extra: Any) -> Dict:
+        update_id = next(self._update_ids)
+        return {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+                "text": text,
+                **extra,
+            },
+        }
+
+    def make_callback_update(self, user_id: int, data: str, message_id: int = 1) -> Dict:
+        update_id = next(self._update_ids)
+        return {
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id),
+                "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+                "chat_instance": str(user_id),
+                "data": data,
+                "message": {
+                    "message_id": message_id,
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "from": BOT_USER,
+                    "text": "…",
+                },
+            },
+        }
+
+    async def deliver(self, update: Dict, deliveries: int = 1) -> List[int]:
+        """В webhook (deliveries раз — имитация повторной доставки) или в очередь getUpdates"""
+        if self.webhook_url is None:
+            await self.updates.put(update)
+            return []
+
+        if self._client is None:
+            # Без лимита соединений: под нагрузкой пул клиента не должен становиться узким местом
+            self._client = ClientSession(connector=TCPConnector(limit=0))
+        headers = {"X-Telegram-Bot-Api-Secret-Token": self.webhook_secret} if self.webhook_secret else {}
+        statuses = []
+        for _ in range(deliveries):
+            async with self._client.post(self.webhook_url, json=update, headers=headers) as response:
+                statuses.append(response.status)
+        return statuses
+
+    async def control_message(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        update = self.make_message_update(int(body["user_id"]), body["text"])
+        statuses = await self.deliver(update, int(body.get("deliveries", 1)))
+        return web.json_response({"update_id": update["update_id"], "statuses": statuses})
+
+    async def control_calls(self, request: web.Request) -> web.Response:
+        return web.json_response({"counts": self.call_counts, "last": list(self.calls)[-50:]})
+
+    async def close(self, app: web.Application = None):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.api)
+        app.router.add_get("/bot{token}/{method}", self.api)
+        app.router.add_post("/_fake/message", self.control_message)
+        app.router.add_get("/_fake/calls", self.control_calls)
+        app.on_cleanup.append(self.close)
+        return app
+
+
+def parse_method_latency(value: str) -> Dict[str, float]:
+    """«getChatMember=0.05,sendMessage=0.03» → {'getChatMember': 0.05, 'sendMessage': 0.03}"""
+    result = {}
+    for item in filter(None, value.split(",")):
+        method, _, seconds = item.partition("=")
+        result[method.strip()] = float(seconds)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Фейковый Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа API, секунды")
+    parser.add_argument("--method-latency", default="", type=parse_method_latency,
+                        help="задержки по методам: getChatMember=0.05,sendMessage=0.03")
+    args = parser.parse_args()
+    fake = FakeTelegram(latency=args.latency, method_latency=args.method_latency)
+    web.run_app(fake.make_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
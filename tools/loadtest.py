@@ -0,0 +1,306 @@
+"""
+Нагрузочный тест всего пути «апдейт → ответ» на фейковом Telegram Bot API.
+
+Поднимает tools/fake_telegram.py в этом процессе, запускает bot.py отдельным
+процессом (polling или webhook) и гоняет смешанный трафик от тысяч
+виртуальных пользователей: сохранение заметок, поиск, колбэки закладок,
+создание напоминаний. Каждый пользователь ждёт ответа на шаг (первый
+sendMessage / editMessageText / answerCallbackQuery в его чат), думает
+и делает следующий.
+
+Отчёт: апдейтов/с, задержка end-to-end p50/p95/p99 (общая и по сценариям),
+таймауты и вызовы API на апдейт.
+
+Запуск:
+    python tools/loadtest.py --users 2000 --duration 60
+    python tools/loadtest.py --mode webhook --latency 0.03 --output /tmp/load.json
+    python tools/loadtest.py --mix note=6,search=2,bookmarks=1,reminder=1
+"""
+import os
+import sys
+import json
+import time
+import random
+import signal
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(TOOLS_DIR)
+sys.path.insert(0, TOOLS_DIR)
+sys.path.insert(0, ROOT)
+
+from fake_telegram import FakeTelegram, parse_method_latency  # noqa: E402
+from metrics import percentile  # noqa: E402
+
+# Методы, которыми бот отвечает пользователю
+REPLY_METHODS = {"sendmessage", "editmessagetext", "answercallbackquery", "senddocument", "copymessage"}
+# Служебные вызовы, не относящиеся к обработке апдейтов
+SERVICE_METHODS = {"getupdates", "getme", "setwebhook", "deletewebhook"}
+
+WORDS = "молоко хлеб встреча проект отчёт идея звонок книга фильм подарок врач спорт отпуск".split()
+
+# Шаг сценария: ("text", текст) или ("callback", data)
+Step = Tuple[str, str]
+
+
+def scenario_steps(name: str, rng: random.Random) -> List[Step]:
+    if name == "note":
+        return [("text", " ".join(rng.choices(WORDS, k=rng.randint(2, 12))))]
+    if name == "search":
+        return [("text", "🔍 Поиск"), ("text", rng.choice(WORDS))]
+    if name == "bookmarks":
+        return [("callback", "bookmarks_menu"), ("callback", "bookmarks_list")]
+    if name == "reminder":
+        return [("callback", "reminders_add"),
+                ("text", " ".join(rng.choices(WORDS, k=3))),
+                ("text", f"завтра в {rng.randint(8, 21)}:{rng.choice(['00', '15', '30', '45'])}")]
+    raise ValueError(f"Неизвестный сценарий: {name}")
+
+
+class LoadTest:
+    """Виртуальные пользователи поверх FakeTelegram и сбор задержек"""
+
+    def __init__(self, fake: FakeTelegram, users: int, think_time: float, mix: Dict[str, float],
+                 reply_timeout: float, seed: int = 1):
+        self.fake = fake
+        self.users = users
+        self.think_time = think_time
+        self.mix = mix
+        self.reply_timeout = reply_timeout
+        self.seed = seed
+
+        self.ready = asyncio.Event()
+        self.measuring = False
+        self._waiters: Dict[int, asyncio.Future] = {}
+        self._callback_owner: Dict[str, int] = {}
+
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.timeouts: Counter = Counter()
+        self.api_calls: Counter = Counter()
+        self.updates_sent = 0
+        fake.observers.append(self.on_api_call)
+
+    # ==================== НАБЛЮДЕНИЕ ЗА API ====================
+
+    def on_api_call(self, method: str, params: Dict):
+        method = method.lower()
+        if method in ("getupdates", "setwebhook"):
+            self.ready.set()
+        if self.measuring and method not in SERVICE_METHODS:
+            self.api_calls[method] += 1
+        if method not in REPLY_METHODS:
+            return
+
+        if method == "answercallbackquery":
+            user_id = self._callback_owner.pop(str(params.get("callback_query_id")), None)
+        else:
+            user_id = int(params["chat_id"]) if params.get("chat_id") is not None else None
+        waiter = self._waiters.pop(user_id, None) if user_id is not None else None
+        if waiter is not None and not waiter.done():
+            waiter.set_result(time.perf_counter())
+
+    # ==================== ПОЛЬЗОВАТЕЛИ ====================
+
+    async def step(self, user_id: int, step: Step) -> Optional[float]:
+        """Отправить апдейт и дождаться первого ответа. Задержка в мс или None (таймаут)"""
+        kind, payload = step
+        if kind == "text":
+            update = self.fake.make_message_update(user_id, payload)
+        else:
+            update = self.fake.make_callback_update(user_id, payload)
+            self._callback_owner[update["callback_query"]["id"]] = user_id
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[user_id] = waiter
+        started = time.perf_counter()
+        if self.measuring:
+            self.updates_sent += 1
+        await self.fake.deliver(update)
+        try:
+            answered = await asyncio.wait_for(waiter, self.reply_timeout)
+        except asyncio.TimeoutError:
+            self._waiters.pop(user_id, None)
+            return None
+        return (answered - started) * 1000
+
+    async def user_loop(self, user_id: int, stop: asyncio.Event, ramp_up: float):
+        rng = random.Random(f"{self.seed}:{user_id}")
+        names, weights = zip(*self.mix.items())
+        await asyncio.sleep(rng.uniform(0, ramp_up))
+        while not stop.is_set():
+            scenario = rng.choices(names, weights)[0]
+            for step in scenario_steps(scenario, rng):
+                latency = await self.step(user_id, step)
+                if not self.measuring:
+                    continue
+                if latency is None:
+                    self.timeouts[scenario] += 1
+                    break
+                self.latencies[scenario].append(latency)
+            try:
+                await asyncio.wait_for(stop.wait(), rng.expovariate(1 / self.think_time))
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self, duration: float, warmup: float, ramp_up: float) -> Dict:
+        stop = asyncio.Event()
+        base_id = 50_000_000
+        tasks = [asyncio.create_task(self.user_loop(base_id + i, stop, ramp_up)) for i in range(self.users)]
+
+        await asyncio.sleep(warmup)
+        self.measuring = True
+        started = time.perf_counter()
+        await asyncio.sleep(duration)
+        self.measuring = False
+        elapsed = time.perf_counter() - started
+
+        stop.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return self.report(elapsed)
+
+    # ==================== ОТЧЁТ ====================
+
+    @staticmethod
+    def _summary(samples: List[float]) -> Dict:
+        return {
+            'count': len(samples),
+            'p50_ms': round(percentile(samples, 50), 1),
+            'p95_ms': round(percentile(samples, 95), 1),
+            'p99_ms': round(percentile(samples, 99), 1),
+            'max_ms': round(max(samples, default=0.0), 1),
+        }
+
+    def report(self, elapsed: float) -> Dict:
+        all_latencies = [latency for samples in self.latencies.values() for latency in samples]
+        total_calls = sum(self.api_calls.values())
+        return {
+            'duration_s': round(elapsed, 1),
+            'users': self.users,
+            'updates_sent': self.updates_sent,
+            'replies': len(all_latencies),
+            'timeouts': dict(self.timeouts),
+            'updates_per_sec': round(len(all_latencies) / elapsed, 1) if elapsed else 0.0,
+            'latency': self._summary(all_latencies),
+            'latency_by_scenario': {name: self._summary(samples) for name, samples in self.latencies.items()},
+            'api_calls_per_update': round(total_calls / self.updates_sent, 2) if self.updates_sent else 0.0,
+            'api_calls': dict(self.api_calls.most_common()),
+        }
+
+
+# ==================== ЗАПУСК БОТА ====================
+
+def start_bot(args, api_url: str, workdir: str) -> Tuple[subprocess.Popen, str]:
+    log_path = os.path.join(workdir, "bot.log")
+    env = dict(
+        os.environ,
+        BOT_TOKEN="123456:loadtest",
+        TELEGRAM_API_URL=api_url,
+        DATABASE_URL=args.database_url or f"sqlite:///{os.path.join(workdir, 'load.db')}",
+        BOT_MODE=args.mode,
+    )
+    if args.mode == "webhook":
+        env.update(
+            WEBHOOK_URL=f"http://127.0.0.1:{args.webhook_port}",
+            WEBHOOK_HOST="127.0.0.1",
+            WEBHOOK_PORT=str(args.webhook_port),
+            WEBHOOK_SECRET="loadtest-secret",
+        )
+    log = open(log_path, "w")
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, "bot.py")],
+                               env=env, cwd=workdir, stdout=log, stderr=subprocess.STDOUT)
+    return process, log_path
+
+
+async def stop_bot(process: subprocess.Popen):
+    """SIGTERM и ожидание выхода — в потоке: фейковый Bot API тем временем отвечает,
+    иначе graceful shutdown бота (дослать исходящие, закрыть сессию) висел бы на нём"""
+    if process.poll() is None:
+        process.send_signal(signal.SIGTERM)
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, process.wait, 30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+async def main_async(args) -> Dict:
+    fake = FakeTelegram(latency=args.latency, method_latency=parse_method_latency(args.method_latency))
+    runner = web.AppRunner(fake.make_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.port).start()
+
+    mix = {name: float(weight) for name, weight in
+           (item.split("=") for item in args.mix.split(","))}
+    load = LoadTest(fake, args.users, args.think_time, mix, args.reply_timeout, args.seed)
+
+    workdir = tempfile.mkdtemp(prefix="jarvis-load-")
+    bot_process = None
+    if not args.no_spawn:
+        bot_process, log_path = start_bot(args, f"http://127.0.0.1:{args.port}", workdir)
+        print(f"🤖 bot.py запущен ({args.mode}), лог: {log_path}", flush=True)
+    try:
+        await asyncio.wait_for(load.ready.wait(), args.startup_timeout)
+        print(f"🚦 Бот готов, {args.users} пользователей, {args.duration:.0f} с…", flush=True)
+        result = await load.run(args.duration, args.warmup, args.ramp_up)
+    finally:
+        if bot_process is not None:
+            await stop_bot(bot_process)
+        await runner.cleanup()
+
+    result['config'] = {
+        'mode': args.mode, 'latency': args.latency, 'method_latency': args.method_latency,
+        'think_time': args.think_time, 'mix': mix,
+    }
+    return result
+
+
+def print_report(result: Dict):
+    latency = result['latency']
+    print(f"\n📊 {result['updates_per_sec']} апдейтов/с за {result['duration_s']} с "
+          f"({result['replies']} ответов, таймауты: {result['timeouts'] or 0})")
+    print(f"⏱️ end-to-end: p50 {latency['p50_ms']} мс, p95 {latency['p95_ms']} мс, "
+          f"p99 {latency['p99_ms']} мс, max {latency['max_ms']} мс")
+    for name, summary in result['latency_by_scenario'].items():
+        print(f"   {name:<10} n={summary['count']:<7} p50 {summary['p50_ms']:>8} "
+              f"p95 {summary['p95_ms']:>8} p99 {summary['p99_ms']:>8} мс")
+    print(f"📞 вызовов API на апдейт: {result['api_calls_per_update']} {result['api_calls']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест JARVIS на фейковом Bot API")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=30.0, help="измеряемый интервал, секунды")
+    parser.add_argument("--warmup", type=float, default=5.0, help="разогрев без учёта, секунды")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="за сколько секунд подключаются все")
+    parser.add_argument("--think-time", type=float, default=2.0, help="средняя пауза пользователя, секунды")
+    parser.add_argument("--mix", default="note=6,search=2,bookmarks=1,reminder=1")
+    parser.add_argument("--mode", choices=["polling", "webhook"], default="polling")
+    parser.add_argument("--port", type=int, default=8081, help="порт фейкового Bot API")
+    parser.add_argument("--webhook-port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа API, секунды")
+    parser.add_argument("--method-latency", default="", help="getChatMember=0.05,sendMessage=0.03")
+    parser.add_argument("--reply-timeout", type=float, default=10.0)
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    parser.add_argument("--database-url", help="БД бота (по умолчанию временный SQLite)")
+    parser.add_argument("--no-spawn", action="store_true",
+                        help="не запускать bot.py — бот уже смотрит на TELEGRAM_API_URL этого сервера")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="сохранить отчёт в JSON")
+    args = parser.parse_args()
+
+    result = asyncio.run(main_async(args))
+    print_report(result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"💾 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Кэш профилей пользователей с отложенной записью (write-behind).
+
+Имя для персональных ответов берётся из памяти, а изменения профиля и
+отметки last_active копятся и раз в flush_interval уходят в БД одной пачкой.
+"""
+import asyncio
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from aiogram.types import User as TelegramUser
+from loguru import logger
+
+from async_db import run_db
+
+PROFILE_FIELDS = ("username", "first_name", "last_name")
+
+
+class UserProfileCache:
+    """Профили в памяти + очередь изменений для пакетного UPDATE"""
+
+    def __init__(self, flush_func: Callable[[List[Dict]], None],
+                 flush_interval: float = 30.0, maxsize: int = 50_000):
+        self.flush_func = flush_func
+        self.flush_interval = flush_interval
+        self.maxsize = maxsize
+        self._profiles: "OrderedDict[int, Dict]" = OrderedDict()
+        self._pending: Dict[int, Dict] = {}  # user_id -> строка для записи (последняя версия)
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self.flushed_rows = 0
+        self.flush_batches = 0
+
+    def touch(self, tg_user: TelegramUser) -> Dict:
+        """Обновить профиль по данным апдейта и вернуть его без запроса к БД"""
+        profile = {
+            "user_id": tg_user.id,
+            "username": tg_user.username,
+            "first_name": tg_user.first_name,
+            "last_name": tg_user.last_name,
+        }
+        self._profiles[tg_user.id] = profile
+        self._profiles.move_to_end(tg_user.id)
+        while len(self._profiles) > self.maxsize:
+            self._profiles.popitem(last=False)
+
+        # Несколько апдейтов одного пользователя между сбросами = одна строка в пачке
+        self._pending[tg_user.id] = dict(profile, last_active=datetime.now())
+        return profile
+
+    def get(self, user_id: int) -> Optional[Dict]:
+        return self._profiles.get(user_id)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="user-profile-flush")
+
+    async def close(self):
+        """Остановить фоновый сброс и записать всё, что осталось"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"❌ Не удалось сохранить профили: {e}")
+
+    async def flush(self):
+        """Записать накопленные изменения одной пачкой"""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            try:
+                await run_db(self.flush_func, list(batch.values()))
+            except BaseException:
+                # Возвращаем пачку в очередь, не затирая более свежие изменения
+                for user_id, row in batch.items():
+                    self._pending.setdefault(user_id, row)
+                raise
+            self.flushed_rows += len(batch)
+            self.flush_batches += 1
+            logger.debug(f"👤 Сохранено профилей: {len(batch)}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "cached": len(self._profiles),
+            "pending": len(self._pending),
+            "flushed_rows": self.flushed_rows,
+            "flush_batches": self.flush_batches,
+        }
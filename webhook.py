@@ -0,0 +1,250 @@
+"""
+Режим webhook на встроенном aiohttp-сервере.
+
+• проверка секрета X-Telegram-Bot-Api-Secret-Token — всегда: без WEBHOOK_SECRET
+  режим не запускается, иначе любой POST на адрес webhook сошёл бы за апдейт
+• апдейт подтверждается сразу (200 OK), обработка идёт в фоне; при
+  backpressure (очереди обработки полны) ответ ждёт, пока появится место, —
+  Telegram не шлёт больше max_connections апдейтов без ответа
+• повторные доставки update_id отбрасываются, чтобы одна заметка не сохранилась
+  дважды. WEBHOOK_DEDUPE=memory — окно в памяти процесса: работает только для
+  одного экземпляра (повтор, пришедший на другую реплику за балансировщиком, не
+  отсеется). WEBHOOK_DEDUPE=sql — таблица webhook_updates (миграция 14), общая
+  для всех реплик: INSERT … ON CONFLICT DO NOTHING, старые строки удаляются по TTL
+"""
+import os
+import hmac
+import time
+import signal
+import asyncio
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiogram.webhook.aiohttp_server import setup_application
+from loguru import logger
+from sqlalchemy import BigInteger, Column, DateTime, MetaData, Table, delete, inspect
+from sqlalchemy.engine import Engine
+
+from async_db import run_db
+
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")              # публичный адрес, например https://bot.example.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT") or os.getenv("PORT") or "8080")
+WEBHOOK_DEDUPE = os.getenv("WEBHOOK_DEDUPE", "memory")  # memory (один экземпляр) | sql (несколько реплик)
+WEBHOOK_DEDUPE_WINDOW = int(os.getenv("WEBHOOK_DEDUPE_WINDOW", "10000"))
+# Telegram повторяет неподтверждённый апдейт до суток
+WEBHOOK_DEDUPE_TTL = int(os.getenv("WEBHOOK_DEDUPE_TTL", str(24 * 3600)))
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class UpdateDeduplicator:
+    """Окно последних update_id в памяти: Telegram повторяет апдейт, если не дождался ответа.
+    Только для одного экземпляра бота — реплики окно не делят (см. SQLUpdateDeduplicator)"""
+
+    def __init__(self, window: int = WEBHOOK_DEDUPE_WINDOW):
+        self.window = window
+        self._seen: "OrderedDict[int, None]" = OrderedDict()
+        self.duplicates = 0
+
+    async def seen(self, update_id: int) -> bool:
+        """True, если апдейт уже принимали (и запомнить его, если нет)"""
+        if update_id in self._seen:
+            self.duplicates += 1
+            return True
+        self._seen[update_id] = None
+        while len(self._seen) > self.window:
+            self._seen.popitem(last=False)
+        return False
+
+
+metadata = MetaData()
+
+webhook_updates = Table(
+    "webhook_updates", metadata,
+    Column("update_id", BigInteger, primary_key=True),
+    Column("received_at", DateTime, nullable=False, index=True),
+)
+
+
+class SQLUpdateDeduplicator:
+    """
+    Принятые update_id в таблице webhook_updates — общей для всех реплик за балансировщиком.
+    Первая реплика вставляет строку, остальные получают конфликт и апдейт отбрасывают.
+    Строки старше ttl удаляются раз в purge_interval.
+    """
+
+    def __init__(self, engine: Engine, ttl: float = WEBHOOK_DEDUPE_TTL, purge_interval: float = 600.0):
+        self.engine = engine
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._last_purge = time.monotonic()
+        self.duplicates = 0
+        # Диалектный INSERT ... ON CONFLICT — как в fsm_storage.SQLStorage
+        if engine.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        self._insert = insert
+
+    def setup(self):
+        """Таблицу создаёт миграция 14 (database.schema), здесь — только проверка"""
+        if not inspect(self.engine).has_table(webhook_updates.name):
+            raise RuntimeError("Нет таблицы webhook_updates — примените миграции: python migrations.py upgrade")
+
+    def _claim(self, update_id: int) -> bool:
+        """Записать update_id; False — его уже записала эта или другая реплика"""
+        with self.engine.begin() as conn:
+            result = conn.execute(
+                self._insert(webhook_updates)
+                .values(update_id=update_id, received_at=datetime.now())
+                .on_conflict_do_nothing(index_elements=[webhook_updates.c.update_id])
+            )
+        return result.rowcount == 1
+
+    def purge_expired(self) -> int:
+        with self.engine.begin() as conn:
+            result = conn.execute(delete(webhook_updates).where(
+                webhook_updates.c.received_at <= datetime.now() - timedelta(seconds=self.ttl)
+            ))
+        if result.rowcount:
+            logger.info(f"🧹 Удалено старых update_id webhook: {result.rowcount}")
+        return result.rowcount
+
+    async def seen(self, update_id: int) -> bool:
+        if time.monotonic() - self._last_purge >= self.purge_interval:
+            self._last_purge = time.monotonic()
+            await run_db(self.purge_expired)
+        if await run_db(self._claim, update_id):
+            return False
+        self.duplicates += 1
+        return True
+
+
+def create_deduplicator(engine: Optional[Engine] = None, kind: str = WEBHOOK_DEDUPE):
+    """Отсев повторов по настройке WEBHOOK_DEDUPE"""
+    if kind == "sql":
+        if engine is None:
+            raise ValueError("Для WEBHOOK_DEDUPE=sql нужен engine")
+        deduplicator = SQLUpdateDeduplicator(engine)
+        deduplicator.setup()
+        logger.info("🔁 Повторы апдейтов: таблица webhook_updates (общая для реплик)")
+        return deduplicator
+    logger.info("🔁 Повторы апдейтов: окно в памяти (только один экземпляр бота)")
+    return UpdateDeduplicator()
+
+
+class WebhookHandler:
+    """aiohttp-обработчик: проверить секрет, отсеять дубль, ответить и обработать в фоне"""
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, secret: str = WEBHOOK_SECRET,
+                 deduplicator: Optional[Any] = None,
+                 backpressure: Optional[Callable[[], Awaitable[None]]] = None, **data: Any):
+        if not secret:
+            raise ValueError("Секрет webhook обязателен")
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.secret = secret
+        self.deduplicator = deduplicator or UpdateDeduplicator()
+        self.backpressure = backpressure
+        self.data = data
+        self._tasks: Set[asyncio.Task] = set()
+        self.accepted = 0
+        self.rejected = 0
+
+    def register(self, app: web.Application, path: str = WEBHOOK_PATH):
+        app.router.add_post(path, self.handle)
+        app.on_shutdown.append(self._drain)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, "").encode(), self.secret.encode()):
+            self.rejected += 1
+            return web.Response(status=401)
+
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except Exception as e:
+            logger.warning(f"⚠️ Некорректный апдейт в webhook: {e}")
+            return web.Response(status=400)
+
+        if await self.deduplicator.seen(update.update_id):
+            logger.debug(f"🔁 Повтор апдейта {update.update_id} отброшен")
+            return web.Response()
+
+        self.accepted += 1
+        if self.backpressure is not None:
+            await self.backpressure()
+        # Отвечаем Telegram сразу, не дожидаясь хендлера
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def _process(self, update: Update):
+        try:
+            await self.dispatcher.feed_update(self.bot, update, **self.data)
+        except Exception as e:
+            logger.exception(f"❌ Ошибка обработки апдейта {update.update_id}: {e}")
+
+    async def _drain(self, app: web.Application):
+        """При остановке дождаться апдейтов, которые уже обрабатываются"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "accepted": self.accepted,
+            "duplicates": self.deduplicator.duplicates,
+            "rejected": self.rejected,
+            "in_progress": len(self._tasks),
+        }
+
+
+async def run_webhook(dispatcher: Dispatcher, bot: Bot, url: str = WEBHOOK_URL,
+                      path: str = WEBHOOK_PATH, secret: str = WEBHOOK_SECRET,
+                      host: str = WEBHOOK_HOST, port: int = WEBHOOK_PORT,
+                      backpressure: Optional[Callable[[], Awaitable[None]]] = None,
+                      deduplicator: Optional[Any] = None):
+    """Зарегистрировать webhook в Telegram и обслуживать апдейты до остановки процесса"""
+    if not url:
+        raise RuntimeError("WEBHOOK_URL не задан")
+    if not secret:
+        raise RuntimeError("WEBHOOK_SECRET не задан — без него webhook принял бы поддельные апдейты")
+
+    app = web.Application()
+    handler = WebhookHandler(dispatcher, bot, secret=secret, deduplicator=deduplicator, backpressure=backpressure)
+    handler.register(app, path)
+    setup_application(app, dispatcher, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+
+    await bot.set_webhook(
+        url.rstrip("/") + path,
+        secret_token=secret,
+        allowed_updates=dispatcher.resolve_used_update_types()
+    )
+    logger.info(f"🌐 Webhook: {url.rstrip('/')}{path} (слушаю {host}:{port})")
+
+    # SIGTERM/SIGINT → корректная остановка: дообработать апдейты, вызвать shutdown-хуки
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    try:
+        await stop.wait()
+    finally:
+        logger.info(f"🌐 Webhook: {handler.stats()}")
+        await runner.cleanup()
+        await bot.session.close()